@@ -4,15 +4,26 @@ import json
 import os
 import pandas as pd
 from pathlib import Path
-from datetime import datetime
-from werkzeug.utils import secure_filename
+from werkzeug.wsgi import LimitedStream
 from dataproc.report_processor import ReportProcessor
-from dataproc.generic_processor import GenericProcessor, analyze_columns, validate_column_selection
+from dataproc.generic_processor import (
+    GenericProcessor, check_validation_facts, validation_facts_from_profile, validation_facts_from_sample
+)
+from dataproc.column_profiler import profile_file
+from dataproc.cube import cube_path, load_cube
+from dataproc.measures import parse_measure, select_measure
 from dataproc.db_handler import DatabaseHandler
 from dataproc.file_analyzer import FileAnalyzer
+from dataproc.analysis_cache import AnalysisCache
+from dataproc.single_flight import SingleFlight, file_lock
+from dataproc.offload import run_blocking, run_blocking_stream
+from dataproc.token_grid import TokenGrid
+from dataproc.type_detector import TypeDetector
+from dataproc.jobs import JobManager, TERMINAL_STATUSES, DONE, ERROR, CANCELLED
+from dataproc.upload_store import UploadStore, UploadTooLarge
+from dataproc.chunked_upload import ChunkedUploadManager, ChunkedUploadError
 from dotenv import load_dotenv
-import queue
-import threading
+import time
 
 load_dotenv()
 
@@ -22,13 +33,68 @@ bp = Blueprint('api', __name__)
 DATA_DIR = os.getenv('DATA_DIR', "../data")
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', "../data/raw")
 DB_PATH = os.getenv('DATABASE_URL', "../data/security.db")
-ALLOWED_EXTENSIONS = {'csv', 'xls', 'xlsx'}
 
 db = DatabaseHandler(DB_PATH)
+# Computations shared through single_flight run off the event loop under gevent
+single_flight = SingleFlight(Path(UPLOAD_DIR) / ".locks", runner=run_blocking)
+analysis_cache = AnalysisCache(UPLOAD_DIR, single_flight=single_flight)
+upload_store = UploadStore(UPLOAD_DIR)
+chunked_uploads = ChunkedUploadManager(UPLOAD_DIR, upload_store)
+job_manager = JobManager(Path(DATA_DIR) / "jobs")
+
+# How often job event streams check a job's state, and how often they send a
+# keep-alive comment while nothing changes (a write is also how a closed
+# connection is noticed)
+JOB_POLL_SECONDS = 0.25
+JOB_KEEPALIVE_SECONDS = 5
 
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return '.' in filename and UploadStore.is_allowed(filename)
+
+
+def parse_offsets(values):
+    """
+    headerRow and skipRows from query args or a JSON body, as integers, so
+    "2" and 2 share cache entries.
+
+    Raises:
+        ValueError: If either is not an integer
+    """
+    try:
+        return int(values.get('headerRow') or 0), int(values.get('skipRows') or 0)
+    except (TypeError, ValueError):
+        raise ValueError("headerRow and skipRows must be integers")
+
+
+def load_table_frame(csv_path):
+    """
+    Read a processed data CSV; concurrent requests for the same file share one read.
+
+    Only callers in this process share the frame: there is no on-disk result
+    a worker could pick up, so a cross-process lock would only serialize reads.
+    The frame is shared, so callers must not modify it.
+    """
+    stat = csv_path.stat()
+    key = f"table|{csv_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+    return single_flight.do(key, lambda: pd.read_csv(csv_path, low_memory=False), cross_process=False)
+
+
+def load_token_grid(full_path):
+    """Raw token grid for the first rows of an upload, from the analysis cache."""
+    return TokenGrid.from_dict(analysis_cache.get_or_compute(
+        full_path, 'token_grid', lambda: TokenGrid.from_file(full_path, count_rows=False).to_dict(),
+        count_rows=False
+    ))
+
+
+@bp.before_app_request
+def start_job_dispatcher():
+    """
+    Make sure this worker's job dispatcher runs, so queued jobs start even
+    if the worker that queued them is gone (a no-op once started).
+    """
+    job_manager.start()
 
 @bp.route('/health')
 def health_check():
@@ -72,9 +138,19 @@ def analyze_file():
                 }
             }), 404
         
-        # Analyze file
-        analyzer = FileAnalyzer(full_path)
-        result = analyzer.analyze(num_rows=num_rows)
+        # Analyze file (cached per file content and preview size; failures are not cached)
+        result = analysis_cache.get(full_path, 'analyze', num_rows=num_rows)
+        if result is None:
+            def analyze():
+                cached = analysis_cache.get(full_path, 'analyze', num_rows=num_rows)
+                if cached is not None:
+                    return cached
+                analysis = FileAnalyzer(full_path).analyze(num_rows=num_rows)
+                if analysis.get('success'):
+                    analysis_cache.set(full_path, 'analyze', analysis, num_rows=num_rows)
+                return analysis
+
+            result = single_flight.do(analysis_cache.key(full_path, 'analyze', num_rows=num_rows), analyze)
         
         if not result.get('success'):
             return jsonify(result), 400
@@ -100,8 +176,15 @@ def analyze_file():
 
 @bp.route('/data', methods=['GET'])
 def get_data():
+    """
+    Return a session's chart data.
+
+    With ?measure=<id>, node values are that measure instead of the value
+    sum; it must be one of the measures built for the chart.
+    """
     try:
         session_id = request.args.get('session_id', 'default')
+        measure = request.args.get('measure')
         data_file = os.path.join(DATA_DIR, f'{session_id}_sunburst_data.json')
 
         # Fallback to old format if session file doesn't exist
@@ -110,7 +193,13 @@ def get_data():
 
         with open(data_file, 'r') as f:
             data = json.load(f)
-            return jsonify(data), 200
+
+        if measure:
+            try:
+                select_measure(data, measure)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        return jsonify(data), 200
     except FileNotFoundError:
         return jsonify({"error": "Data file not found"}), 404
 
@@ -155,7 +244,7 @@ def get_table_data():
 
             # Read CSV (low_memory=False to avoid DtypeWarning on large files)
             # No header parameters needed - processed file already has correct headers
-            df = pd.read_csv(csv_path, low_memory=False)
+            df = load_table_frame(csv_path)
 
             # Get filters and pagination params
             page = int(request.args.get('page', 1)) if request.method == 'GET' else 1
@@ -169,28 +258,29 @@ def get_table_data():
             elif request.method == 'POST' and request.is_json:
                 filters = request.get_json() or {}
 
-            # Apply filters
-            filtered_df = df.copy()
-            for column, value in filters.items():
-                if column in filtered_df.columns and value:
-                    filtered_df = filtered_df[filtered_df[column] == value]
-
-            # Paginate
-            total = len(filtered_df)
-            total_pages = (total + items_per_page - 1) // items_per_page
-            start_idx = (page - 1) * items_per_page
-            end_idx = start_idx + items_per_page
-            paginated_df = filtered_df.iloc[start_idx:end_idx]
-
-            # Convert to records, replacing NaN with empty strings
-            data = paginated_df.fillna('').to_dict('records')
+            def table_page():
+                # Apply filters
+                filtered_df = df.copy()
+                for column, value in filters.items():
+                    if column in filtered_df.columns and value:
+                        filtered_df = filtered_df[filtered_df[column] == value]
+
+                # Paginate
+                total = len(filtered_df)
+                total_pages = (total + items_per_page - 1) // items_per_page
+                start_idx = (page - 1) * items_per_page
+                end_idx = start_idx + items_per_page
+                paginated_df = filtered_df.iloc[start_idx:end_idx]
+
+                # Convert to records, replacing NaN with empty strings
+                return {
+                    'data': paginated_df.fillna('').to_dict('records'),
+                    'page': page,
+                    'total': total,
+                    'total_pages': total_pages
+                }
 
-            return jsonify({
-                'data': data,
-                'page': page,
-                'total': total,
-                'total_pages': total_pages
-            }), 200
+            return jsonify(run_blocking(table_page)), 200
 
         else:
             # No data available - return empty result instead of falling back to legacy DB
@@ -224,58 +314,137 @@ def get_table_data():
         return jsonify({"error": str(e)}), 500
 
 
-@bp.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST', 'PUT'])
 def upload_file():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-
-    file = request.files['file']
+    """
+    Store an upload by content hash.
 
-    if file.filename == '':
+    Accepts a multipart form with a 'file' field, or a raw request body with
+    the file name in the 'filename' query parameter (or X-File-Name header),
+    which is streamed straight to disk without multipart spooling.
+    Byte-identical uploads return the existing file. Hashing, decompressing
+    and writing run off the event loop (see run_blocking_stream).
+    """
+    if request.files:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file part"}), 400
+        file = request.files['file']
+        filename, stream = file.filename, file.stream
+    else:
+        filename = request.args.get('filename') or request.headers.get('X-File-Name', '')
+        stream = request.stream
+        if request.content_length is not None:
+            # Raises on a body cut short, so a dropped connection stores nothing
+            stream = LimitedStream(stream, request.content_length)
+
+    if not filename:
         return jsonify({"error": "No selected file"}), 400
 
-    if file and allowed_file(file.filename):
-        # Create directory if it doesn't exist
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed. Please upload CSV, XLS, or XLSX files (optionally as .gz, .zip or .zst)."}), 400
 
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        original_name = secure_filename(file.filename)
-        file_ext = original_name.rsplit('.', 1)[1].lower()
-        base_name = os.path.splitext(original_name)[0]
-        
-        # If Excel file, convert to CSV
-        if file_ext in ['xls', 'xlsx']:
-            temp_path = os.path.join(UPLOAD_DIR, f"temp_{timestamp}.{file_ext}")
-            file.save(temp_path)
-            
-            try:
-                # Read Excel file
-                df = pd.read_excel(temp_path)
-                
-                # Save as CSV
-                filename = f"{base_name}-{timestamp}.csv"
-                file_path = os.path.join(UPLOAD_DIR, filename)
-                df.to_csv(file_path, index=False)
-                
-                # Remove temp Excel file
-                os.remove(temp_path)
-            except Exception as e:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                return jsonify({"error": f"Failed to convert Excel file: {str(e)}"}), 400
-        else:
-            # Save CSV directly
-            filename = f"{base_name}-{timestamp}.csv"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            file.save(file_path)
+    try:
+        if request.content_length is not None:
+            upload_store.check_upload_size(request.content_length)
+        stored_name, duplicate = run_blocking_stream(upload_store.ingest, stream, filename)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to store upload: {str(e)}"}), 400
 
-        return jsonify({
-            "message": "File uploaded successfully",
-            "filePath": filename  # Send just the filename, not the full path
-        }), 200
+    return jsonify({
+        "message": "File already uploaded" if duplicate else "File uploaded successfully",
+        "filePath": stored_name,  # Send just the filename, not the full path
+        "duplicate": duplicate
+    }), 200
+
+
+@bp.route('/upload/start', methods=['POST'])
+def start_chunked_upload():
+    """
+    Begin a resumable chunked upload.
+    Body: filename, size, optional chunkSize and sha256 (hex digest of the whole file).
+    """
+    data = request.json or {}
+    filename = data.get('filename', '')
+
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "File type not allowed. Please upload CSV, XLS, or XLSX files (optionally as .gz, .zip or .zst)."}), 400
+
+    try:
+        status = chunked_uploads.start(
+            filename,
+            int(data.get('size', 0)),
+            chunk_size=data.get('chunkSize'),
+            sha256=data.get('sha256')
+        )
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (ChunkedUploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(status), 200
+
+
+@bp.route('/upload/<upload_id>/chunk/<int:index>', methods=['PUT', 'POST'])
+def upload_chunk(upload_id, index):
+    """
+    Write one chunk (raw request body). Optional X-Chunk-SHA256 header is verified.
+    The chunk is written off the event loop, like an /upload body (see run_blocking_stream).
+    """
+    chunk_sha256 = request.headers.get('X-Chunk-SHA256')
+    try:
+        result = run_blocking_stream(
+            lambda body: chunked_uploads.write_chunk(upload_id, index, body, chunk_sha256=chunk_sha256),
+            request.stream
+        )
+    except ChunkedUploadError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify({"error": "File type not allowed. Please upload CSV, XLS, or XLSX files."}), 400
+    return jsonify(result), 200
+
+
+@bp.route('/upload/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Report received and missing chunks so an interrupted upload can resume."""
+    try:
+        return jsonify(chunked_uploads.status(upload_id)), 200
+    except ChunkedUploadError as e:
+        return jsonify({"error": str(e)}), 404
+
+
+@bp.route('/upload/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Discard an in-progress chunked upload."""
+    try:
+        chunked_uploads.abort(upload_id)
+    except ChunkedUploadError as e:
+        return jsonify({"error": str(e)}), 404
+
+    return jsonify({"message": "Upload discarded"}), 200
+
+
+@bp.route('/upload/<upload_id>/finish', methods=['POST'])
+def finish_chunked_upload(upload_id):
+    """Verify the assembled upload and store it like a regular /upload (off the event loop)."""
+    try:
+        stored_name, duplicate = run_blocking(chunked_uploads.finish, upload_id)
+    except ChunkedUploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to store upload: {str(e)}"}), 400
+
+    return jsonify({
+        "message": "File already uploaded" if duplicate else "File uploaded successfully",
+        "filePath": stored_name,
+        "duplicate": duplicate
+    }), 200
 
 
 @bp.route('/file-info', methods=['GET'])
@@ -287,9 +456,11 @@ def get_file_info():
     """
     try:
         file_path_param = request.args.get('filePath')
-        header_row = int(request.args.get('headerRow', 0))
-        skip_rows = int(request.args.get('skipRows', 0))
-        
+        try:
+            header_row, skip_rows = parse_offsets(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         if not file_path_param:
             return jsonify({"error": "Missing filePath parameter"}), 400
 
@@ -299,27 +470,44 @@ def get_file_info():
         if not full_path.exists():
             return jsonify({"error": f"File not found: {file_path_param}"}), 404
 
-        # Read file with specified header row and skip rows
-        file_ext = full_path.suffix.lower()
-        skiprows = list(range(skip_rows)) if skip_rows > 0 else None
-        
-        if file_ext == '.csv':
-            df = pd.read_csv(full_path, header=header_row, skiprows=skiprows)
-        else:
-            df = pd.read_excel(full_path, header=header_row, skiprows=skiprows)
-
-        # Analyze columns
-        columns_info = analyze_columns(full_path, header_row=header_row, skip_rows=skip_rows)
+        def compute_file_info():
+            # Preview: re-apply header/skip offsets to the cached raw grid
+            grid = load_token_grid(full_path)
+            df = grid.frame(header_row=header_row, skip_rows=skip_rows)
+
+            # Columns and row count: one streaming profiling pass over the whole file
+            profile = analysis_cache.get_or_compute(
+                full_path, 'column_profile',
+                lambda: profile_file(full_path, header_row=header_row, skip_rows=skip_rows,
+                                     cache=analysis_cache),
+                header_row=header_row, skip_rows=skip_rows
+            )
+
+            # Value formats (currency, percentage, date, ...) from the sampled rows
+            detected = TypeDetector().detect_column_types(df)
+            columns = []
+            for column in profile['columns']:
+                detection = detected.get(column['name'], {})
+                columns.append({
+                    **column,
+                    'detected_type': detection.get('detected_type', 'text'),
+                    'type_confidence': detection.get('confidence', 0.0)
+                })
 
-        row_count = len(df)
+            # Get preview (first 5 rows) - replace NaN with None for valid JSON
+            return {
+                "columns": columns,
+                "rowCount": profile['row_count'],
+                "preview": df.head(5).fillna('').to_dict('records')
+            }
 
-        # Get preview (first 5 rows) - replace NaN with None for valid JSON
-        preview = df.head(5).fillna('').to_dict('records')
+        file_info = analysis_cache.get_or_compute(
+            full_path, 'file_info', compute_file_info,
+            header_row=header_row, skip_rows=skip_rows
+        )
 
         return jsonify({
-            "columns": columns_info,
-            "rowCount": row_count,
-            "preview": preview,
+            **file_info,
             "fileName": file_path_param,
             "headerRow": header_row,
             "skipRows": skip_rows
@@ -340,8 +528,10 @@ def validate_columns_endpoint():
         file_path_param = data.get('filePath')
         tree_order = data.get('treeOrder', [])
         value_column = data.get('valueColumn')
-        header_row = data.get('headerRow', 0)
-        skip_rows = data.get('skipRows', 0)
+        try:
+            header_row, skip_rows = parse_offsets(data)
+        except ValueError as e:
+            return jsonify({"valid": False, "errors": [str(e)]}), 400
 
         if not all([file_path_param, tree_order, value_column]):
             return jsonify({
@@ -358,13 +548,23 @@ def validate_columns_endpoint():
                 "errors": [f"File not found: {file_path_param}"]
             }), 404
 
-        # Validate selection
-        is_valid, errors = validate_column_selection(full_path, tree_order, value_column, header_row, skip_rows)
+        # Answer from the full-file profile if /file-info already built one,
+        # otherwise from the cached sample grid; never parse the whole file here
+        profile = analysis_cache.get(full_path, 'column_profile', header_row=header_row, skip_rows=skip_rows)
+        if profile is not None:
+            facts = validation_facts_from_profile(profile, tree_order, value_column)
+        else:
+            grid = load_token_grid(full_path)
+            sample = grid.frame(header_row=header_row, skip_rows=skip_rows)
+            facts = validation_facts_from_sample(sample, tree_order, value_column, complete=grid.complete)
+
+        is_valid, errors, warnings = check_validation_facts(facts, tree_order, value_column)
 
         return jsonify({
             "valid": is_valid,
             "errors": errors,
-            "warnings": []  # Could add warnings for non-critical issues
+            "warnings": warnings,
+            "provisional": facts['provisional']  # Checks decided on a sample; exact checks run during processing
         }), 200
 
     except Exception as e:
@@ -380,6 +580,9 @@ def process_file():
     """
     Process file for sunburst visualization with Server-Sent Events for progress.
     Supports both legacy (security report) and generic modes.
+
+    Generic requests are queued on the job pool (see /jobs); the response
+    streams the job's progress until it finishes.
     """
     try:
         data = request.json
@@ -393,8 +596,10 @@ def process_file():
         value_column = data.get("valueColumn")
         chart_name = data.get("chartName")
         session_id = data.get("sessionId", "default")
-        header_row = data.get("headerRow", 0)
-        skip_rows = data.get("skipRows", 0)
+        try:
+            header_row, skip_rows = parse_offsets(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         if tree_order and value_column and chart_name:
             # Generic mode with progress tracking
@@ -402,62 +607,19 @@ def process_file():
             print(f"  Session: {session_id}")
             print(f"  Hierarchy: {' → '.join(tree_order)}")
             print(f"  Value: {value_column}")
+            if data.get("measures"):
+                print(f"  Measures: {', '.join(map(str, data['measures']))}")
             print(f"  Header row: {header_row}, Skip rows: {skip_rows}")
 
-            progress_queue = queue.Queue()
-
-            def progress_callback(current, total, message):
-                """Callback to send progress updates."""
-                progress_queue.put({
-                    'current': current,
-                    'total': total,
-                    'message': message
-                })
+            try:
+                job, created = submit_generic_job(data)
+            except Exception as e:
+                error = str(e)
+                return Response(iter([f"data: {json.dumps({'error': error})}\n\n"]), mimetype='text/event-stream')
 
-            def generate():
-                """Generator function for SSE."""
-                try:
-                    # Start processing in background thread
-                    def process_in_thread():
-                        try:
-                            processor = GenericProcessor(
-                                input_file=input_file,
-                                chart_name=chart_name,
-                                tree_order=tree_order,
-                                value_column=value_column,
-                                data_path=DATA_DIR,
-                                session_id=session_id,
-                                header_row=header_row,
-                                skip_rows=skip_rows,
-                                progress_callback=progress_callback
-                            )
-                            processor.process_all()
-                            progress_queue.put({'done': True})
-                        except Exception as e:
-                            progress_queue.put({'error': str(e)})
-
-                    thread = threading.Thread(target=process_in_thread)
-                    thread.start()
-
-                    # Stream progress updates
-                    while True:
-                        update = progress_queue.get()
-
-                        if 'error' in update:
-                            yield f"data: {json.dumps({'error': update['error']})}\n\n"
-                            break
-                        elif 'done' in update:
-                            yield f"data: {json.dumps({'done': True})}\n\n"
-                            break
-                        else:
-                            yield f"data: {json.dumps(update)}\n\n"
-
-                    thread.join()
-
-                except Exception as e:
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-            return Response(stream_with_context(generate()), mimetype='text/event-stream')
+            # A job started by this stream is cancelled when the stream is closed
+            return Response(stream_with_context(stream_job_events(job['job_id'], cancel_on_disconnect=created)),
+                            mimetype='text/event-stream')
 
         else:
             # Legacy mode - security reports (no progress tracking)
@@ -483,5 +645,324 @@ def process_file():
         return jsonify({"error": str(e)}), 500
 
 
+def submit_generic_job(data):
+    """
+    Validate a generic processing request and queue it as a job.
+
+    An identical request for the same session that is still queued or
+    running is joined instead of started again.
+
+    Returns:
+        (job state, True if a new job was queued)
+
+    Raises:
+        ValueError: If the request parameters are invalid
+    """
+    header_row, skip_rows = parse_offsets(data)
+    params = {
+        'input_file': data.get("filePath"),
+        'chart_name': data.get("chartName"),
+        'tree_order': data.get("treeOrder"),
+        'value_column': data.get("valueColumn"),
+        'data_path': DATA_DIR,
+        'session_id': data.get("sessionId", "default"),
+        'header_row': header_row,
+        'skip_rows': skip_rows,
+        'column_types': data.get("columnTypes"),
+        'measures': data.get("measures"),
+        'cube_dimensions': data.get("cubeDimensions")
+    }
+    if not params['input_file']:
+        raise ValueError("Missing required parameter: filePath")
+
+    try:
+        priority = int(data.get("priority", 0))
+    except (TypeError, ValueError):
+        raise ValueError("priority must be an integer")
+
+    timeout = data.get("timeoutSeconds")
+    if timeout is not None:
+        try:
+            timeout = float(timeout)
+        except (TypeError, ValueError):
+            raise ValueError("timeoutSeconds must be a number")
+        if timeout <= 0:
+            raise ValueError("timeoutSeconds must be positive")
+
+    # Constructing the processor validates the parameters without reading the file
+    processor = GenericProcessor(**params)
+    size = processor.raw_data_path.stat().st_size if processor.raw_data_path.is_file() else 0
+
+    # A repeated request joins the running build; a new build for a session
+    # replaces any other build or append still queued or running for it. Submissions
+    # for a session are serialized across workers, so two simultaneous
+    # requests cannot both start a job.
+    with file_lock(single_flight.lock_path(f"submit|{params['session_id']}")):
+        for job in job_manager.active_jobs():
+            if job['params'].get('session_id') != params['session_id']:
+                continue
+            if job['kind'] == 'generic' and job['params'] == params:
+                print(f"Joining identical job {job['job_id']} for session {params['session_id']}")
+                return job, False
+            print(f"Cancelling superseded job {job['job_id']} for session {params['session_id']}")
+            job_manager.cancel(job['job_id'], "Superseded by a newer job for this session")
+
+        return job_manager.submit('generic', params, priority=priority, size=size, timeout=timeout), True
+
+
+def stream_job_events(job_id, cancel_on_disconnect=False):
+    """
+    Server-Sent Events for a job: {"jobId"} with the first progress event,
+    then progress events, then {"done": true} or {"error": ...} (with
+    "cancelled": true if the job was cancelled).
+
+    The job's state file is polled, so any web worker can stream any job;
+    it is only re-read when a stat shows it changed, so idle streams are
+    cheap. With cancel_on_disconnect, the job is cancelled if the client
+    goes away before it finishes.
+    """
+    last_update = None
+    last_version = None
+    last_sent = time.monotonic()
+    first = True
+    finished = False
+
+    try:
+        while True:
+            version = job_manager.store.version(job_id)
+            if version is not None and version == last_version:
+                if time.monotonic() - last_sent >= JOB_KEEPALIVE_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            last_version = version
+
+            job = job_manager.get(job_id)
+            if job is None:
+                finished = True
+                yield f"data: {json.dumps({'error': f'Job not found: {job_id}'})}\n\n"
+                return
+
+            if job['status'] in TERMINAL_STATUSES:
+                finished = True
+                if job['status'] == DONE:
+                    yield f"data: {json.dumps({'done': True, 'jobId': job_id})}\n\n"
+                else:
+                    event = {'error': job['error'], 'jobId': job_id}
+                    if job['status'] == CANCELLED:
+                        event['cancelled'] = True
+                    yield f"data: {json.dumps(event)}\n\n"
+                return
+
+            if job['updated_at'] != last_update:
+                last_update = job['updated_at']
+                update = dict(job['progress'], status=job['status'])
+                if first:
+                    update['jobId'] = job_id
+                    first = False
+                yield f"data: {json.dumps(update)}\n\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= JOB_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+            time.sleep(JOB_POLL_SECONDS)
+    finally:
+        # Runs when the server closes the stream after a failed write
+        if cancel_on_disconnect and not finished:
+            print(f"Client disconnected; cancelling job {job_id}")
+            job_manager.cancel(job_id, "Client disconnected")
+
+
+@bp.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Queue a generic processing job and return its id without waiting.
+
+    Takes the same body as generic /process, plus an optional integer
+    "priority" (lower starts first, default 0).
+    """
+    try:
+        job, _ = submit_generic_job(request.json or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error creating job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"jobId": job['job_id'], "status": job['status']}), 202
+
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Current status and progress of a job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({
+        "jobId": job['job_id'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "error": job['error'],
+        "priority": job['priority'],
+        "size": job['size'],
+        "createdAt": job['created_at'],
+        "startedAt": job['started_at'],
+        "finishedAt": job['finished_at']
+    })
+
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job; running jobs stop at their next cancellation point."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] in (DONE, ERROR):
+        return jsonify({"error": f"Job already finished ({job['status']})", "status": job['status']}), 409
+
+    return jsonify({"jobId": job['job_id'], "status": job['status'], "cancelRequested": True}), 202
+
+
+@bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream a job's progress as Server-Sent Events (same format as /process)."""
+    if job_manager.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return Response(stream_with_context(stream_job_events(job_id)), mimetype='text/event-stream')
+
+
+@bp.route('/repivot', methods=['POST'])
+def repivot_chart():
+    """
+    Rebuild a processed session's chart for a new hierarchy, value column or
+    measures, from the session's columnar copy instead of the raw upload.
+
+    Body: sessionId plus any of treeOrder, valueColumn, measures,
+    cubeDimensions and chartName; omitted ones keep the chart's current values. Returns the new
+    chart, which also replaces the session's chart data.
+    """
+    data = request.json or {}
+    session_id = data.get("sessionId", "default")
+    chart_path = Path(DATA_DIR) / f"{session_id}_sunburst_data.json"
+
+    # Serialized with job submission for the session, so a build cannot
+    # start halfway through a re-pivot
+    with file_lock(single_flight.lock_path(f"submit|{session_id}")):
+        for job in job_manager.active_jobs():
+            if job['params'].get('session_id') == session_id:
+                return jsonify({"error": "This session is still being processed", "jobId": job['job_id']}), 409
+
+        try:
+            with open(chart_path, 'r') as f:
+                previous = json.load(f)
+        except FileNotFoundError:
+            return jsonify({"error": "Data file not found"}), 404
+
+        try:
+            measures = data["measures"] if "measures" in data else [spec['id'] for spec in previous.get('measures', [])[1:]]
+            processor = GenericProcessor(
+                input_file=previous['source_file'],
+                chart_name=data.get("chartName") or previous['chart_name'],
+                tree_order=data.get("treeOrder") or previous['tree_order'],
+                value_column=data.get("valueColumn") or previous['value_column'],
+                data_path=DATA_DIR,
+                session_id=session_id,
+                header_row=previous.get('header_row', 0),
+                skip_rows=previous.get('skip_rows', 0),
+                column_types=previous.get('column_types'),
+                measures=measures,
+                cube_dimensions=data["cubeDimensions"] if "cubeDimensions" in data else previous.get('cube_dimensions')
+            )
+            metadata = run_blocking(processor.repivot, previous)
+        except FileNotFoundError as e:
+            # Charts built before columnar copies existed, or from very large uploads
+            return jsonify({"error": f"{str(e)}; process the file again instead"}), 409
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            print(f"Error re-pivoting session {session_id}: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+    return jsonify(metadata), 200
+
+
+@bp.route('/append', methods=['POST'])
+def append_file():
+    """
+    Add the rows of another upload with the same columns (e.g. the next day's
+    export) to a processed session's chart, aggregating only the new rows.
+
+    Body: sessionId and filePath. Runs as a job and streams its progress like
+    /process; closing the stream cancels it.
+    """
+    data = request.json or {}
+    session_id = data.get("sessionId", "default")
+    input_file = data.get("filePath")
+    if not input_file:
+        return jsonify({"error": "Missing required parameter: filePath"}), 400
+
+    full_path = Path(UPLOAD_DIR) / input_file
+    if not full_path.is_file():
+        return jsonify({"error": f"File not found: {input_file}"}), 404
+    if not (Path(DATA_DIR) / f"{session_id}_sunburst_data.json").exists():
+        return jsonify({"error": "Data file not found"}), 404
+
+    params = {'input_file': input_file, 'data_path': DATA_DIR, 'session_id': session_id}
+
+    # Serialized with job submission for the session; the rows are merged
+    # into the finished chart, so none may be building
+    with file_lock(single_flight.lock_path(f"submit|{session_id}")):
+        for job in job_manager.active_jobs():
+            if job['params'].get('session_id') == session_id:
+                return jsonify({"error": "This session is still being processed", "jobId": job['job_id']}), 409
+        job = job_manager.submit('append', params, size=full_path.stat().st_size)
+
+    print(f"Appending {input_file} to session {session_id} (job {job['job_id']})")
+    return Response(stream_with_context(stream_job_events(job['job_id'], cancel_on_disconnect=True)),
+                    mimetype='text/event-stream')
+
+
+@bp.route('/cube', methods=['GET'])
+def query_cube():
+    """
+    Answer a rollup from a session's aggregation cube, without touching rows.
+
+    Query parameters: session_id; path (repeated, hierarchy labels from the
+    top, e.g. ?path=Malicious); by (the next hierarchy column or a cube
+    dimension; omitted for the totals only); measure (one measure id); limit.
+    """
+    session_id = request.args.get('session_id', 'default')
+    path = request.args.getlist('path')
+    by = request.args.get('by') or None
+
+    try:
+        measure = request.args.get('measure')
+        measure = parse_measure(measure)['id'] if measure else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        limit = request.args.get('limit')
+        limit = int(limit) if limit else None
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    try:
+        # Loading and first use of a cuboid can take a while for large cubes
+        result = run_blocking(lambda: load_cube(cube_path(DATA_DIR, session_id)).query(
+            path, by=by, measure=measure, limit=limit))
+    except FileNotFoundError:
+        return jsonify({"error": "Cube not found; process the file again"}), 404
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(result), 200
+
+
 if __name__ == '__main__':
     app.run(debug=False, port=int(os.getenv('FLASK_PORT', 6500)))
@@ -0,0 +1,145 @@
+"""
+On-disk cache for upload analysis results.
+
+The upload wizard calls /analyze, /file-info and /validate-columns against the
+same file several times in one import session. Results are cached next to the
+upload, keyed by the file's fingerprint plus the parse parameters, so repeat
+calls skip the parse entirely. With a SingleFlight, concurrent misses for the
+same entry compute it once.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from .upload_store import UploadStore
+
+
+class AnalysisCache:
+    """Content-keyed JSON cache with size-based eviction."""
+
+    CACHE_DIR_NAME = '.analysis_cache'
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+    def __init__(self, upload_dir: Union[str, Path], max_bytes: Optional[int] = None,
+                 single_flight: Any = None):
+        """
+        Initialize the cache.
+
+        Args:
+            upload_dir: Directory holding uploads; the cache lives inside it
+            max_bytes: Maximum total size of cache entries before eviction
+            single_flight: Optional SingleFlight used by get_or_compute
+        """
+        self.cache_dir = Path(upload_dir) / self.CACHE_DIR_NAME
+        if max_bytes is None:
+            max_bytes = int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', self.DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+        self.single_flight = single_flight
+
+    @staticmethod
+    def fingerprint(file_path: Union[str, Path]) -> str:
+        """
+        Identify file content.
+
+        Uploads stored by content digest are identified by that digest, so
+        re-uploads of the same bytes share cache entries. Other files fall
+        back to path, modification time and size.
+        """
+        digest = UploadStore.digest_from_name(file_path)
+        if digest:
+            return digest
+
+        path = Path(file_path)
+        stat = path.stat()
+        raw = f"{path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def key(self, file_path: Union[str, Path], kind: str, **params) -> str:
+        """Build the cache key for a file, result kind and parse parameters."""
+        raw = json.dumps({
+            'file': self.fingerprint(file_path),
+            'kind': kind,
+            'params': params
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, file_path: Union[str, Path], kind: str, **params) -> Optional[Any]:
+        """Return the cached value, or None on a miss."""
+        entry_path = self.cache_dir / f"{self.key(file_path, kind, **params)}.json"
+
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Touch on hit so eviction drops least recently used entries first
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return value
+
+    def set(self, file_path: Union[str, Path], kind: str, value: Any, **params) -> None:
+        """Store a JSON-serializable value and evict old entries if needed."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_path = self.cache_dir / f"{self.key(file_path, kind, **params)}.json"
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False, default=str)
+        os.replace(temp_path, entry_path)
+
+        self._evict()
+
+    def get_or_compute(self, file_path: Union[str, Path], kind: str,
+                       compute: Callable[[], Any], **params) -> Any:
+        """
+        Return the cached value, computing and storing it on a miss.
+
+        With a single_flight, concurrent misses for the same entry (in this
+        or another process) wait for one computation instead of repeating it.
+        """
+        value = self.get(file_path, kind, **params)
+        if value is not None:
+            return value
+
+        def compute_and_store():
+            # Another caller may have stored it while this one waited
+            value = self.get(file_path, kind, **params)
+            if value is None:
+                value = compute()
+                self.set(file_path, kind, value, **params)
+            return value
+
+        if self.single_flight is None:
+            return compute_and_store()
+        return self.single_flight.do(self.key(file_path, kind, **params), compute_and_store)
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = []
+        total = 0
+
+        for entry in self.cache_dir.glob('*.json'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, entry in sorted(entries):
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
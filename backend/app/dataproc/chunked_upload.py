@@ -0,0 +1,230 @@
+"""
+Resumable chunked uploads.
+
+A large file is uploaded as numbered fixed-size chunks. Each chunk is written
+at its own offset in a preallocated temp file, so chunks can arrive in any
+order and in parallel, and an interrupted upload resumes by sending only the
+chunks that are missing. Finishing verifies the assembled file's size and
+SHA-256 before handing it to the UploadStore.
+
+Uploads not written to for CHUNKED_UPLOAD_MAX_AGE_SECONDS are considered
+abandoned and removed when the next upload starts.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from werkzeug.utils import secure_filename
+
+from .upload_store import UploadStore
+
+
+# Seconds without writes after which an unfinished upload is removed
+CHUNKED_UPLOAD_MAX_AGE_SECONDS = int(os.getenv('CHUNKED_UPLOAD_MAX_AGE_SECONDS', 24 * 3600))
+
+
+class ChunkedUploadError(ValueError):
+    """Raised for invalid chunked upload requests (unknown id, bad chunk, failed integrity check)."""
+
+
+class ChunkedUploadManager:
+    """Tracks in-progress chunked uploads under UPLOAD_DIR/.partial."""
+
+    PARTIAL_DIR_NAME = '.partial'
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024    # 8MB
+    MAX_CHUNK_SIZE = 64 * 1024 * 1024       # 64MB
+    READ_SIZE = 1024 * 1024
+    UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, upload_dir: Union[str, Path], upload_store: UploadStore):
+        self.partial_dir = Path(upload_dir) / self.PARTIAL_DIR_NAME
+        self.upload_store = upload_store
+
+    def start(self, filename: str, total_size: int, chunk_size: Optional[int] = None,
+              sha256: Optional[str] = None) -> Dict:
+        """
+        Begin an upload and preallocate its temp file.
+
+        Args:
+            filename: Client file name (may be compressed, e.g. report.csv.gz)
+            total_size: Size of the whole file in bytes
+            chunk_size: Bytes per chunk (last chunk may be shorter)
+            sha256: Optional hex digest of the whole file, checked on finish
+
+        Returns:
+            Upload status dictionary (see status())
+
+        Raises:
+            UploadTooLarge: If total_size is above the upload store's limit
+        """
+        chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        if total_size < 0:
+            raise ChunkedUploadError("size must not be negative")
+        self.upload_store.check_upload_size(total_size)
+        if not 0 < chunk_size <= self.MAX_CHUNK_SIZE:
+            raise ChunkedUploadError(f"chunkSize must be between 1 and {self.MAX_CHUNK_SIZE} bytes")
+
+        self.prune()
+
+        upload_id = uuid.uuid4().hex
+        upload_dir = self.partial_dir / upload_id
+        upload_dir.mkdir(parents=True)
+
+        manifest = {
+            'upload_id': upload_id,
+            'filename': secure_filename(filename),
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': max((total_size + chunk_size - 1) // chunk_size, 1),
+            'sha256': sha256.lower() if sha256 else None
+        }
+        with open(upload_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+        # Sparse preallocation; chunks are written in place at their offsets
+        with open(upload_dir / 'data.part', 'wb') as f:
+            f.truncate(total_size)
+
+        return self.status(upload_id)
+
+    def write_chunk(self, upload_id: str, index: int, stream: BinaryIO,
+                    chunk_sha256: Optional[str] = None) -> Dict:
+        """
+        Write one chunk at its offset and mark it received.
+
+        Re-sending a chunk overwrites it, so retries are safe. The marker is
+        only written once the chunk is fully on disk.
+        """
+        upload_dir, manifest = self._load(upload_id)
+
+        if not 0 <= index < manifest['total_chunks']:
+            raise ChunkedUploadError(f"Chunk index {index} out of range (0-{manifest['total_chunks'] - 1})")
+
+        offset = index * manifest['chunk_size']
+        expected = min(manifest['chunk_size'], manifest['total_size'] - offset)
+        digest = hashlib.sha256()
+        written = 0
+
+        # A retry invalidates the previous copy until it is fully rewritten
+        marker = upload_dir / f"{index}.done"
+        marker.unlink(missing_ok=True)
+
+        fd = os.open(upload_dir / 'data.part', os.O_WRONLY)
+        try:
+            while True:
+                data = stream.read(self.READ_SIZE)
+                if not data:
+                    break
+                if written + len(data) > expected:
+                    raise ChunkedUploadError(f"Chunk {index} is larger than {expected} bytes")
+                os.pwrite(fd, data, offset + written)
+                digest.update(data)
+                written += len(data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        if written != expected:
+            raise ChunkedUploadError(f"Chunk {index} has {written} bytes, expected {expected}")
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+            raise ChunkedUploadError(f"Chunk {index} failed its checksum")
+
+        marker.touch()
+
+        return {'uploadId': upload_id, 'index': index, 'received': written}
+
+    def status(self, upload_id: str) -> Dict:
+        """Report which chunks have been received so a client can resume."""
+        upload_dir, manifest = self._load(upload_id)
+        received = self._received(upload_dir)
+
+        return {
+            'uploadId': upload_id,
+            'filename': manifest['filename'],
+            'size': manifest['total_size'],
+            'chunkSize': manifest['chunk_size'],
+            'totalChunks': manifest['total_chunks'],
+            'received': sorted(received),
+            'missing': [i for i in range(manifest['total_chunks']) if i not in received]
+        }
+
+    def finish(self, upload_id: str) -> Tuple[str, bool]:
+        """
+        Verify the assembled file and move it into the upload store.
+
+        Returns:
+            (stored file name, True if an identical upload already existed)
+        """
+        upload_dir, manifest = self._load(upload_id)
+        missing = self.status(upload_id)['missing']
+        if missing:
+            raise ChunkedUploadError(f"Upload incomplete: {len(missing)} chunk(s) missing")
+
+        part_path = upload_dir / 'data.part'
+        if part_path.stat().st_size != manifest['total_size']:
+            raise ChunkedUploadError("Assembled file size does not match the declared size")
+
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for data in iter(lambda: f.read(self.READ_SIZE), b''):
+                digest.update(data)
+
+        if manifest['sha256'] and digest.hexdigest() != manifest['sha256']:
+            raise ChunkedUploadError("Uploaded file failed its SHA-256 integrity check")
+
+        try:
+            base_name, file_ext, compression = UploadStore.split_name(manifest['filename'])
+            if compression is None:
+                # Plain files are moved into place; the digest is already known.
+                # The file gets its real extension first, which the Excel reader goes by
+                data_path = part_path.with_name(f"data.{file_ext}")
+                os.replace(part_path, data_path)
+                return self.upload_store.store(data_path, base_name, file_ext, digest.hexdigest())
+
+            with open(part_path, 'rb') as f:
+                return self.upload_store.ingest(f, manifest['filename'])
+        finally:
+            self.abort(upload_id)
+
+    def abort(self, upload_id: str) -> None:
+        """Discard an upload and its temp data."""
+        upload_dir, _ = self._load(upload_id)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def prune(self, max_age: Optional[float] = None) -> None:
+        """Remove uploads that received no chunk (or were not started) within max_age seconds."""
+        if not self.partial_dir.exists():
+            return
+        cutoff = time.time() - (CHUNKED_UPLOAD_MAX_AGE_SECONDS if max_age is None else max_age)
+        for upload_dir in self.partial_dir.iterdir():
+            try:
+                # Chunk writes touch the data file; chunk markers touch the directory
+                last_write = max(upload_dir.stat().st_mtime, (upload_dir / 'data.part').stat().st_mtime)
+            except OSError:
+                last_write = 0
+            if last_write < cutoff:
+                print(f"Removing abandoned upload {upload_dir.name}")
+                shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def _load(self, upload_id: str) -> Tuple[Path, Dict]:
+        """Return (upload directory, manifest) for an upload id."""
+        if not self.UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise ChunkedUploadError(f"Unknown upload: {upload_id}")
+
+        upload_dir = self.partial_dir / upload_id
+        try:
+            with open(upload_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+                return upload_dir, json.load(f)
+        except OSError:
+            raise ChunkedUploadError(f"Unknown upload: {upload_id}")
+
+    @staticmethod
+    def _received(upload_dir: Path) -> set:
+        """Indices of chunks whose markers exist."""
+        return {int(marker.stem) for marker in upload_dir.glob('*.done')}
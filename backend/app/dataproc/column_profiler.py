@@ -0,0 +1,287 @@
+"""
+Streaming column profiler.
+
+Profiles every column of a file in one chunked pass with bounded memory:
+type, numeric ratio, null ratio, numeric min/max and an approximate distinct
+count from a K-minimum-values sketch. The result feeds /file-info and the
+column selector.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .file_loader import FileLoader
+from .generic_processor import GenericProcessor, WIDE_FILE_COLUMNS
+
+
+class DistinctSketch:
+    """
+    K-minimum-values sketch for approximate distinct counts.
+
+    Keeps the k smallest 64-bit hashes seen. Below k distinct values the
+    count is exact; above it the estimate has roughly 1/sqrt(k) relative error.
+    """
+
+    HASH_SPACE = float(2 ** 64)
+
+    def __init__(self, k: int = 1024):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, series: pd.Series) -> None:
+        """Add the non-null values of a series."""
+        values = series.dropna()
+        if len(values) == 0:
+            return
+
+        if pd.api.types.is_numeric_dtype(values):
+            # Hash numbers by value so 5 and 5.0 from differently typed chunks agree
+            hashed = pd.util.hash_array(values.to_numpy(dtype='float64'))
+        else:
+            hashed = pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+
+        self.hashes = np.unique(np.concatenate([self.hashes, hashed]))[:self.k]
+
+    @property
+    def exact(self) -> bool:
+        """True while fewer than k distinct values have been seen."""
+        return len(self.hashes) < self.k
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values."""
+        if self.exact:
+            return len(self.hashes)
+        return int(round((self.k - 1) * self.HASH_SPACE / (float(self.hashes[-1]) + 1)))
+
+
+class _ColumnStats:
+    """Running statistics for one column."""
+
+    def __init__(self, name: Any, sketch_size: int):
+        self.name = name
+        self.non_null = 0
+        self.nulls = 0
+        self.nonzero_numeric = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.sample: Any = None
+        self.sketch = DistinctSketch(sketch_size)
+
+    def update(self, series: pd.Series) -> None:
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        if len(non_null) == 0:
+            return
+
+        if self.sample is None:
+            self.sample = non_null.iloc[0]
+
+        self.non_null += len(non_null)
+        self.sketch.update(non_null)
+
+        parsed = GenericProcessor.parse_numeric_series(non_null)
+        self.nonzero_numeric += int((parsed.fillna(0.0) != 0).sum())
+
+        parsed = parsed.dropna()
+        if len(parsed) > 0:
+            chunk_min, chunk_max = float(parsed.min()), float(parsed.max())
+            self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+            self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+
+    def result(self, row_count: int) -> Dict[str, Any]:
+        if self.non_null == 0:
+            col_type, suitable_for_value, sample = 'empty', False, None
+        else:
+            numeric_ratio = self.nonzero_numeric / self.non_null
+            if numeric_ratio > 0.8:  # 80%+ can be converted to numeric
+                col_type, suitable_for_value, sample = 'numeric', True, self.sample
+            else:
+                col_type, suitable_for_value, sample = 'text', False, str(self.sample)[:50]  # Truncate long samples
+
+        numeric = col_type == 'numeric'
+        return {
+            'name': self.name,
+            'type': col_type,
+            'sample': str(sample) if sample is not None else None,
+            'unique_count': min(self.sketch.estimate(), self.non_null),
+            'unique_count_exact': self.sketch.exact,
+            'suitable_for_value': suitable_for_value,
+            'numeric_ratio': self.nonzero_numeric / self.non_null if self.non_null else 0.0,
+            'null_ratio': self.nulls / row_count if row_count else 0.0,
+            'min': self.min if numeric else None,
+            'max': self.max if numeric else None
+        }
+
+
+class _BlockStats:
+    """
+    Running statistics for all columns of a wide file, updated per chunk in bulk.
+
+    Instead of one set of pandas calls per column, each chunk is handled as
+    two blocks: numeric columns use frame-wide reductions, and text columns
+    are flattened into one long series that is cleaned, parsed and hashed
+    once, then reduced by column code. Distinct-count sketches for every
+    column live in a single (column, hash) frame.
+    """
+
+    def __init__(self, columns: List[Any], sketch_size: int):
+        self.columns = list(columns)
+        self.sketch_size = sketch_size
+        n = len(self.columns)
+        self.non_null = np.zeros(n, dtype=np.int64)
+        self.nulls = np.zeros(n, dtype=np.int64)
+        self.nonzero_numeric = np.zeros(n, dtype=np.int64)
+        self.min = np.full(n, np.nan)
+        self.max = np.full(n, np.nan)
+        self.samples: List[Any] = [None] * n
+        self.sketch = pd.DataFrame({'col': np.empty(0, dtype=np.int64), 'hash': np.empty(0, dtype=np.uint64)})
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        # Positional access keeps duplicate column names apart
+        chunk = chunk.set_axis(range(len(self.columns)), axis=1)
+
+        not_null = chunk.notna()
+        counts = not_null.sum().to_numpy()
+        self.non_null += counts
+        self.nulls += len(chunk) - counts
+
+        # First non-null value per column, for columns still missing a sample
+        missing = [i for i, sample in enumerate(self.samples) if sample is None and counts[i] > 0]
+        if missing:
+            first = chunk[missing].bfill().iloc[0]
+            for i in missing:
+                self.samples[i] = first[i]
+
+        numeric_cols = chunk.select_dtypes(include='number').columns.tolist()
+        text_cols = [i for i in range(len(self.columns)) if i not in set(numeric_cols)]
+        hashed = []
+
+        if numeric_cols:
+            block = chunk[numeric_cols].astype(float)
+            self.nonzero_numeric[numeric_cols] += (block.fillna(0.0) != 0).sum().to_numpy()
+            self._merge_range(numeric_cols, block.min().to_numpy(), block.max().to_numpy())
+
+            values = block.to_numpy().ravel(order='F')
+            codes = np.repeat(np.array(numeric_cols), len(block))
+            keep = ~np.isnan(values)
+            hashed.append((codes[keep], pd.util.hash_array(values[keep])))
+
+        if text_cols:
+            long = chunk[text_cols].melt(var_name='col', value_name='value').dropna(subset=['value'])
+            codes = long['col'].to_numpy(dtype=np.int64)
+
+            # Text repeats heavily across rows and columns: parse and hash each
+            # distinct value once, then map the results back by position
+            positions, uniques = pd.factorize(long['value'].astype(object))
+            uniques = pd.Series(uniques, dtype=object)
+            parsed = pd.Series(GenericProcessor.parse_numeric_series(uniques).to_numpy()[positions])
+
+            nonzero = (parsed.fillna(0.0) != 0).to_numpy()
+            self.nonzero_numeric += np.bincount(codes[nonzero], minlength=len(self.columns))
+
+            grouped = parsed.groupby(codes)
+            chunk_min, chunk_max = grouped.min(), grouped.max()
+            self._merge_range(chunk_min.index.tolist(), chunk_min.to_numpy(), chunk_max.to_numpy())
+
+            unique_hashes = pd.util.hash_array(uniques.astype(str).to_numpy(dtype=object))
+            hashed.append((codes, unique_hashes[positions]))
+
+        self._update_sketch(hashed)
+
+    def _merge_range(self, cols: List[int], chunk_min: np.ndarray, chunk_max: np.ndarray) -> None:
+        self.min[cols] = np.fmin(self.min[cols], chunk_min)
+        self.max[cols] = np.fmax(self.max[cols], chunk_max)
+
+    def _update_sketch(self, hashed: List[tuple]) -> None:
+        """Keep the k smallest distinct hashes per column, for all columns at once."""
+        frames = [self.sketch] + [pd.DataFrame({'col': codes, 'hash': hashes}) for codes, hashes in hashed]
+        merged = pd.concat(frames, ignore_index=True).drop_duplicates()
+        merged = merged.sort_values(['col', 'hash'], kind='mergesort')
+        self.sketch = merged.groupby('col', sort=False).head(self.sketch_size).reset_index(drop=True)
+
+    def results(self, row_count: int) -> List[Dict[str, Any]]:
+        sketches = {col: group['hash'].to_numpy() for col, group in self.sketch.groupby('col')}
+
+        results = []
+        for i, name in enumerate(self.columns):
+            # Reuse the per-column result builder with this column's aggregates
+            stats = _ColumnStats(name, self.sketch_size)
+            stats.non_null = int(self.non_null[i])
+            stats.nulls = int(self.nulls[i])
+            stats.nonzero_numeric = int(self.nonzero_numeric[i])
+            stats.min = None if np.isnan(self.min[i]) else float(self.min[i])
+            stats.max = None if np.isnan(self.max[i]) else float(self.max[i])
+            stats.sample = self.samples[i]
+            stats.sketch.hashes = sketches.get(i, stats.sketch.hashes)
+            results.append(stats.result(row_count))
+
+        return results
+
+
+class ColumnProfiler:
+    """Profiles all columns of a CSV/XLSX file in a single streaming pass."""
+
+    DEFAULT_CHUNK_ROWS = 100000
+    DEFAULT_SKETCH_SIZE = 1024
+    MAX_CHUNK_CELLS = 5000000  # Caps chunk memory for wide files
+
+    def __init__(self, file_path: Union[str, Path], header_row: int = 0, skip_rows: int = 0,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS, sketch_size: int = DEFAULT_SKETCH_SIZE, cache: Any = None):
+        self.file_path = Path(file_path)
+        self.header_row = header_row
+        self.skip_rows = skip_rows
+        self.chunk_rows = chunk_rows
+        self.sketch_size = sketch_size
+        self.cache = cache
+
+    def _chunks(self) -> Iterator[pd.DataFrame]:
+        """Yield the file as dataframes of at most chunk_rows rows."""
+        loader = FileLoader(self.file_path, header_row=self.header_row, skip_rows=self.skip_rows, cache=self.cache)
+        columns = loader.columns()
+        chunk_rows = max(min(self.chunk_rows, self.MAX_CHUNK_CELLS // max(len(columns), 1)), 1000)
+        yield from loader.iter_chunks(chunk_rows)
+
+    def profile(self) -> Dict[str, Any]:
+        """
+        Profile every column.
+
+        Returns:
+            Dictionary with 'columns' (list of column profiles, in file order)
+            and 'row_count' (exact number of data rows)
+        """
+        stats: Dict[Any, _ColumnStats] = {}
+        block_stats: Optional[_BlockStats] = None
+        row_count = 0
+
+        for chunk in self._chunks():
+            row_count += len(chunk)
+
+            if len(chunk.columns) >= WIDE_FILE_COLUMNS:
+                # Wide files: bulk reductions over the whole chunk
+                if block_stats is None:
+                    block_stats = _BlockStats(chunk.columns, self.sketch_size)
+                block_stats.update(chunk)
+                continue
+
+            if not stats:
+                stats = {col: _ColumnStats(col, self.sketch_size) for col in chunk.columns}
+            for col, column_stats in stats.items():
+                column_stats.update(chunk[col])
+
+        if block_stats is not None:
+            columns = block_stats.results(row_count)
+        else:
+            columns = [column_stats.result(row_count) for column_stats in stats.values()]
+
+        return {
+            'columns': columns,
+            'row_count': row_count
+        }
+
+
+def profile_file(file_path: Union[str, Path], header_row: int = 0, skip_rows: int = 0,
+                 cache: Any = None) -> Dict[str, Any]:
+    """Profile all columns of a file; see ColumnProfiler.profile."""
+    return ColumnProfiler(file_path, header_row=header_row, skip_rows=skip_rows, cache=cache).profile()
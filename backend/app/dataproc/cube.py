@@ -0,0 +1,447 @@
+"""
+Precomputed aggregation cube for drill and rollup queries.
+
+Processing materializes, next to the chart, the value sum and every measure
+grouped by each prefix of the hierarchy, each broken down by the next
+hierarchy level and by any extra dimensions picked for the chart. A rollup
+such as "spend by country within Malicious" is then a lookup in one of
+these cuboids instead of a scan over the rows.
+
+Cuboids are saved as dataframes. When a cuboid is first queried in a
+process, it is indexed by hierarchy prefix into ready-to-send rows, so later
+queries cost a dictionary lookup regardless of the number of rows.
+
+A cube also keeps what it takes to merge in a cube of new rows (see
+Cube.merge): each group's first appearance in the data, the sum and count
+behind every mean, and a K-minimum-values sketch behind every distinct count
+(the DISTINCT_SKETCH_SIZE smallest value hashes per group). Appending rows to
+a session then aggregates only the new rows. The sketches hold at most
+DISTINCT_SKETCH_SIZE hashes, 8 bytes each plus the group's labels, per group
+of every cuboid, so a merged distinct count is exact up to that many values
+and an estimate within a few percent above it.
+"""
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .measures import aggregate_frame, aggregate_groups, json_number, mean_state_columns, parse_measure
+
+
+# Loaded cubes kept per process, most recently used last
+LOADED_CUBES_MAX = 8
+
+# Cuboid column with each group's first appearance in the data; ties in
+# value are ordered by it, as in the chart
+ORDER_COLUMN = '#order'
+
+# Aggregation merging the per-group values of two cubes, by measure aggregation
+# (mean and distinct are recomputed from their merge state)
+MERGE_AGGREGATIONS = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max', 'mean': 'first', 'distinct': 'first'}
+
+# Value hashes kept per group to merge distinct counts; counts stay exact
+# below it and are estimated with roughly 1/sqrt(k) relative error above
+DISTINCT_SKETCH_SIZE = 1024
+
+# Sketch column with the hashes of a group's values
+HASH_COLUMN = '#hash'
+
+HASH_SPACE = float(2 ** 64)
+
+
+def cube_path(data_path: Path, session_id: str) -> Path:
+    """Cube file of a session."""
+    return Path(data_path) / f"{session_id}_cube.pkl"
+
+
+class Cube:
+    """Aggregates per hierarchy prefix, broken down by the next level or an extra dimension."""
+
+    FORMAT_VERSION = 3
+
+    def __init__(self, tree_order: List[str], dimensions: List[str], measures: List[str],
+                 total: Dict[str, Optional[float]], cuboids: Dict[Tuple[int, str], pd.DataFrame],
+                 merge_state: Dict[str, Any]):
+        """
+        Args:
+            tree_order: Hierarchy columns
+            dimensions: Extra dimensions every prefix is broken down by
+            measures: Measure ids, the value sum first
+            total: Measures over all rows
+            cuboids: Aggregates by (prefix length, breakdown column); each
+                frame has the prefix columns, the breakdown column, one
+                column per measure, the mean state columns and ORDER_COLUMN,
+                sorted by value, descending
+            merge_state: 'total' holds the mean state columns over all
+                rows; 'sketches' holds, per cuboid key (or 'total') and
+                distinct measure id, the group columns and the smallest
+                DISTINCT_SKETCH_SIZE value hashes of each group (see
+                _distinct_sketch)
+        """
+        self.tree_order = tree_order
+        self.dimensions = dimensions
+        self.measures = measures
+        self.total = total
+        self.cuboids = cuboids
+        self.merge_state = merge_state
+        self._indexes: Dict[Tuple[int, str], Tuple[Dict[tuple, List[Dict]], Dict[tuple, Dict]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, tree_order: List[str], dimensions: List[str], value_column: str,
+              measures: List[Dict], value_measure: str, level_aggregates: Optional[List[pd.DataFrame]] = None,
+              progress: Optional[Callable[[int], None]] = None) -> 'Cube':
+        """
+        Aggregate validated rows into a cube.
+
+        Args:
+            df: Validated rows, with cleaned hierarchy, value, measure and dimension columns
+            tree_order: Hierarchy columns
+            dimensions: Extra breakdown columns
+            value_column: Column summed into the value
+            measures: Parsed extra measures
+            value_measure: Id of the value sum
+            level_aggregates: Per-level aggregates already computed for the
+                tree (see aggregate_groups); reused instead of grouping again
+            progress: Called with the number of cuboids done; may raise to stop
+
+        Returns:
+            The cube
+        """
+        ids = [value_measure] + [spec['id'] for spec in measures]
+        total = {value_measure: json_number(df[value_column].sum())}
+        total.update(aggregate_frame(df, measures))
+
+        distinct = [spec for spec in measures if spec['agg'] == 'distinct']
+        merge_state = {'total': {}, 'sketches': {'total': {spec['id']: _distinct_sketch(df, [], spec['column'])
+                                                           for spec in distinct}}}
+        for spec in measures:
+            if spec['agg'] == 'mean':
+                state_sum, state_count = mean_state_columns(spec['id'])
+                merge_state['total'][state_sum] = float(df[spec['column']].sum())
+                merge_state['total'][state_count] = float(df[spec['column']].count())
+
+        cuboids = {}
+        for done, (level, by) in enumerate(cls.layout(tree_order, dimensions), start=1):
+            keys = tree_order[:level] + [by]
+            if level_aggregates is not None and level < len(tree_order) and by == tree_order[level]:
+                aggregates = level_aggregates[level]
+            else:
+                grouped = df.groupby(keys, sort=False, observed=True, dropna=False)
+                aggregates = aggregate_groups(grouped, value_column, measures, merge_state=True)
+            frame = aggregates.reset_index()
+            frame.columns = keys + [value_measure] + list(aggregates.columns[1:])
+            # Groups come in order of first appearance
+            frame[ORDER_COLUMN] = range(len(frame))
+            cuboids[(level, by)] = frame.sort_values(value_measure, ascending=False, kind='stable',
+                                                     ignore_index=True)
+            merge_state['sketches'][(level, by)] = {spec['id']: _distinct_sketch(df, keys, spec['column'])
+                                                    for spec in distinct}
+            if progress:
+                progress(done)
+
+        return cls(list(tree_order), list(dimensions), ids, total, cuboids, merge_state)
+
+    @staticmethod
+    def layout(tree_order: List[str], dimensions: List[str]) -> List[Tuple[int, str]]:
+        """
+        The cuboids of a cube, as (prefix length, breakdown column).
+
+        Every prefix, including the empty one, is broken down by the next
+        hierarchy level and by each extra dimension not in the prefix.
+        """
+        cuboids = []
+        for level in range(len(tree_order) + 1):
+            breakdowns = tree_order[level:level + 1] + [dim for dim in dimensions if dim not in tree_order[:level]]
+            cuboids.extend((level, by) for by in dict.fromkeys(breakdowns))
+        return cuboids
+
+    def merge(self, other: 'Cube') -> 'Cube':
+        """
+        Combine with a cube of new rows into the cube of all rows.
+
+        Only aggregates are combined: sums and counts are added, minima and
+        maxima compared, means recomputed from their summed state and
+        distinct counts from the union of their sketches (exact below
+        DISTINCT_SKETCH_SIZE values per group, estimated above). Groups found in
+        both cubes keep their first appearance from this one, and groups
+        only in the other come after, as if its rows followed this cube's.
+
+        Args:
+            other: Cube of the new rows, built with the same hierarchy,
+                dimensions and measures
+
+        Returns:
+            The merged cube
+
+        Raises:
+            ValueError: If the cubes were built differently
+        """
+        if (other.tree_order, other.dimensions, other.measures) != (self.tree_order, self.dimensions, self.measures):
+            raise ValueError("Cannot merge cubes built for different hierarchies, dimensions or measures")
+
+        aggs = {measure: parse_measure(measure)['agg'] for measure in self.measures}
+        sketches = {key: {measure: _merge_sketches(frame, other.merge_state['sketches'][key][measure])
+                          for measure, frame in measures.items()}
+                    for key, measures in self.merge_state['sketches'].items()}
+        merge_state = {'total': {column: self.merge_state['total'][column] + other.merge_state['total'][column]
+                                 for column in self.merge_state['total']},
+                       'sketches': sketches}
+
+        total = {}
+        for measure, agg in aggs.items():
+            ours, theirs = self.total[measure], other.total[measure]
+            if agg in ('sum', 'count'):
+                total[measure] = (ours or 0.0) + (theirs or 0.0)
+            elif agg in ('min', 'max'):
+                values = [value for value in (ours, theirs) if value is not None]
+                total[measure] = (min if agg == 'min' else max)(values) if values else None
+            elif agg == 'mean':
+                state_sum, state_count = mean_state_columns(measure)
+                count = merge_state['total'][state_count]
+                total[measure] = json_number(merge_state['total'][state_sum] / count) if count else None
+            else:
+                total[measure] = float(_sketch_counts(sketches['total'][measure], []))
+
+        cuboids = {}
+        for (level, by), frame in self.cuboids.items():
+            keys = self.tree_order[:level] + [by]
+            added = other.cuboids[(level, by)].copy()
+            added[ORDER_COLUMN] += len(frame)
+            combined = pd.concat([frame, added], ignore_index=True)
+
+            how = {column: (MERGE_AGGREGATIONS[aggs[column]] if column in aggs
+                            else 'min' if column == ORDER_COLUMN else 'sum')
+                   for column in frame.columns[len(keys):]}
+            merged = combined.groupby(keys, sort=False, observed=True, dropna=False).agg(how).reset_index()
+            for measure, agg in aggs.items():
+                if agg == 'mean':
+                    state_sum, state_count = mean_state_columns(measure)
+                    merged[measure] = merged[state_sum] / merged[state_count].where(merged[state_count] > 0)
+                elif agg == 'distinct':
+                    counts = _sketch_counts(sketches[(level, by)][measure], keys)
+                    merged = merged.drop(columns=measure).merge(counts.rename(measure).reset_index(),
+                                                                on=keys, how='left')
+                    merged[measure] = merged[measure].fillna(0)
+            cuboids[(level, by)] = merged[frame.columns].sort_values(
+                [self.measures[0], ORDER_COLUMN], ascending=[False, True], kind='stable', ignore_index=True)
+
+        return Cube(self.tree_order, self.dimensions, self.measures, total, cuboids, merge_state)
+
+    def save(self, path: Path) -> None:
+        """Write the cube to a temp file and rename it over path."""
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        state = {
+            'version': self.FORMAT_VERSION,
+            'tree_order': self.tree_order,
+            'dimensions': self.dimensions,
+            'measures': self.measures,
+            'total': self.total,
+            'cuboids': self.cuboids,
+            'merge_state': self.merge_state
+        }
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path: Path) -> 'Cube':
+        """
+        Read a saved cube.
+
+        Raises:
+            FileNotFoundError: If there is no cube
+            ValueError: If the cube was saved in an older format
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != cls.FORMAT_VERSION:
+            raise ValueError("The cube was built by an older version; process the file again")
+        return cls(state['tree_order'], state['dimensions'], state['measures'], state['total'], state['cuboids'],
+                   state['merge_state'])
+
+    def breakdowns(self, level: int) -> List[str]:
+        """Columns a prefix of this length can be broken down by."""
+        return [by for (cuboid_level, by) in self.cuboids if cuboid_level == level]
+
+    def query(self, path: List[str], by: Optional[str] = None, measure: Optional[str] = None,
+              limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Answer a rollup from the cube.
+
+        Args:
+            path: Hierarchy labels to drill into, from the top (may be empty)
+            by: Column to break the prefix down by: the next hierarchy level
+                or an extra dimension; None for the prefix totals only
+            measure: Only return this measure id
+            limit: Only return the first rows (largest values first)
+
+        Returns:
+            Dictionary with path, by, measures, total (the prefix's
+            measures), rows ([{name, values}], largest value first) and the
+            breakdowns available at this level
+
+        Raises:
+            KeyError: If the path is not in the data
+            ValueError: If by or measure is not available
+        """
+        level = len(path)
+        if level > len(self.tree_order):
+            raise ValueError(f"Path is deeper than the hierarchy ({len(self.tree_order)} levels)")
+        if measure is not None and measure not in self.measures:
+            raise ValueError(f"Measure '{measure}' is not in the cube (available: {', '.join(self.measures)})")
+
+        prefix = tuple(path)
+        if level == 0:
+            total = self.total
+        else:
+            _, totals = self._index(level - 1, self.tree_order[level - 1])
+            if prefix not in totals:
+                raise KeyError(f"No data under {' / '.join(path)}")
+            total = totals[prefix]
+
+        rows = []
+        if by is not None:
+            if (level, by) not in self.cuboids:
+                raise ValueError(f"Cannot break down by '{by}' here "
+                                 f"(available: {', '.join(self.breakdowns(level)) or 'none'})")
+            rows, _ = self._index(level, by)
+            rows = rows.get(prefix, [])
+
+        if measure is not None:
+            total = {measure: total[measure]}
+            rows = [{'name': row['name'], 'values': {measure: row['values'][measure]}} for row in rows]
+            rows.sort(key=lambda row: float('-inf') if row['values'][measure] is None else row['values'][measure],
+                      reverse=True)
+        if limit is not None:
+            rows = rows[:limit]
+
+        return {
+            'path': list(path),
+            'by': by,
+            'measures': [measure] if measure is not None else self.measures,
+            'total': total,
+            'rows': rows,
+            'breakdowns': self.breakdowns(level)
+        }
+
+    def _index(self, level: int, by: str) -> Tuple[Dict[tuple, List[Dict]], Dict[tuple, Dict]]:
+        """
+        Rows of a cuboid grouped by prefix, plus the measures of each prefix + label.
+
+        Built on first use and kept; rows keep the cuboid's value order.
+        """
+        index = self._indexes.get((level, by))
+        if index is not None:
+            return index
+
+        with self._lock:
+            index = self._indexes.get((level, by))
+            if index is None:
+                frame = self.cuboids[(level, by)]
+                frame = frame[list(frame.columns[:level + 1]) + self.measures]
+                rows: Dict[tuple, List[Dict]] = {}
+                totals: Dict[tuple, Dict] = {}
+                for record in frame.itertuples(index=False, name=None):
+                    prefix, name = record[:level], record[level]
+                    name = None if pd.isna(name) else str(name)
+                    values = {measure: json_number(value) for measure, value in zip(self.measures, record[level + 1:])}
+                    rows.setdefault(prefix, []).append({'name': name, 'values': values})
+                    totals[prefix + (name,)] = values
+                index = self._indexes[(level, by)] = (rows, totals)
+        return index
+
+
+def _distinct_sketch(df: pd.DataFrame, keys: List[str], column: str) -> pd.DataFrame:
+    """
+    K-minimum-values sketch of a column's distinct values per group, leaving out missing values.
+
+    Returns:
+        Frame with the group columns and HASH_COLUMN, holding the
+        DISTINCT_SKETCH_SIZE smallest distinct value hashes of each group
+    """
+    present = df[column].notna()
+    values = df.loc[present, column]
+    if pd.api.types.is_numeric_dtype(values):
+        # Hash numbers by value so 5 and 5.0 from differently typed files agree
+        hashed = pd.util.hash_array(values.to_numpy(dtype='float64'))
+    else:
+        hashed = pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+    sketch = df.loc[present, keys].reset_index(drop=True)
+    sketch[HASH_COLUMN] = hashed
+    return _smallest_hashes(sketch.drop_duplicates(), keys)
+
+
+def _merge_sketches(ours: pd.DataFrame, theirs: pd.DataFrame) -> pd.DataFrame:
+    """Sketch of the union of two cubes' values per group."""
+    keys = list(ours.columns[:-1])
+    return _smallest_hashes(pd.concat([ours, theirs], ignore_index=True).drop_duplicates(), keys)
+
+
+def _smallest_hashes(sketch: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Keep the DISTINCT_SKETCH_SIZE smallest hashes per group."""
+    sketch = sketch.sort_values(HASH_COLUMN, kind='stable')
+    if keys:
+        sketch = sketch.groupby(keys, sort=False, observed=True, dropna=False).head(DISTINCT_SKETCH_SIZE)
+    else:
+        sketch = sketch.head(DISTINCT_SKETCH_SIZE)
+    return sketch.reset_index(drop=True)
+
+
+def _sketch_counts(sketch: pd.DataFrame, keys: List[str]) -> Any:
+    """
+    Distinct counts from a sketch: exact while a group has fewer than
+    DISTINCT_SKETCH_SIZE hashes, else estimated from its largest kept hash.
+
+    Returns:
+        Series of counts by group, or the count itself without group columns
+    """
+    if not keys:
+        hashes = sketch[HASH_COLUMN]
+        return _estimate(np.array([len(hashes)]), np.array([hashes.max() if len(hashes) else 0]))[0]
+    grouped = sketch.groupby(keys, sort=False, observed=True, dropna=False)[HASH_COLUMN]
+    sizes, largest = grouped.size(), grouped.max()
+    return pd.Series(_estimate(sizes.to_numpy(), largest.to_numpy()), index=sizes.index)
+
+
+def _estimate(sizes: np.ndarray, largest: np.ndarray) -> np.ndarray:
+    """KMV estimate per group from the number of kept hashes and the largest one."""
+    estimated = np.round((DISTINCT_SKETCH_SIZE - 1) * HASH_SPACE / (largest.astype('float64') + 1))
+    return np.where(sizes < DISTINCT_SKETCH_SIZE, sizes, estimated).astype('float64')
+
+
+_loaded: 'OrderedDict[Tuple[str, int], Cube]' = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def load_cube(path: Path) -> Cube:
+    """
+    Load a session's cube, reusing the copy already loaded in this process.
+
+    Cubes are replaced atomically when rebuilt, so the file's modification
+    time identifies the version.
+
+    Raises:
+        FileNotFoundError: If there is no cube
+    """
+    key = (str(path), path.stat().st_mtime_ns)
+    with _loaded_lock:
+        cube = _loaded.get(key)
+        if cube is not None:
+            _loaded.move_to_end(key)
+            return cube
+
+    cube = Cube.load(path)
+    with _loaded_lock:
+        _loaded[key] = cube
+        while len(_loaded) > LOADED_CUBES_MAX:
+            _loaded.popitem(last=False)
+    return cube
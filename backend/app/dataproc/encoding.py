@@ -0,0 +1,159 @@
+"""
+Text encoding detection and normalization.
+
+Detection runs cheapest first: a byte-order mark decides immediately, then
+the sample is validated as UTF-8 (ASCII is a subset), and only bytes that
+are not valid UTF-8 go through chardet's statistical detection.
+
+Uploads are transcoded to UTF-8 once when they are stored, so every later
+reader takes the UTF-8 fast path.
+"""
+import codecs
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+import chardet
+
+
+SNIFF_BYTES = 64 * 1024     # Sample size for detection
+CHUNK_SIZE = 1024 * 1024    # Sequential reads when validating or transcoding
+FALLBACK_ENCODING = 'latin-1'  # Decodes any byte sequence
+
+# Longest BOM first: the UTF-32 LE BOM starts with the UTF-16 LE BOM
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def bom_encoding(sample: bytes) -> Optional[str]:
+    """Return the encoding announced by a byte-order mark, if any."""
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    return None
+
+
+def is_utf8(sample: bytes, final: bool = True) -> bool:
+    """
+    Check whether bytes are valid UTF-8.
+
+    Args:
+        sample: Bytes to check
+        final: False if the sample may end mid-character (e.g. a file head)
+    """
+    if sample.isascii():
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=final)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(sample: bytes, final: bool = False) -> str:
+    """
+    Detect the encoding of a byte sample.
+
+    Args:
+        sample: Bytes from the start of a file
+        final: True if the sample is the whole file
+
+    Returns:
+        Python codec name: the BOM's encoding, 'utf-8', or chardet's guess
+    """
+    encoding = bom_encoding(sample)
+    if encoding:
+        return encoding
+
+    if is_utf8(sample, final=final):
+        return 'utf-8'
+
+    try:
+        guess = chardet.detect(sample)['encoding']
+    except Exception:
+        guess = None
+
+    if not guess or guess.lower() in ('ascii', 'utf-8'):
+        # Not valid UTF-8, so chardet's ASCII/UTF-8 answers cannot be right
+        return FALLBACK_ENCODING
+    return guess
+
+
+def file_encoding(file_path: Union[str, Path]) -> str:
+    """Detect a file's encoding from its first SNIFF_BYTES bytes."""
+    with open(file_path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+        final = len(sample) < SNIFF_BYTES
+    return detect_encoding(sample, final=final)
+
+
+def ensure_utf8(file_path: Union[str, Path]) -> Optional[str]:
+    """
+    Rewrite a text file as UTF-8 without a BOM, if it is not already.
+
+    The file is validated as UTF-8 in one streaming pass; only files that
+    fail (or carry a BOM) are transcoded, through a temp file that replaces
+    the original.
+
+    Returns:
+        The source encoding if the file was transcoded, otherwise None
+    """
+    file_path = Path(file_path)
+
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+        encoding = bom_encoding(head)
+
+        if encoding is None:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = head
+            try:
+                while chunk:
+                    decoder.decode(chunk)
+                    chunk = f.read(CHUNK_SIZE)
+                decoder.decode(b'', final=True)
+                return None
+            except UnicodeDecodeError:
+                # Detect from the chunk that failed; the head may be plain ASCII
+                encoding = detect_encoding(chunk)
+                if encoding == 'utf-8':
+                    encoding = FALLBACK_ENCODING
+
+    temp_path = file_path.with_name(f"{file_path.name}.utf8.part")
+    try:
+        transcode(file_path, temp_path, encoding)
+        os.replace(temp_path, file_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    return encoding
+
+
+def transcode(src_path: Union[str, Path], dst_path: Union[str, Path], encoding: str) -> None:
+    """
+    Stream a text file from one encoding to UTF-8.
+
+    Undecodable bytes become U+FFFD; a leading BOM is dropped.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        first = True
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            text = decoder.decode(chunk, final=not chunk)
+            if first and text:
+                # utf-8-sig/utf-16/utf-32 decoders consume their BOM; other
+                # codecs decode a stray one as U+FEFF
+                if text.startswith('\ufeff'):
+                    text = text[1:]
+                first = False
+            dst.write(text.encode('utf-8'))
+            if not chunk:
+                break
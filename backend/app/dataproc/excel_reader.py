@@ -0,0 +1,119 @@
+"""
+Streaming Excel reader.
+
+Workbooks are opened with openpyxl in read-only mode and walked row by row,
+so previews only touch the rows they need and conversions to CSV run in
+bounded memory. Legacy .xls workbooks have no streaming reader and fall back
+to pandas.
+"""
+import csv
+import io
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import openpyxl
+import pandas as pd
+
+
+def _is_xlsx(file_path: Path) -> bool:
+    """Check for the zip signature used by .xlsx/.xlsm workbooks."""
+    with open(file_path, 'rb') as f:
+        return f.read(4) == b'PK\x03\x04'
+
+
+def iter_excel_rows(file_path: Union[str, Path], max_rows: Optional[int] = None) -> Iterator[List[Any]]:
+    """
+    Yield rows of the first worksheet as lists of cell values.
+
+    Rows with no values at all are yielded as empty lists, matching how the
+    csv module reports blank lines.
+
+    Args:
+        file_path: Path to .xlsx/.xls file
+        max_rows: Stop after this many rows (default: whole sheet)
+    """
+    file_path = Path(file_path)
+
+    if not _is_xlsx(file_path):
+        df = pd.read_excel(file_path, header=None, nrows=max_rows)
+        for row in df.values.tolist():
+            cells = [None if pd.isna(cell) else cell for cell in row]
+            yield cells if any(cell is not None for cell in cells) else []
+        return
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        for row in islice(rows, max_rows):
+            cells = list(row)
+            yield cells if any(cell is not None for cell in cells) else []
+    finally:
+        workbook.close()
+
+
+def read_excel_rows(file_path: Union[str, Path], max_rows: int) -> List[List[Any]]:
+    """Read the first max_rows rows of a workbook."""
+    return list(iter_excel_rows(file_path, max_rows=max_rows))
+
+
+def excel_row_count(file_path: Union[str, Path]) -> int:
+    """
+    Number of rows in the first worksheet.
+
+    Uses the sheet's stored dimensions when available, which avoids reading
+    the rows at all; otherwise counts them in a streaming pass.
+    """
+    file_path = Path(file_path)
+
+    if _is_xlsx(file_path):
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+        if max_row:
+            return max_row
+
+    return sum(1 for _ in iter_excel_rows(file_path))
+
+
+def read_excel_frame(file_path: Union[str, Path], header_row: int = 0, skip_rows: int = 0,
+                     nrows: Optional[int] = None, dtype: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Read a sample of a workbook as a dataframe, streaming only the rows needed.
+
+    Rows are parsed by pandas from an in-memory CSV, so dtypes and header
+    handling match the CSV path.
+    """
+    max_rows = None if nrows is None else skip_rows + header_row + 1 + nrows
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in iter_excel_rows(file_path, max_rows=max_rows):
+        writer.writerow(_format_row(row))
+    buffer.seek(0)
+
+    skiprows = list(range(skip_rows)) if skip_rows > 0 else None
+    return pd.read_csv(buffer, header=header_row, skiprows=skiprows, nrows=nrows, dtype=dtype)
+
+
+def convert_excel_to_csv(src_path: Union[str, Path], dst_path: Union[str, Path]) -> int:
+    """
+    Stream the first worksheet of a workbook into a CSV file.
+
+    Returns:
+        Number of rows written
+    """
+    count = 0
+    with open(dst_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        for row in iter_excel_rows(src_path):
+            writer.writerow(_format_row(row))
+            count += 1
+    return count
+
+
+def _format_row(row: List[Any]) -> List[str]:
+    """Render cell values as CSV text, with empty cells as ''."""
+    return ['' if cell is None else str(cell) for cell in row]
@@ -2,17 +2,24 @@
 File analyzer for CSV/Excel import preprocessing.
 Handles file preview, header detection, and format analysis.
 """
-import pandas as pd
+import codecs
 import csv
+import io
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
-import chardet
 import re
 from datetime import datetime
+from .encoding import detect_encoding
+from .excel_reader import read_excel_rows, excel_row_count
 
 
 class FileAnalyzer:
     """Analyzes uploaded files for structure and content."""
+
+    SNIFF_BYTES = 10000        # First chunk, also used for encoding detection
+    CHUNK_SIZE = 1024 * 1024   # Subsequent sequential reads
+    ROW_COUNT_LIMIT = 100000   # Stop counting rows past this point
+    EXCEL_SIGNATURES = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')  # xlsx (zip), xls (OLE)
     
     def __init__(self, file_path: str):
         self.file_path = Path(file_path)
@@ -22,6 +29,9 @@ class FileAnalyzer:
     def analyze(self, num_rows: int = 10) -> Dict[str, Any]:
         """
         Analyze file structure and return preview data.
+
+        The file is read once, front to back: encoding sniffing, preview
+        tokenization and row counting all work from the same chunks.
         
         Args:
             num_rows: Number of rows to preview (default 10)
@@ -36,11 +46,8 @@ class FileAnalyzer:
             - error: error message if analysis failed
         """
         try:
-            # Detect encoding
-            self.encoding = self._detect_encoding()
-            
-            # Read preview rows
-            self.preview_rows = self._read_preview_rows(num_rows)
+            # Single sequential pass: encoding, preview rows and row count
+            self.preview_rows, row_count = self._scan(num_rows)
             
             if not self.preview_rows:
                 return {
@@ -62,9 +69,6 @@ class FileAnalyzer:
             # Suggest header row
             suggested_header = self._detect_header_row()
             
-            # Count total rows (estimate for large files)
-            row_count = self._count_rows()
-            
             return {
                 "success": True,
                 "preview_rows": self.preview_rows,
@@ -90,39 +94,82 @@ class FileAnalyzer:
                 }
             }
     
-    def _detect_encoding(self) -> str:
-        """Detect file encoding."""
+    def _scan(self, num_rows: int) -> Tuple[List[List[Any]], int]:
+        """
+        Read the file once and return (preview_rows, row_count).
+
+        The first chunk doubles as the encoding sample; preview text is
+        decoded incrementally from the same chunks that are counted for
+        newlines, so nothing is reopened or read twice.
+        """
+        with open(self.file_path, 'rb') as f:
+            head = f.read(self.SNIFF_BYTES)
+
+            if head.startswith(self.EXCEL_SIGNATURES):
+                return self._scan_excel(num_rows)
+
+            self.encoding = detect_encoding(head, final=len(head) < self.SNIFF_BYTES)
+            decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+
+            preview_text = ''
+            preview_rows = None
+            line_count = 0
+            last_byte = b''
+            chunk = head
+
+            while chunk:
+                line_count += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+
+                if preview_rows is None:
+                    preview_text += decoder.decode(chunk)
+                    if preview_text.count('\n') > num_rows:
+                        # Only tokenize complete lines while more data may follow
+                        complete = preview_text[:preview_text.rfind('\n') + 1]
+                        rows = self._tokenize(complete, num_rows)
+                        if len(rows) >= num_rows:
+                            preview_rows = rows
+
+                if preview_rows is not None and line_count > self.ROW_COUNT_LIMIT:
+                    # Cap the count for performance, as before
+                    return preview_rows, line_count
+
+                chunk = f.read(self.CHUNK_SIZE)
+
+        if preview_rows is None:
+            preview_rows = self._tokenize(preview_text + decoder.decode(b'', final=True), num_rows)
+
+        # Last line without a trailing newline still counts as a row
+        if last_byte and last_byte != b'\n':
+            line_count += 1
+
+        return preview_rows, line_count
+
+    def _scan_excel(self, num_rows: int) -> Tuple[List[List[Any]], int]:
+        """Preview and count an Excel workbook with the streaming reader."""
+        self.encoding = None
+        preview_rows = [
+            ['' if cell is None else cell for cell in row]
+            for row in read_excel_rows(self.file_path, num_rows)
+        ]
+
         try:
-            with open(self.file_path, 'rb') as f:
-                raw_data = f.read(10000)  # Read first 10KB
-                result = chardet.detect(raw_data)
-                return result['encoding'] or 'utf-8'
+            row_count = excel_row_count(self.file_path)
         except Exception:
-            return 'utf-8'  # Default fallback
-    
-    def _read_preview_rows(self, num_rows: int) -> List[List[str]]:
-        """Read first N rows from file."""
+            row_count = len(preview_rows)  # Unreadable dimensions
+
+        return preview_rows, row_count
+
+    @staticmethod
+    def _tokenize(text: str, num_rows: int) -> List[List[str]]:
+        """Tokenize up to num_rows CSV records from decoded text."""
         rows = []
-        
-        try:
-            # Try reading as CSV first
-            with open(self.file_path, 'r', encoding=self.encoding, errors='replace') as f:
-                reader = csv.reader(f)
-                for i, row in enumerate(reader):
-                    if i >= num_rows:
-                        break
-                    rows.append(row)
-            
-            return rows
-            
-        except Exception as e:
-            # If CSV fails, try pandas (handles Excel)
-            try:
-                df = pd.read_excel(self.file_path, nrows=num_rows, header=None)
-                return df.values.tolist()
-            except Exception:
-                raise Exception(f"Could not read file as CSV or Excel: {str(e)}")
-    
+        for i, row in enumerate(csv.reader(io.StringIO(text))):
+            if i >= num_rows:
+                break
+            rows.append(row)
+        return rows
+
     def _detect_header_row(self) -> int:
         """
         Heuristic detection of header row.
@@ -206,19 +253,6 @@ class FileAnalyzer:
         except Exception:
             return False
     
-    def _count_rows(self) -> int:
-        """Count total rows in file (with reasonable limit for performance)."""
-        try:
-            count = 0
-            with open(self.file_path, 'r', encoding=self.encoding, errors='replace') as f:
-                for _ in f:
-                    count += 1
-                    if count > 100000:  # Cap at 100k for performance
-                        return count
-            return count
-        except Exception:
-            return len(self.preview_rows)  # Fallback to preview count
-    
     @staticmethod
     def _is_numeric(value: Any) -> bool:
         """Check if value is numeric."""
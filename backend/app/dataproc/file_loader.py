@@ -0,0 +1,217 @@
+"""
+Shared loader for uploaded data files.
+
+Every reader of an upload (processing, column analysis, validation and
+profiling) goes through FileLoader, so header/skip-row handling, column
+selection, encodings and the choice of CSV parse engine live in one place.
+
+The rows above the header (report titles, date ranges) are captured while
+the file is positioned at its header, so no second read is needed for them.
+"""
+import csv
+import importlib.util
+import io
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from .encoding import file_encoding
+from .excel_reader import iter_excel_rows, read_excel_frame
+
+
+# Parse engine for CSV files: 'c' (pandas default), 'pyarrow' (multithreaded,
+# needs the optional pyarrow package) or 'python' (slowest, most lenient)
+CSV_ENGINE = os.getenv('CSV_ENGINE', 'c')
+CSV_ENGINES = ('c', 'pyarrow', 'python')
+
+# Encodings whose newlines are not single bytes; these files are read as text
+WIDE_ENCODINGS = ('utf-16', 'utf-32')
+
+
+def resolve_engine(engine: Optional[str] = None) -> str:
+    """
+    Pick the CSV parse engine, falling back to 'c' if pyarrow is not installed.
+
+    Raises:
+        ValueError: If the engine name is unknown
+    """
+    engine = (engine or CSV_ENGINE).lower()
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine: {engine} (expected one of {', '.join(CSV_ENGINES)})")
+    if engine == 'pyarrow' and importlib.util.find_spec('pyarrow') is None:
+        print("CSV engine 'pyarrow' requested but pyarrow is not installed; using 'c'")
+        return 'c'
+    return engine
+
+
+def is_blank_record(row: List[str]) -> bool:
+    """Match pandas' skip_blank_lines: empty and whitespace-only lines are blank."""
+    return not row or (len(row) == 1 and not row[0].strip())
+
+
+class FileLoader:
+    """Reads a CSV/XLSX upload with a given header row and skip count."""
+
+    def __init__(self, file_path: Union[str, Path], header_row: int = 0, skip_rows: int = 0,
+                 engine: Optional[str] = None, cache: Any = None):
+        """
+        Args:
+            file_path: Path to the CSV or Excel file
+            header_row: Row index to use as column headers, counting non-blank rows after skip_rows
+            skip_rows: Number of rows to skip before header
+            engine: CSV parse engine (defaults to the CSV_ENGINE environment variable)
+            cache: Optional cache with get_or_compute(file, kind, compute, **params),
+                such as AnalysisCache; used for header reads
+        """
+        self.file_path = Path(file_path)
+        self.header_row = header_row
+        self.skip_rows = skip_rows
+        self.engine = resolve_engine(engine)
+        self.cache = cache
+        self.preamble: List[List[str]] = []
+        self._handle: Optional[Union[BinaryIO, io.TextIOBase]] = None
+
+        self.file_ext = self.file_path.suffix.lower()
+        if self.file_ext not in ('.csv', '.xlsx', '.xls'):
+            raise ValueError(f"Unsupported file type: {self.file_ext}")
+
+    @property
+    def is_excel(self) -> bool:
+        return self.file_ext in ('.xlsx', '.xls')
+
+    def columns(self) -> List[str]:
+        """Column names from the header row, without reading any data."""
+        if self.cache is None:
+            return self._read_header()['columns']
+
+        header = self.cache.get_or_compute(
+            self.file_path, 'header', self._read_header,
+            header_row=self.header_row, skip_rows=self.skip_rows
+        )
+        self.preamble = header['preamble']
+        return header['columns']
+
+    def read(self, usecols: Optional[List[str]] = None, nrows: Optional[int] = None,
+             dtype: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """
+        Read the data rows, optionally limited to some columns and rows.
+
+        The rows above the header are kept in self.preamble.
+        """
+        if self.is_excel:
+            df = read_excel_frame(self.file_path, header_row=self.header_row,
+                                  skip_rows=self.skip_rows, nrows=nrows, dtype=dtype)
+            self.preamble = self._excel_preamble()
+            return df[[col for col in df.columns if col in set(usecols)]] if usecols is not None else df
+
+        with self._open() as (handle, encoding):
+            # pyarrow parses whole binary files; other reads use the C engine
+            engine = self.engine
+            if engine == 'pyarrow' and (nrows is not None or isinstance(handle, io.TextIOBase)):
+                engine = 'c'
+            return pd.read_csv(handle, header=0, usecols=usecols, nrows=nrows, dtype=dtype, engine=engine,
+                               **self._encoding_options(encoding, engine))
+
+    def iter_chunks(self, chunk_rows: int, usecols: Optional[List[str]] = None,
+                    dtype: Optional[Dict[str, Any]] = None) -> Iterator[pd.DataFrame]:
+        """Yield the data rows as dataframes of at most chunk_rows rows."""
+        if self.is_excel:
+            # Workbooks are converted to CSV on upload; direct reads are small
+            yield self.read(usecols=usecols, dtype=dtype)
+            return
+
+        # Chunked reads are not supported by pyarrow
+        engine = 'c' if self.engine == 'pyarrow' else self.engine
+        with self._open() as (handle, encoding):
+            with pd.read_csv(handle, header=0, usecols=usecols, chunksize=chunk_rows, dtype=dtype, engine=engine,
+                             **self._encoding_options(encoding, engine)) as reader:
+                yield from reader
+
+    def bytes_read(self) -> Optional[int]:
+        """
+        Byte offset reached in the CSV during iter_chunks, for progress.
+
+        Includes the parser's read-ahead; None outside a read.
+        """
+        if self._handle is None:
+            return None
+        try:
+            return getattr(self._handle, 'buffer', self._handle).tell()
+        except (OSError, ValueError):
+            return None
+
+    def _read_header(self) -> Dict[str, Any]:
+        """Column names and preamble rows, as a JSON-serializable dictionary."""
+        if self.is_excel:
+            columns = read_excel_frame(self.file_path, header_row=self.header_row,
+                                       skip_rows=self.skip_rows, nrows=0).columns.tolist()
+            self.preamble = self._excel_preamble()
+        else:
+            columns = self.read(nrows=0).columns.tolist()
+
+        return {'columns': columns, 'preamble': self.preamble}
+
+    @contextmanager
+    def _open(self) -> Iterator[Tuple[Union[BinaryIO, io.TextIOBase], str]]:
+        """
+        Open the CSV positioned at its header row, capturing the rows above it.
+
+        Skipped rows are dropped; the header_row non-blank rows that follow
+        are the preamble. Multi-line quoted records count as one row, as in
+        pandas.
+        """
+        encoding = file_encoding(self.file_path)
+        wide = encoding in WIDE_ENCODINGS
+
+        if wide:
+            handle = open(self.file_path, 'r', encoding=encoding, errors='replace', newline='')
+            lines = iter(handle.readline, '')
+        else:
+            handle = open(self.file_path, 'rb')
+            lines = (line.decode(encoding, errors='replace') for line in iter(handle.readline, b''))
+
+        try:
+            self.preamble = []
+            if self.skip_rows > 0 or self.header_row > 0:
+                # csv.reader pulls lines one record at a time, so the handle
+                # is left exactly at the start of the header record
+                records = csv.reader(lines)
+                for _ in range(self.skip_rows):
+                    if next(records, None) is None:
+                        break
+                while len(self.preamble) < self.header_row:
+                    row = next(records, None)
+                    if row is None:
+                        break
+                    if not is_blank_record(row):
+                        self.preamble.append(row)
+
+            self._handle = handle
+            yield handle, ('utf-8' if wide else encoding)
+        finally:
+            self._handle = None
+            handle.close()
+
+    @staticmethod
+    def _encoding_options(encoding: str, engine: str) -> Dict[str, Any]:
+        """read_csv encoding arguments for a handle opened by _open."""
+        if engine == 'pyarrow':
+            return {'encoding': encoding}
+        return {'encoding': encoding, 'encoding_errors': 'replace'}
+
+    def _excel_preamble(self) -> List[List[str]]:
+        """Rows above the header of a workbook."""
+        preamble = []
+        if self.header_row <= 0:
+            return preamble
+
+        for i, row in enumerate(iter_excel_rows(self.file_path)):
+            if i < self.skip_rows or is_blank_record(row):
+                continue
+            preamble.append(['' if cell is None else str(cell) for cell in row])
+            if len(preamble) >= self.header_row:
+                break
+        return preamble
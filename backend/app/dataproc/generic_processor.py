@@ -5,16 +5,37 @@ Processes any CSV/XLSX file with hierarchical data into sunburst visualization f
 No hardcoded column assumptions - fully user-configurable.
 """
 
+import numpy as np
 import pandas as pd
-import json
 import re
-from typing import Dict, List, TypedDict, Union, Tuple
+import shutil
+from typing import Any, Callable, Dict, List, Optional, TypedDict, Union, Tuple
 from pathlib import Path
 import os
+from .cube import Cube, cube_path
+from .file_loader import FileLoader
+from .measures import NUMERIC_AGGREGATIONS, aggregate_frame, aggregate_groups, json_number, parse_measures
+from .progress import ProgressReporter
+from .result_cache import write_json_atomic
+from .session_frame import (
+    SESSION_FRAME_MAX_BYTES, concat_frames, frame_path, load_frame, save_frame, to_columnar
+)
+from .type_detector import TypeDetector
+
+
+# Characters stripped by clean_numeric_value before parsing
+NUMERIC_NOISE_PATTERN = r'[$€£¥₹,%]'
+
+# Files with at least this many columns are profiled in bulk
+WIDE_FILE_COLUMNS = int(os.getenv('WIDE_FILE_COLUMNS', 200))
+
+
+class ProcessingCancelled(Exception):
+    """Raised at a cancellation point when processing should stop."""
 
 
 class TreeNode(TypedDict):
-    """Tree node with name, value and children."""
+    """Tree node with name, value and children (plus a measures dict by id when extra measures are built)."""
     name: str
     value: float
     children: List['TreeNode']
@@ -32,6 +53,7 @@ class ChartMetadata(TypedDict):
     chart_name: str
     tree_order: List[str]
     value_column: str
+    measures: List[Dict]
     data: TreeRoot
 
 
@@ -46,6 +68,9 @@ class GenericProcessor:
     - No hardcoded column names or report types
     """
 
+    TABLE_CHUNK_CELLS = 5000000  # Caps chunk memory when writing table data
+    READ_CHUNK_ROWS = 1000000  # Rows per chart read between cancellation checks
+
     def __init__(self,
                  input_file: str,
                  chart_name: str,
@@ -55,7 +80,12 @@ class GenericProcessor:
                  session_id: str = "default",
                  header_row: int = 0,
                  skip_rows: int = 0,
-                 progress_callback=None):
+                 progress_callback=None,
+                 column_types: Optional[Dict[str, str]] = None,
+                 cancel_check: Optional[Callable[[], Optional[str]]] = None,
+                 result_cache: Any = None,
+                 measures: Optional[List[str]] = None,
+                 cube_dimensions: Optional[List[str]] = None):
         """
         Initialize the generic processor.
 
@@ -68,11 +98,28 @@ class GenericProcessor:
             session_id: Session identifier for multi-user support
             header_row: Row index to use as column headers (default 0)
             skip_rows: Number of rows to skip before header (default 0)
-            progress_callback: Optional callback function for progress updates
+            progress_callback: Optional callback for progress updates, called as
+                (current, total, message) or, for stage updates, with a fourth
+                argument holding work counts, rate and ETA (see ProgressReporter)
+            column_types: Optional TypeDetector type per column (e.g. {'spend': 'currency',
+                'day': 'date'}); typed columns are converted in bulk during preparation
+            cancel_check: Optional function returning a reason string when processing
+                should stop (None to continue); checked while reading, cleaning,
+                building the tree and writing table data
+            result_cache: Optional ResultCache; a cached result for the same file
+                and config is reused instead of processing, and new results are stored
+            measures: Optional extra measures computed per node alongside the
+                value sum, e.g. ['sum:impressions', 'count', 'mean:cpm'] (see measures.py)
+            cube_dimensions: Optional extra columns the aggregation cube breaks
+                every hierarchy prefix down by, e.g. ['country'] (see cube.py)
         """
         self.data_path = Path(os.getenv('DATA_PATH', data_path))
         self.raw_data_path = self.data_path / "raw" / input_file
         self.sunburst_data_path = self.data_path / f"{session_id}_sunburst_data.json"
+        self.data_csv_path = self.data_path / f"{session_id}_data.csv"
+        self.metadata_csv_path = self.data_path / f"{session_id}_metadata.csv"
+        self.frame_path = frame_path(self.data_path, session_id)
+        self.cube_path = cube_path(self.data_path, session_id)
 
         self.chart_name = chart_name
         self.tree_order = tree_order
@@ -82,6 +129,17 @@ class GenericProcessor:
         self.header_row = header_row
         self.skip_rows = skip_rows
         self.progress_callback = progress_callback
+        self.progress = ProgressReporter(self._emit_progress)
+        self.cancel_check = cancel_check
+        self.result_cache = result_cache
+        self.column_types = column_types or {}
+        self.value_measure = f"sum:{value_column}"
+        self.measures = [spec for spec in parse_measures(measures) if spec['id'] != self.value_measure]
+        self.cube_dimensions = list(dict.fromkeys(cube_dimensions or []))
+        self.cube: Optional[Cube] = None
+        self.level_aggregates: List[pd.DataFrame] = []
+        self.preamble: List[List[str]] = []
+        self.columns: List[str] = []
 
         # Validate inputs
         if not tree_order or len(tree_order) < 3:
@@ -90,11 +148,59 @@ class GenericProcessor:
             raise ValueError("value_column is required")
         if not chart_name:
             raise ValueError("chart_name is required")
+        for col, col_type in self.column_types.items():
+            if col_type not in TypeDetector.SUPPORTED_TYPES:
+                raise ValueError(f"Unsupported type for column '{col}': {col_type}")
+        if self.column_types.get(value_column) in ('date', 'text'):
+            raise ValueError(f"value_column cannot be typed as {self.column_types[value_column]}")
+        for spec in self.measures:
+            if spec['agg'] not in NUMERIC_AGGREGATIONS:
+                continue
+            if spec['column'] in tree_order:
+                raise ValueError(f"Measure '{spec['id']}' cannot aggregate a hierarchy column")
+            if self.column_types.get(spec['column']) in ('date', 'text'):
+                raise ValueError(f"Measure '{spec['id']}' needs a numeric column, "
+                                 f"not one typed as {self.column_types[spec['column']]}")
+        if not isinstance(cube_dimensions or [], list) or not all(isinstance(dim, str) for dim in self.cube_dimensions):
+            raise ValueError("cube_dimensions must be a list of column names")
+        if value_column in self.cube_dimensions:
+            raise ValueError("The value column cannot be a cube dimension")
+
+    @property
+    def measure_columns(self) -> List[str]:
+        """Columns read for the extra measures."""
+        return [spec['column'] for spec in self.measures if spec['column']]
+
+    @property
+    def chart_columns(self) -> List[str]:
+        """Columns the chart and cube are built from: hierarchy, value, measures and cube dimensions."""
+        return list(dict.fromkeys(self.tree_order + [self.value_column] + self.measure_columns + self.cube_dimensions))
+
+    def _check_cancelled(self):
+        """
+        Cancellation point.
+
+        Raises:
+            ProcessingCancelled: If cancel_check reports a reason to stop
+        """
+        if self.cancel_check:
+            reason = self.cancel_check()
+            if reason:
+                raise ProcessingCancelled(reason)
 
     def _report_progress(self, current: int, total: int, message: str):
-        """Report progress if callback is set."""
-        if self.progress_callback:
+        """Report progress right away; every progress step is also a cancellation point."""
+        self._check_cancelled()
+        self.progress.report(current, total, message)
+
+    def _emit_progress(self, current: int, total: int, message: str, details: Optional[Dict] = None):
+        """Pass a (throttled) update from the progress reporter to the callback, if set."""
+        if not self.progress_callback:
+            return
+        if details is None:
             self.progress_callback(current, total, message)
+        else:
+            self.progress_callback(current, total, message, details)
 
     @staticmethod
     def clean_numeric_value(value: str) -> float:
@@ -132,31 +238,83 @@ class GenericProcessor:
         except (ValueError, AttributeError):
             return 0.0
 
+    @staticmethod
+    def parse_numeric_series(series: pd.Series) -> pd.Series:
+        """
+        Vectorized numeric parse for a whole column.
+
+        Currency symbols, commas and percent signs are stripped with one
+        string operation per column. Values that aren't numbers become NaN.
+        """
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype(float)
+
+        # Plain numbers parse directly; only the rest are stripped of symbols first
+        parsed = pd.to_numeric(series, errors='coerce')
+        noisy = parsed.isna() & series.notna()
+        if noisy.any():
+            cleaned = series[noisy].astype(str).str.replace(NUMERIC_NOISE_PATTERN, '', regex=True).str.strip()
+            parsed[noisy] = pd.to_numeric(cleaned, errors='coerce')
+        return parsed.astype(float)
+
+    @staticmethod
+    def clean_numeric_series(series: pd.Series) -> pd.Series:
+        """Vectorized clean_numeric_value: like parse_numeric_series, with 0.0 for non-numbers."""
+        return GenericProcessor.parse_numeric_series(series).fillna(0.0)
+
     def read_dataframe(self) -> pd.DataFrame:
         """
-        Read CSV or Excel file with configurable header row and skip rows.
+        Read the columns needed for the chart: the hierarchy, value, measure and
+        cube dimension columns.
+
+        Hierarchy and dimension columns are read as categoricals of their raw text, which
+        keeps memory low for repetitive labels; every other column is left
+        to write_table_data.
         """
         if not self.raw_data_path.exists():
             raise FileNotFoundError(f"Input file not found: {self.raw_data_path}")
 
-        # Determine file type and read accordingly
-        file_ext = self.raw_data_path.suffix.lower()
+        loader = FileLoader(self.raw_data_path, header_row=self.header_row, skip_rows=self.skip_rows)
+        self.columns = loader.columns()
 
-        # Prepare skiprows parameter
-        skiprows = list(range(self.skip_rows)) if self.skip_rows > 0 else None
+        required = set(self.chart_columns)
+        usecols = [col for col in self.columns if col in required]
+        dtype = {col: 'category' for col in usecols if col in self.tree_order or col in self.cube_dimensions}
 
-        if file_ext == '.csv':
-            df = pd.read_csv(self.raw_data_path, header=self.header_row, skiprows=skiprows)
-        elif file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(self.raw_data_path, header=self.header_row, skiprows=skiprows)
+        self.progress.stage('Reading file', 0, 10, total=self.raw_data_path.stat().st_size, unit='bytes')
+        if loader.is_excel or loader.engine == 'pyarrow':
+            df = loader.read(usecols=usecols, dtype=dtype)
         else:
-            raise ValueError(f"Unsupported file type: {file_ext}")
-
-        print(f"Read {len(df)} rows from {self.raw_data_path.name}")
+            # Large chunks, so a cancelled job stops partway through the file
+            chunks = []
+            for chunk in loader.iter_chunks(self.READ_CHUNK_ROWS, usecols=usecols, dtype=dtype):
+                self._check_cancelled()
+                chunks.append(chunk)
+                self.progress.update(loader.bytes_read() or 0)
+            df = self._concat_chunks(chunks) if chunks else loader.read(usecols=usecols, nrows=0, dtype=dtype)
+        self.progress.update(self.progress.total, force=True)
+
+        # Rows above the header, captured during the same read
+        self.preamble = loader.preamble
+
+        print(f"Read {len(df)} rows from {self.raw_data_path.name} "
+              f"({len(usecols)} of {len(self.columns)} columns)")
         print(f"Columns: {df.columns.tolist()}")
 
         return df
 
+    @staticmethod
+    def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+        """Concatenate read chunks, merging per-chunk categories instead of falling back to object."""
+        if len(chunks) == 1:
+            return chunks[0]
+
+        df = pd.concat(chunks, ignore_index=True)
+        for col in chunks[0].columns:
+            if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+                df[col] = pd.api.types.union_categoricals([chunk[col] for chunk in chunks])
+        return df
+
     def validate_and_prepare_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Validate that required columns exist and prepare data for processing.
@@ -172,93 +330,232 @@ class GenericProcessor:
         """
         # Check that all required columns exist
         all_columns = set(df.columns)
-        required_columns = set(self.tree_order + [self.value_column])
+        required_columns = set(self.chart_columns)
         missing_columns = required_columns - all_columns
 
         if missing_columns:
             raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
 
-        # Create a copy to avoid modifying original
-        df_clean = df.copy()
-
         # Clean the value column - handle currency and formatting
         print(f"Cleaning value column: {self.value_column}")
-        df_clean[self.value_column] = df_clean[self.value_column].apply(self.clean_numeric_value)
+        df_clean = self._clean_dimensions(self._clean_measures(self._clean_values(df)))
+        self._check_cancelled()
 
-        # Remove rows where value is 0 or NaN
+        # Exact selection checks on the full data; /validate-columns may only have seen a sample
+        columns = self.columns or df.columns.tolist()
+        facts = validation_facts_from_frame(df, columns, self.tree_order, self.value_column,
+                                            cleaned_values=df_clean[self.value_column])
+        is_valid, errors, _ = check_validation_facts(facts, self.tree_order, self.value_column)
+        if not is_valid:
+            raise ValueError(f"Invalid column selection: {'; '.join(errors)}")
+
+        self._check_cancelled()
+        df_clean = self._filter_chart_rows(df_clean)
+
+        print(f"Validated data: {len(df_clean)} rows ready for processing")
+        return df_clean
+
+    def _filter_chart_rows(self, df_clean: pd.DataFrame) -> pd.DataFrame:
+        """Filter cleaned chart rows (see _filter_rows), failing if none are left."""
         initial_count = len(df_clean)
-        df_clean = df_clean[df_clean[self.value_column] > 0]
+        df_clean = self._filter_rows(df_clean)
         removed_count = initial_count - len(df_clean)
         if removed_count > 0:
-            print(f"Removed {removed_count} rows with zero or invalid values")
+            print(f"Removed {removed_count} rows with zero or invalid values or missing hierarchy values")
+
+        if len(df_clean) == 0:
+            raise ValueError("No valid data remaining after cleaning")
+        return df_clean
+
+    def _clean_values(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return a copy with the value column parsed to floats (0.0 for non-numbers)."""
+        df_clean = df.copy()
+
+        # Each distinct value is parsed once and mapped back to the rows
+        value_type = self.column_types.get(self.value_column)
+        if value_type:
+            cleaned = TypeDetector().convert_series(df_clean[self.value_column], value_type)
+        else:
+            cleaned = TypeDetector.map_unique(df_clean[self.value_column], self.parse_numeric_series)
+        df_clean[self.value_column] = cleaned.fillna(0.0).astype(float)
+
+        return df_clean
+
+    def _clean_measures(self, df_clean: pd.DataFrame) -> pd.DataFrame:
+        """
+        Parse the columns of numeric measures to floats in place.
+
+        Unlike the value column, non-numbers stay NaN, so mean, min and max
+        skip them. Only the chart data is cleaned; table data keeps the raw text.
+        """
+        detector = TypeDetector()
+        for col in {spec['column'] for spec in self.measures if spec['agg'] in NUMERIC_AGGREGATIONS}:
+            if col == self.value_column:
+                continue
+            col_type = self.column_types.get(col)
+            if col_type:
+                cleaned = detector.convert_series(df_clean[col], col_type)
+            else:
+                cleaned = TypeDetector.map_unique(df_clean[col], self.parse_numeric_series)
+            df_clean[col] = pd.to_numeric(cleaned, errors='coerce').astype(float)
+        return df_clean
+
+    def _clean_dimensions(self, df_clean: pd.DataFrame) -> pd.DataFrame:
+        """
+        Normalize cube dimension labels in place, like hierarchy labels.
+
+        Rows missing a dimension are kept; they form their own group.
+        """
+        detector = TypeDetector()
+        for col in self.cube_dimensions:
+            if col in self.tree_order:
+                continue
+            col_type = self.column_types.get(col)
+            if col_type and col_type != 'text':
+                converted = detector.convert_series(df_clean[col], col_type)
+                df_clean[col] = converted.fillna(df_clean[col].astype(object))
+            df_clean[col] = TypeDetector.map_unique(df_clean[col], lambda u: u.astype(str).str.strip())
+        return df_clean
+
+    def _filter_rows(self, df_clean: pd.DataFrame) -> pd.DataFrame:
+        """
+        Keep rows with a positive value and a non-empty label at every level.
+
+        Shared by the chart data and the table data so both hold the same rows.
+        """
+        # Remove rows where value is 0 or NaN
+        df_clean = df_clean[df_clean[self.value_column] > 0]
 
         # Remove rows with NaN in any hierarchy column
-        initial_count = len(df_clean)
         df_clean = df_clean.dropna(subset=self.tree_order)
-        removed_count = initial_count - len(df_clean)
-        if removed_count > 0:
-            print(f"Removed {removed_count} rows with missing hierarchy values")
 
-        # Convert hierarchy columns to strings and strip whitespace
+        # Convert hierarchy columns to strings and strip whitespace, once per
+        # distinct value; typed columns (e.g. dates) are normalized first
+        detector = TypeDetector()
         for col in self.tree_order:
-            df_clean[col] = df_clean[col].astype(str).str.strip()
+            self._check_cancelled()
+            col_type = self.column_types.get(col)
+            if col_type and col_type != 'text':
+                converted = detector.convert_series(df_clean[col], col_type)
+                df_clean[col] = converted.fillna(df_clean[col].astype(object))
+            df_clean[col] = TypeDetector.map_unique(df_clean[col], lambda u: u.astype(str).str.strip())
             # Remove rows with empty strings
             df_clean = df_clean[df_clean[col] != '']
 
-        if len(df_clean) == 0:
-            raise ValueError("No valid data remaining after cleaning")
-
-        print(f"Validated data: {len(df_clean)} rows ready for processing")
         return df_clean
 
-    def build_tree_recursive(self, df: pd.DataFrame, level: int = 0, level0_idx: int = 0, level0_total: int = 0) -> List[TreeNode]:
+    def write_table_data(self, output_path: Path, frame_output: Optional[Path] = None, append: bool = False) -> int:
         """
-        Recursively build tree structure from grouped data with progress tracking.
+        Write the full-width rows behind the chart for the DataTable.
+
+        Runs after the chart is built, as a separate streaming pass over the
+        source file. Every column is read as raw text, as hierarchy columns are
+        for the chart, and only the value column is parsed; rows are filtered
+        exactly like the chart data. The same text goes into the columnar
+        copy, so a re-pivot writes the table data a fresh build would.
 
         Args:
-            df: Dataframe subset for this level
-            level: Current hierarchy level (0-indexed)
-            level0_idx: For level 0, the current category index (for progress)
-            level0_total: For level 0, total number of categories (for progress)
+            output_path: Table data CSV
+            frame_output: Also save every row, unfiltered, here as the
+                session's columnar copy for re-pivoting (see session_frame)
+            append: Start from the session's table data (and columnar copy)
+                and add the rows after them; those files are copied rather
+                than written to, as cached results may link to them
 
         Returns:
-            List of TreeNode dictionaries
+            Number of rows written
         """
-        if level >= len(self.tree_order):
-            return []
-
-        col = self.tree_order[level]
-        children = []
-        unique_values = df[col].unique()
-
-        # Group by current level column
-        for idx, value in enumerate(unique_values):
-            subset = df[df[col] == value]
-
-            # Only report progress at the first level
-            if level == 0:
-                progress_pct = 20 + int((idx / len(unique_values)) * 70)  # 20-90%
-                self._report_progress(
-                    progress_pct,
-                    100,
-                    f"Processing {col}: {value} ({idx + 1}/{len(unique_values)})"
-                )
-
-            # Sum the value column for this node
-            node_value = subset[self.value_column].sum()
+        loader = FileLoader(self.raw_data_path, header_row=self.header_row, skip_rows=self.skip_rows)
+        columns = loader.columns()
+        dtype = {col: str for col in columns}
+        chunk_rows = max(self.TABLE_CHUNK_CELLS // max(len(columns), 1), 1000)
+
+        self.progress.stage('Writing table data', 92, 100, total=self.raw_data_path.stat().st_size, unit='bytes')
+        temp_path = output_path.with_suffix(f'.csv.{os.getpid()}.part')
+        rows_written = 0
+        frame_chunks = [load_frame(self.frame_path)] if frame_output and append else []
+        try:
+            if append:
+                shutil.copyfile(self.data_csv_path, temp_path)
+            with open(temp_path, 'a' if append else 'w', encoding='utf-8', newline='') as f:
+                header = not append
+                for raw in loader.iter_chunks(chunk_rows, dtype=dtype):
+                    self._check_cancelled()
+                    chunk = self._filter_rows(self._clean_values(raw))
+                    chunk.to_csv(f, index=False, header=header)
+                    header = False
+                    rows_written += len(chunk)
+                    if frame_output:
+                        frame_chunks.append(to_columnar(raw))
+                    self.progress.update(loader.bytes_read() or 0)
+                if header:
+                    pd.DataFrame(columns=columns).to_csv(f, index=False)
+            if frame_chunks:
+                save_frame(concat_frames(frame_chunks), frame_output)
+            os.replace(temp_path, output_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        return rows_written
+
+    def build_tree(self, df: pd.DataFrame) -> List[TreeNode]:
+        """
+        Build the tree structure with one groupby per hierarchy level.
 
-            # Recursively build children
-            child_nodes = self.build_tree_recursive(subset, level + 1)
+        Each level's node values are the sums over its path prefix, and any
+        extra measures are aggregated in the same groupby; the per-level
+        aggregates are kept in level_aggregates for the cube. Children keep
+        the order in which their values first appear in the data and are
+        then sorted by value, descending.
 
-            child = {
-                'name': str(value),
-                'value': float(node_value),
-                'children': child_nodes
-            }
-            children.append(child)
+        Args:
+            df: Validated dataframe
 
-        # Sort by value descending
-        children.sort(key=lambda x: x['value'], reverse=True)
+        Returns:
+            List of top-level TreeNode dictionaries
+        """
+        levels = len(self.tree_order)
+        self.progress.stage('Building tree', 20, 80, total=len(df) * levels, unit='rows')
+        self.level_aggregates = []
+
+        children: List[TreeNode] = []
+        parents: Dict[tuple, List[TreeNode]] = {(): children}
+        sibling_lists = [children]
+
+        for level in range(levels):
+            self._check_cancelled()
+            grouped = df.groupby(self.tree_order[:level + 1], sort=False, observed=True)
+            aggregates = aggregate_groups(grouped, self.value_column, self.measures, merge_state=True)
+            self.level_aggregates.append(aggregates)
+            sums = aggregates['value']
+            measure_rows = None
+            if self.measures:
+                measure_rows = aggregates[[spec['id'] for spec in self.measures]].itertuples(index=False, name=None)
+
+            nodes: Dict[tuple, List[TreeNode]] = {}
+            for idx, (path, node_value) in enumerate(sums.items()):
+                if idx % 10000 == 0:
+                    self._check_cancelled()
+                path = path if isinstance(path, tuple) else (path,)
+                node = {
+                    'name': str(path[-1]),
+                    'value': float(node_value),
+                    'children': []
+                }
+                if measure_rows is not None:
+                    node['measures'] = {spec['id']: json_number(measure)
+                                        for spec, measure in zip(self.measures, next(measure_rows))}
+                parents[path[:-1]].append(node)
+                nodes[path] = node['children']
+
+            parents = nodes
+            sibling_lists.extend(nodes.values())
+            self.progress.update(len(df) * (level + 1))
+
+        # Sort by value descending (stable, so ties keep their first-appearance order)
+        for siblings in sibling_lists:
+            siblings.sort(key=lambda x: x['value'], reverse=True)
 
         return children
 
@@ -266,91 +563,365 @@ class GenericProcessor:
         """
         Create hierarchical sunburst data structure from CSV.
 
+        All outputs are built at staged paths and published together once
+        the table data is written, so a cancelled or failed run leaves the
+        session's previous chart as it was.
+
         Returns:
             ChartMetadata with tree structure
+
+        Raises:
+            ProcessingCancelled: If cancelled
         """
+        staged: List[Tuple[Path, Path]] = []
         try:
             # Read and validate data
-            self._report_progress(0, 100, "Reading file...")
             df = self.read_dataframe()
 
-            self._report_progress(10, 100, "Validating data...")
+            self.progress.stage('Validating data', 10, 15, total=len(df), unit='rows')
             df = self.validate_and_prepare_data(df)
 
-            # Save processed data and metadata files
-            self._report_progress(15, 100, "Saving processed data...")
-
-            # Save clean data CSV (with proper headers) for DataTable
-            data_csv_path = self.data_path / f"{self.session_id}_data.csv"
-            df.to_csv(data_csv_path, index=False)
-            print(f"✓ Saved processed data to {data_csv_path}")
+            # Save metadata file; the full-width table data is written once the chart is built
+            self._report_progress(15, 100, "Saving file metadata...")
+            data_csv_path = self.data_csv_path
 
             # Extract and save metadata rows (if header row > 0)
             metadata_file = None
             if self.header_row > 0:
-                # Read file again without header to get raw metadata rows
-                file_ext = self.raw_data_path.suffix.lower()
-                skiprows = list(range(self.skip_rows)) if self.skip_rows > 0 else None
-
-                if file_ext == '.csv':
-                    df_full = pd.read_csv(self.raw_data_path, header=None, skiprows=skiprows)
-                else:
-                    df_full = pd.read_excel(self.raw_data_path, header=None, skiprows=skiprows)
-
-                # Extract rows before header (metadata rows)
-                metadata_df = df_full.iloc[0:self.header_row]
-                metadata_csv_path = self.data_path / f"{self.session_id}_metadata.csv"
-                metadata_df.to_csv(metadata_csv_path, index=False, header=False)
-                metadata_file = f"{self.session_id}_metadata.csv"
-                print(f"✓ Saved file metadata to {metadata_csv_path}")
-
-            # Build tree structure
-            self._report_progress(20, 100, "Building tree structure...")
-            print("Building tree structure...")
-            total_value = df[self.value_column].sum()
-            children = self.build_tree_recursive(df, level=0)
-
-            self._report_progress(90, 100, "Finalizing...")
-            self.tree = {
-                'name': self.chart_name,
-                'value': float(total_value),
-                'children': children
-            }
-
-            # Create metadata object
-            metadata = {
-                'chart_name': self.chart_name,
-                'tree_order': self.tree_order,
-                'value_column': self.value_column,
-                'source_file': str(self.raw_data_path.name),  # Original file (for reference)
-                'data_file': f"{self.session_id}_data.csv",    # Processed data for DataTable
-                'metadata_file': metadata_file,                # File metadata rows (if any)
-                'header_row': self.header_row,
-                'skip_rows': self.skip_rows,
-                'data': self.tree
-            }
-
-            # Save to JSON
-            with open(self.sunburst_data_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+                # Rows before the header (metadata rows), captured by read_dataframe
+                metadata_df = pd.DataFrame(self.preamble)
+                metadata_csv_path = self.metadata_csv_path
+                metadata_df.to_csv(self._stage(staged, metadata_csv_path), index=False, header=False)
+                metadata_file = metadata_csv_path.name
+
+            # Large uploads get no columnar copy; any older one no longer matches
+            keep_frame = self.raw_data_path.stat().st_size <= SESSION_FRAME_MAX_BYTES
+
+            metadata = self.build_chart(df, metadata_file, self.frame_path.name if keep_frame else None)
+            self.cube.save(self._stage(staged, self.cube_path))
+
+            # Save clean data CSV (with proper headers) for DataTable: a
+            # second, chunked pass over all columns of the source file
+            frame_output = self._stage(staged, self.frame_path) if keep_frame else None
+            table_rows = self.write_table_data(self._stage(staged, data_csv_path), frame_output=frame_output)
+
+            # Past the last cancellation point: publish, the chart JSON last
+            write_json_atomic(self._stage(staged, self.sunburst_data_path), metadata)
+            self._publish(staged, stale=None if keep_frame else self.frame_path)
 
             # TODO: Optional cleanup - delete original upload after processing
             # os.remove(self.raw_data_path)
 
-            self._report_progress(100, 100, "Complete!")
+            self.progress.report(100, 100, "Complete!")
             print(f"✓ Sunburst data created and saved to {self.sunburst_data_path}")
-            print(f"  Processed data saved to: {data_csv_path}")
+            print(f"  Processed data saved to: {data_csv_path} ({table_rows} rows)")
             if metadata_file:
                 print(f"  File metadata saved to: {metadata_csv_path}")
-            print(f"  Total value: {total_value:,.2f}")
-            print(f"  Top-level categories: {len(children)}")
+            print(f"  Total value: {self.tree['value']:,.2f}")
+            print(f"  Top-level categories: {len(self.tree['children'])}")
 
             return metadata
 
+        except ProcessingCancelled as e:
+            print(f"Processing cancelled: {str(e)}")
+            raise
+
         except Exception as e:
             print(f"Error creating sunburst data: {str(e)}")
             raise
 
+        finally:
+            self._discard(staged)
+
+    def build_chart(self, df: pd.DataFrame, metadata_file: Optional[str], frame_file: Optional[str]) -> ChartMetadata:
+        """
+        Build the tree and the aggregation cube from validated rows and wrap
+        the tree in the chart metadata. The cube is left in self.cube for the
+        caller to save.
+
+        Args:
+            df: Validated dataframe
+            metadata_file: Name of the session's file metadata CSV, if any
+            frame_file: Name of the session's columnar copy, if any
+        """
+        print("Building tree structure...")
+        total_value = df[self.value_column].sum()
+        children = self.build_tree(df)
+
+        self.tree = {
+            'name': self.chart_name,
+            'value': float(total_value),
+            'children': children
+        }
+        if self.measures:
+            self.tree['measures'] = aggregate_frame(df, self.measures)
+
+        # The prefix cuboids reuse the tree's per-level aggregates
+        layout = Cube.layout(self.tree_order, self.cube_dimensions)
+        self.progress.stage('Building cube', 80, 90, total=len(layout), unit='cuboids')
+
+        def cube_progress(done: int):
+            self._check_cancelled()
+            self.progress.update(done)
+
+        self.cube = Cube.build(df, self.tree_order, self.cube_dimensions, self.value_column, self.measures,
+                               self.value_measure, level_aggregates=self.level_aggregates, progress=cube_progress)
+
+        self._report_progress(90, 100, "Finalizing...")
+
+        return {
+            'chart_name': self.chart_name,
+            'tree_order': self.tree_order,
+            'value_column': self.value_column,
+            'measures': self.measure_list(),               # Measures selectable in /data
+            'column_types': self.column_types,
+            'source_file': str(self.raw_data_path.name),  # Original file (for reference)
+            'data_file': self.data_csv_path.name,          # Processed data for DataTable
+            'metadata_file': metadata_file,                # File metadata rows (if any)
+            'frame_file': frame_file,                      # Columnar copy for re-pivoting (if any)
+            'cube_file': self.cube_path.name,              # Aggregation cube for /cube
+            'cube_dimensions': self.cube_dimensions,
+            'header_row': self.header_row,
+            'skip_rows': self.skip_rows,
+            'data': self.tree
+        }
+
+    def repivot(self, previous: ChartMetadata) -> ChartMetadata:
+        """
+        Rebuild the session's chart and cube from its columnar copy instead of the upload.
+
+        Only the columns of the new hierarchy, value, measures and cube
+        dimensions are loaded, cleaned and aggregated. The table data is rewritten from the copy only
+        if its rows can change, i.e. if the value column or the set of
+        hierarchy columns differs from the previous chart. The copy holds the
+        cells' raw text, so labels, values and table data are those of a fresh
+        build of the new selection. The outputs are published together, as
+        for a new chart.
+
+        Args:
+            previous: The session's current chart metadata
+
+        Returns:
+            The new chart metadata, also saved as the session's chart
+
+        Raises:
+            FileNotFoundError: If the session has no columnar copy
+            ValueError: If the new selection is invalid for the data
+        """
+        if not previous.get('frame_file'):
+            raise FileNotFoundError("This chart has no columnar copy to re-pivot from")
+        self.frame_path = self.data_path / previous['frame_file']
+
+        # Missing columns are reported by validate_and_prepare_data
+        df = self.validate_and_prepare_data(load_frame(self.frame_path, self.chart_columns))
+
+        metadata = self.build_chart(df, previous.get('metadata_file'), self.frame_path.name)
+
+        # Appended files stay part of the chart's rows
+        if previous.get('appended_files'):
+            metadata['appended_files'] = previous['appended_files']
+
+        staged: List[Tuple[Path, Path]] = []
+        try:
+            self.cube.save(self._stage(staged, self.cube_path))
+
+            if self.value_column != previous.get('value_column') or set(self.tree_order) != set(previous.get('tree_order', [])):
+                table = self._filter_rows(self._clean_values(load_frame(self.frame_path)))
+                table.to_csv(self._stage(staged, self.data_csv_path), index=False)
+                print(f"✓ Rewrote table data for the new selection ({len(table)} rows)")
+
+            write_json_atomic(self._stage(staged, self.sunburst_data_path), metadata)
+            self._publish(staged)
+        finally:
+            self._discard(staged)
+
+        print(f"✓ Re-pivoted {self.session_id}: {' → '.join(self.tree_order)} by {self.value_column}")
+        return metadata
+
+    @classmethod
+    def from_chart(cls, previous: ChartMetadata, input_file: str, **kwargs) -> 'GenericProcessor':
+        """
+        Processor for another file, configured like a session's current chart.
+
+        Args:
+            previous: The session's chart metadata
+            input_file: Name of the file in data/raw/
+            **kwargs: Other constructor arguments (data_path, session_id, callbacks)
+        """
+        return cls(
+            input_file=input_file,
+            chart_name=previous['chart_name'],
+            tree_order=previous['tree_order'],
+            value_column=previous['value_column'],
+            header_row=previous.get('header_row', 0),
+            skip_rows=previous.get('skip_rows', 0),
+            column_types=previous.get('column_types'),
+            measures=[spec['id'] for spec in previous.get('measures', [])[1:]],
+            cube_dimensions=previous.get('cube_dimensions'),
+            **kwargs
+        )
+
+    def append(self, previous: ChartMetadata) -> ChartMetadata:
+        """
+        Add the rows of another file with the same columns to the session's chart.
+
+        Only the new rows are read, cleaned and aggregated, into a cube that
+        is merged into the session's cube (see Cube.merge); the tree is then
+        rebuilt from the merged prefix cuboids, so node values, measures,
+        totals and sibling order are those of a build over the old rows
+        followed by the new ones. The new rows are added to the end of the
+        table data and of the columnar copy.
+
+        Args:
+            previous: The session's current chart metadata; the processor
+                should be configured like it (see from_chart)
+
+        Returns:
+            The new chart metadata, also saved as the session's chart
+
+        Raises:
+            FileNotFoundError: If the session has no cube or the file is missing
+            ValueError: If the file was already added, its columns differ or it has no valid rows
+        """
+        source_files = [previous.get('source_file')] + previous.get('appended_files', [])
+        if self.raw_data_path.name in source_files:
+            raise ValueError(f"{self.raw_data_path.name} is already part of this chart")
+        if not previous.get('cube_file'):
+            raise FileNotFoundError("This chart has no aggregation cube to append to; process the file again")
+        cube = Cube.load(self.data_path / previous['cube_file'])
+
+        df = self.read_dataframe()
+        table_columns = read_header(self.data_csv_path)
+        if self.columns != table_columns:
+            raise ValueError(f"{self.raw_data_path.name} does not have the same columns as the chart's data "
+                             f"(expected: {', '.join(table_columns)})")
+
+        # Only cleaning and filtering; the selection was checked on the first file
+        self.progress.stage('Validating data', 10, 15, total=len(df), unit='rows')
+        df = self._clean_dimensions(self._clean_measures(self._clean_values(df)))
+        self._check_cancelled()
+        df = self._filter_chart_rows(df)
+
+        layout = Cube.layout(self.tree_order, self.cube_dimensions)
+        self.progress.stage('Aggregating new rows', 15, 80, total=len(layout), unit='cuboids')
+
+        def cube_progress(done: int):
+            self._check_cancelled()
+            self.progress.update(done)
+
+        added = Cube.build(df, self.tree_order, self.cube_dimensions, self.value_column, self.measures,
+                           self.value_measure, progress=cube_progress)
+
+        self._report_progress(80, 100, "Merging into the chart...")
+        self.cube = cube.merge(added)
+        self.tree = self.tree_from_cube(self.cube)
+
+        # The columnar copy is dropped once the rows outgrow the limit
+        frame_file = previous.get('frame_file')
+        keep_frame = False
+        if frame_file:
+            self.frame_path = self.data_path / frame_file
+            keep_frame = (self.frame_path.exists() and self.frame_path.stat().st_size
+                          + self.raw_data_path.stat().st_size <= SESSION_FRAME_MAX_BYTES)
+
+        metadata = dict(previous, data=self.tree, frame_file=frame_file if keep_frame else None,
+                        cube_file=self.cube_path.name,
+                        appended_files=previous.get('appended_files', []) + [self.raw_data_path.name])
+
+        # Built at staged paths and published together, as for a new chart
+        staged: List[Tuple[Path, Path]] = []
+        try:
+            self.cube.save(self._stage(staged, self.cube_path))
+            frame_output = self._stage(staged, self.frame_path) if keep_frame else None
+            table_rows = self.write_table_data(self._stage(staged, self.data_csv_path),
+                                               frame_output=frame_output, append=True)
+            write_json_atomic(self._stage(staged, self.sunburst_data_path), metadata)
+            self._publish(staged, stale=self.frame_path if frame_file and not keep_frame else None)
+        finally:
+            self._discard(staged)
+        self.progress.report(100, 100, "Complete!")
+
+        print(f"✓ Appended {table_rows} rows from {self.raw_data_path.name} to {self.session_id}")
+        print(f"  Total value: {self.tree['value']:,.2f}")
+        return metadata
+
+    def tree_from_cube(self, cube: Cube) -> TreeRoot:
+        """
+        Build the chart tree from a cube's prefix cuboids.
+
+        Each level's nodes are the rows of the cuboid breaking its prefix
+        down by that level, which are already in sibling order.
+        """
+        ids = [spec['id'] for spec in self.measures]
+        children: List[TreeNode] = []
+        parents: Dict[tuple, List[TreeNode]] = {(): children}
+
+        for level, column in enumerate(self.tree_order):
+            self._check_cancelled()
+            frame = cube.cuboids[(level, column)]
+            # Measures as JSON numbers for the whole level at once (see json_number)
+            measures = frame[ids].astype(float)
+            measures = measures.astype(object).where(np.isfinite(measures), None)
+            records = zip(frame[self.tree_order[:level + 1]].itertuples(index=False, name=None),
+                          frame[self.value_measure].tolist(), measures.itertuples(index=False, name=None))
+            nodes: Dict[tuple, List[TreeNode]] = {}
+            for path, value, values in records:
+                node = {
+                    'name': str(path[-1]),
+                    'value': float(value),
+                    'children': []
+                }
+                if ids:
+                    node['measures'] = dict(zip(ids, values))
+                parents[path[:-1]].append(node)
+                nodes[path] = node['children']
+            parents = nodes
+
+        tree = {
+            'name': self.chart_name,
+            'value': float(cube.total[self.value_measure]),
+            'children': children
+        }
+        if ids:
+            tree['measures'] = {measure: cube.total[measure] for measure in ids}
+        return tree
+
+    def measure_list(self) -> List[Dict]:
+        """Selectable measures: the value sum (each node's value) first, then the extra measures."""
+        value_spec = {'id': self.value_measure, 'agg': 'sum', 'column': self.value_column}
+        return [value_spec] + [dict(spec) for spec in self.measures]
+
+    @staticmethod
+    def _stage(staged: List[Tuple[Path, Path]], path: Path) -> Path:
+        """
+        Path to build an output at until it is published over path (see _publish).
+
+        Keeps the suffix, which picks the format of columnar copies.
+        """
+        staged_path = path.with_name(f"{path.stem}.{os.getpid()}.staged{path.suffix}")
+        staged.append((staged_path, path))
+        return staged_path
+
+    @staticmethod
+    def _publish(staged: List[Tuple[Path, Path]], stale: Optional[Path] = None):
+        """
+        Rename staged outputs over the session's files, in the order they were staged.
+
+        Args:
+            staged: (staged path, output path) pairs; the chart JSON should be last
+            stale: A file the new chart no longer refers to, removed once it is published
+        """
+        for staged_path, path in staged:
+            os.replace(staged_path, path)
+        if stale:
+            stale.unlink(missing_ok=True)
+
+    @staticmethod
+    def _discard(staged: List[Tuple[Path, Path]]):
+        """Delete staged outputs that were not published (e.g. of a cancelled run)."""
+        for staged_path, _ in staged:
+            staged_path.unlink(missing_ok=True)
+
     def process_all(self):
         """
         Main processing pipeline - create sunburst visualization data.
@@ -359,113 +930,165 @@ class GenericProcessor:
         print(f"Processing: {self.chart_name}")
         print(f"Hierarchy: {' → '.join(self.tree_order)}")
         print(f"Value column: {self.value_column}")
+        if self.measures:
+            print(f"Measures: {', '.join(spec['id'] for spec in self.measures)}")
         print(f"{'='*60}\n")
 
-        self.create_sunburst_data()
+        if self.result_cache is None:
+            self.create_sunburst_data()
+            print("\n✓ Processing complete!")
+            return
+
+        self._report_progress(0, 100, "Checking for a cached result...")
+        waiting = False
+
+        def wait_check():
+            nonlocal waiting
+            if not waiting:
+                waiting = True
+                self._report_progress(0, 100, "Waiting for an identical job to finish...")
+            self._check_cancelled()
+
+        # An identical build already running (e.g. for another session) is
+        # waited for, and its result reused
+        with self.result_cache.lock(self, wait_check=wait_check):
+            if self.result_cache.restore(self) is not None:
+                self.progress.report(100, 100, "Complete!")
+                print(f"✓ Reused cached result for {self.raw_data_path.name}")
+            else:
+                metadata = self.create_sunburst_data()
+                self.result_cache.store(self, metadata)
         print("\n✓ Processing complete!")
 
 
-def analyze_columns(file_path: Path, header_row: int = 0, skip_rows: int = 0) -> List[Dict]:
+def read_header(file_path: Path, header_row: int = 0, skip_rows: int = 0) -> List[str]:
+    """Read only the column names of a CSV file."""
+    return FileLoader(file_path, header_row=header_row, skip_rows=skip_rows).columns()
+
+
+def validation_facts_from_frame(df: pd.DataFrame, columns: List[str], tree_order: List[str], value_column: str,
+                                cleaned_values: pd.Series = None, provisional: List[str] = None) -> Dict:
     """
-    Analyze columns in a CSV/XLSX file to determine types and suitability.
+    Gather validation facts from rows already in memory.
 
     Args:
-        file_path: Path to CSV or XLSX file
-        header_row: Row index to use as column headers (default 0)
-        skip_rows: Number of rows to skip before header (default 0)
+        df: Rows to validate (the full data, or a sample)
+        columns: All column names in the file
+        tree_order: Selected hierarchy columns
+        value_column: Selected value column
+        cleaned_values: Value column already run through clean_numeric_series, if available
+        provisional: Checks that can't be decided from these rows (see VALIDATION_CHECKS)
 
     Returns:
-        List of column metadata dictionaries
+        Dictionary with columns, row_count, value_numeric_ratio, unique_counts and provisional
     """
-    # Read file with specified header and skip rows
-    file_ext = file_path.suffix.lower()
-    skiprows = list(range(skip_rows)) if skip_rows > 0 else None
-    
-    if file_ext == '.csv':
-        df = pd.read_csv(file_path, header=header_row, skiprows=skiprows, nrows=1000)  # Sample first 1000 rows
-    elif file_ext in ['.xlsx', '.xls']:
-        df = pd.read_excel(file_path, header=header_row, skiprows=skiprows, nrows=1000)
-    else:
-        raise ValueError(f"Unsupported file type: {file_ext}")
-
-    columns_info = []
-
-    for col in df.columns:
-        series = df[col].dropna()
-
-        if len(series) == 0:
-            col_type = 'empty'
-            suitable_for_value = False
-            sample_value = None
-        else:
-            # Try to detect if numeric
-            # Clean values and attempt conversion
-            cleaned_values = series.apply(GenericProcessor.clean_numeric_value)
-            numeric_ratio = (cleaned_values != 0).sum() / len(series)
-
-            if numeric_ratio > 0.8:  # 80%+ can be converted to numeric
-                col_type = 'numeric'
-                suitable_for_value = True
-                sample_value = series.iloc[0]
-            else:
-                col_type = 'text'
-                suitable_for_value = False
-                sample_value = str(series.iloc[0])[:50]  # Truncate long samples
+    facts = {
+        'columns': [str(col) for col in columns],
+        'row_count': len(df),
+        'value_numeric_ratio': None,
+        'unique_counts': {},
+        'provisional': provisional or []
+    }
+
+    if value_column in df.columns and len(df) > 0:
+        if cleaned_values is None:
+            cleaned_values = GenericProcessor.clean_numeric_series(df[value_column])
+        facts['value_numeric_ratio'] = float((cleaned_values != 0).sum() / len(df))
 
-        columns_info.append({
-            'name': col,
-            'type': col_type,
-            'sample': str(sample_value) if sample_value is not None else None,
-            'unique_count': int(df[col].nunique()),
-            'suitable_for_value': suitable_for_value
-        })
+    for col in tree_order:
+        if col in df.columns:
+            facts['unique_counts'][col] = int(df[col].nunique())
 
-    return columns_info
+    return facts
 
 
-def validate_column_selection(file_path: Path, tree_order: List[str], value_column: str, header_row: int = 0, skip_rows: int = 0) -> Tuple[bool, List[str]]:
+def validation_facts_from_sample(df: pd.DataFrame, tree_order: List[str], value_column: str,
+                                 complete: bool) -> Dict:
     """
-    Validate user's column selection before processing.
+    Gather validation facts from the first rows of a file.
+
+    Column names are always exact. Checks that pass on the sample stay
+    passed (more rows can't add missing variety back or lower the row
+    count), so only the ones the sample fails are marked provisional, unless
+    the sample is the whole file.
 
     Args:
-        file_path: Path to data file
+        df: Sample rows, parsed with the file's header row and skip rows
         tree_order: Selected hierarchy columns
         value_column: Selected value column
-        header_row: Row index to use as column headers (default 0)
-        skip_rows: Number of rows to skip before header (default 0)
+        complete: True if the sample holds every row of the file
+    """
+    facts = validation_facts_from_frame(df, df.columns.tolist(), tree_order, value_column)
+    if complete:
+        return facts
+
+    # The numeric ratio of a sample is only an estimate either way
+    provisional = ['value_numeric']
+    if any(count < 2 for count in facts['unique_counts'].values()):
+        provisional.append('hierarchy_variety')
+    if facts['row_count'] < 10:
+        provisional.append('row_count')
+
+    facts['provisional'] = provisional
+    return facts
+
+
+def validation_facts_from_profile(profile: Dict, tree_order: List[str], value_column: str) -> Dict:
+    """
+    Gather validation facts from a full-file column profile (see column_profiler).
+
+    The profile covers every row, so nothing is provisional. Distinct counts
+    are exact below the sketch size, which is far above the 2 values checked.
+    """
+    columns = {col['name']: col for col in profile['columns']}
+    row_count = profile['row_count']
+
+    value_numeric_ratio = None
+    if value_column in columns and row_count > 0:
+        col = columns[value_column]
+        value_numeric_ratio = col['numeric_ratio'] * (1 - col['null_ratio'])
+
+    return {
+        'columns': [str(name) for name in columns],
+        'row_count': row_count,
+        'value_numeric_ratio': value_numeric_ratio,
+        'unique_counts': {col: columns[col]['unique_count'] for col in tree_order if col in columns},
+        'provisional': []
+    }
+
+
+def check_validation_facts(facts: Dict, tree_order: List[str], value_column: str) -> Tuple[bool, List[str], List[str]]:
+    """
+    Validate a column selection against gathered facts.
+
+    Failures of checks listed in facts['provisional'] were only seen on a
+    sample; they are returned as warnings and re-checked exactly during
+    processing.
 
     Returns:
-        (is_valid, list_of_errors)
+        (is_valid, list_of_errors, list_of_warnings)
     """
     errors = []
+    warnings = []
+    provisional = set(facts.get('provisional', []))
 
-    # Read file
-    try:
-        file_ext = file_path.suffix.lower()
-        skiprows = list(range(skip_rows)) if skip_rows > 0 else None
-
-        if file_ext == '.csv':
-            df = pd.read_csv(file_path, header=header_row, skiprows=skiprows)
-        elif file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path, header=header_row, skiprows=skiprows)
+    def fail(check: str, message: str):
+        if check in provisional:
+            warnings.append(f"{message} in the first rows; this is re-checked on the full file during processing")
         else:
-            errors.append(f"Unsupported file type: {file_ext}")
-            return False, errors
-    except Exception as e:
-        errors.append(f"Failed to read file: {str(e)}")
-        return False, errors
+            errors.append(message)
 
     # Check column count
     if len(tree_order) < 3:
         errors.append("Hierarchy must have at least 3 levels")
 
     # Check columns exist
-    all_columns = set(df.columns)
+    all_columns = set(facts['columns'])
     required = set(tree_order + [value_column])
     missing = required - all_columns
     if missing:
         errors.append(f"Columns not found in file: {', '.join(missing)}")
-        return False, errors
+        return False, errors, warnings
 
     # Check for duplicates
     if value_column in tree_order:
@@ -475,19 +1098,19 @@ def validate_column_selection(file_path: Path, tree_order: List[str], value_colu
         errors.append("Hierarchy columns must be unique (no duplicates)")
 
     # Check value column is numeric
-    cleaned_values = df[value_column].apply(GenericProcessor.clean_numeric_value)
-    numeric_ratio = (cleaned_values != 0).sum() / len(df)
+    numeric_ratio = facts['value_numeric_ratio'] or 0.0
     if numeric_ratio < 0.5:
-        errors.append(f"Value column '{value_column}' must contain mostly numeric data (only {numeric_ratio*100:.1f}% valid)")
+        fail('value_numeric', f"Value column '{value_column}' must contain mostly numeric data (only {numeric_ratio*100:.1f}% valid)")
 
     # Check hierarchy columns have sufficient variety
     for col in tree_order:
-        unique_count = df[col].nunique()
+        unique_count = facts['unique_counts'].get(col, 0)
         if unique_count < 2:
-            errors.append(f"Hierarchy column '{col}' must have at least 2 unique values (found {unique_count})")
+            fail('hierarchy_variety', f"Hierarchy column '{col}' must have at least 2 unique values (found {unique_count})")
 
     # Check we have enough data
-    if len(df) < 10:
-        errors.append(f"File must contain at least 10 rows (found {len(df)})")
+    row_count = facts['row_count']
+    if row_count < 10:
+        fail('row_count', f"File must contain at least 10 rows (found {row_count})")
 
-    return len(errors) == 0, errors
+    return len(errors) == 0, errors, warnings
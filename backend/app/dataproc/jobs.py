@@ -0,0 +1,513 @@
+"""
+Background processing jobs.
+
+Processing runs on a bounded process pool instead of a thread per request,
+so CPU-heavy pandas work does not compete with the web worker under the GIL
+and only a fixed number of files are processed at once. Each job's status
+and progress live in a small JSON file under DATA_DIR/jobs, so any web
+worker can report on or stream any job.
+
+The job store is also the queue. Every web worker runs a dispatcher that,
+under a lock shared by all workers, claims the next queued job whenever
+fewer than JOB_WORKERS jobs are running in total, and runs it on its own
+process pool. Queued jobs start in (priority, file size) order across all
+workers: lower priority values go first, and among equal priorities smaller
+files go first, so a small file is not stuck behind a very large one.
+
+A running job records its process and a heartbeat. Jobs whose process is
+gone (e.g. the web worker that ran them was restarted) are marked failed by
+the next dispatcher pass, so they do not block their session forever.
+
+Cancellation is cooperative: a cancel request leaves a marker file next to
+the job's state, and the running job checks it (and its deadline) at the
+processor's cancellation points.
+"""
+import json
+import multiprocessing
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .generic_processor import GenericProcessor, ProcessingCancelled
+from .result_cache import ResultCache
+from .single_flight import file_lock
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+TERMINAL_STATUSES = (DONE, ERROR, CANCELLED)
+
+# Seconds between cancel marker and deadline checks inside a running job
+CANCEL_CHECK_SECONDS = 0.2
+
+# Seconds between heartbeats of a running job, and without one after which
+# it is considered dead (when its process cannot be checked directly)
+HEARTBEAT_SECONDS = 10
+HEARTBEAT_STALE_SECONDS = 300
+
+# Seconds between a dispatcher's looks at the queue
+DISPATCH_POLL_SECONDS = 0.5
+
+HOST = socket.gethostname()
+
+
+class JobStore:
+    """
+    Job state files, one JSON document per job.
+
+    Updates are read-modify-write under a per-job lock file, so writes from
+    the job process (progress, heartbeats) and from web workers (cancel,
+    claim) never overwrite each other. Unfinished jobs also have an
+    '.active' marker, so listing them does not read every finished job.
+    """
+
+    JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, jobs_dir: Union[str, Path]):
+        self.jobs_dir = Path(jobs_dir)
+
+    def path(self, job_id: str) -> Path:
+        """State file for a job id; rejects ids that are not job ids."""
+        if not self.JOB_ID_PATTERN.match(job_id or ''):
+            raise KeyError(job_id)
+        return self.jobs_dir / f"{job_id}.json"
+
+    def create(self, job_id: str, kind: str, params: Dict[str, Any], priority: int, size: int,
+               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Write the initial state of a queued job."""
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': QUEUED,
+            'priority': priority,
+            'size': size,
+            'timeout': timeout,
+            'params': params,
+            'progress': {'current': 0, 'total': 100, 'message': 'Queued...'},
+            'error': None,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'updated_at': now,
+            'pid': None,
+            'host': None,
+            'heartbeat_at': None
+        }
+        self._write(job)
+        self._marker(job_id).touch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's state, or None if it does not exist."""
+        try:
+            with open(self.path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def version(self, job_id: str) -> Optional[tuple]:
+        """
+        Cheap change marker for a job's state, from a stat call.
+
+        Every write replaces the state file, so the marker changes with each
+        update; None if the job does not exist.
+        """
+        try:
+            stat = self.path(job_id).stat()
+        except (KeyError, OSError):
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def update(self, job_id: str, expect: Optional[Tuple[str, ...]] = None, **fields) -> Optional[Dict[str, Any]]:
+        """
+        Merge fields into a job's state.
+
+        Args:
+            job_id: Job to update
+            expect: Only update while the job's status is one of these
+            **fields: Fields to set
+
+        Returns:
+            The updated state, or None if the job does not exist or its
+            status was not expected
+        """
+        with file_lock(self.path(job_id).with_suffix('.lock')):
+            job = self.get(job_id)
+            if job is None or (expect is not None and job['status'] not in expect):
+                return None
+            job.update(fields, updated_at=time.time())
+            self._write(job)
+        if job['status'] in TERMINAL_STATUSES:
+            self._marker(job_id).unlink(missing_ok=True)
+        return job
+
+    def request_cancel(self, job_id: str, reason: str) -> None:
+        """Leave a cancel marker for the job; the first reason given wins."""
+        marker = self.path(job_id).with_suffix('.cancel')
+        try:
+            with open(marker, 'x', encoding='utf-8') as f:
+                f.write(reason)
+        except FileExistsError:
+            pass
+
+    def cancel_reason(self, job_id: str) -> Optional[str]:
+        """The reason a job was asked to cancel, or None."""
+        try:
+            return self.path(job_id).with_suffix('.cancel').read_text(encoding='utf-8') or 'Cancelled'
+        except OSError:
+            return None
+
+    def active(self) -> List[Dict[str, Any]]:
+        """States of all queued and running jobs."""
+        jobs = []
+        for marker in self.jobs_dir.glob('*.active'):
+            job = self.get(marker.stem)
+            if job and job['status'] not in TERMINAL_STATUSES:
+                jobs.append(job)
+            elif job:
+                marker.unlink(missing_ok=True)
+        return jobs
+
+    def prune(self, max_age: float) -> None:
+        """Delete state files of jobs that finished more than max_age seconds ago."""
+        cutoff = time.time() - max_age
+        for path in self.jobs_dir.glob('*.json'):
+            job = self.get(path.stem)
+            if job and job['status'] in TERMINAL_STATUSES and (job['finished_at'] or 0) < cutoff:
+                path.unlink(missing_ok=True)
+                for suffix in ('.cancel', '.lock', '.active'):
+                    path.with_suffix(suffix).unlink(missing_ok=True)
+
+    @staticmethod
+    def is_orphaned(job: Dict[str, Any], now: float) -> bool:
+        """
+        Whether a running job's process is gone.
+
+        A process on this host is checked directly; any job whose heartbeat
+        is older than HEARTBEAT_STALE_SECONDS also counts as gone.
+        """
+        if now - (job.get('heartbeat_at') or job.get('started_at') or 0) > HEARTBEAT_STALE_SECONDS:
+            return True
+        if job.get('host') != HOST or not job.get('pid'):
+            return False
+        try:
+            os.kill(job['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _marker(self, job_id: str) -> Path:
+        """Marker file present while a job is queued or running."""
+        return self.path(job_id).with_suffix('.active')
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        """Atomically replace a job's state file."""
+        path = self.path(job['job_id'])
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, default=str)
+        os.replace(temp_path, path)
+
+
+def run_generic(params: Dict[str, Any], progress_callback: Callable[..., None],
+                cancel_check: Callable[[], Optional[str]]) -> None:
+    """Job runner: build a generic sunburst chart, reusing a cached result when possible."""
+    result_cache = ResultCache(os.getenv('UPLOAD_DIR', '../data/raw'))
+    GenericProcessor(**params, progress_callback=progress_callback, cancel_check=cancel_check,
+                     result_cache=result_cache).process_all()
+
+
+def run_append(params: Dict[str, Any], progress_callback: Callable[..., None],
+               cancel_check: Callable[[], Optional[str]]) -> None:
+    """Job runner: add the rows of another file to a session's chart (see GenericProcessor.append)."""
+    chart_path = Path(params['data_path']) / f"{params['session_id']}_sunburst_data.json"
+    with open(chart_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    GenericProcessor.from_chart(previous, **params, progress_callback=progress_callback,
+                                cancel_check=cancel_check).append(previous)
+
+
+# Job kinds and the functions that run them inside pool workers; runners take
+# (params, progress_callback, cancel_check)
+JOB_RUNNERS: Dict[str, Callable[..., None]] = {
+    'generic': run_generic,
+    'append': run_append
+}
+
+
+def run_job(jobs_dir: str, job_id: str, kind: str, params: Dict[str, Any]) -> None:
+    """
+    Pool worker entry point: run one job claimed by a dispatcher, recording
+    status, progress and heartbeats.
+    """
+    store = JobStore(jobs_dir)
+
+    # Record this process; the job may have been marked failed meanwhile
+    job = store.update(job_id, expect=(RUNNING,), pid=os.getpid(), host=HOST, heartbeat_at=time.time())
+    if job is None:
+        return
+
+    # Cancelled while being claimed
+    reason = store.cancel_reason(job_id)
+    if reason:
+        store.update(job_id, expect=(RUNNING,), status=CANCELLED, error=reason, finished_at=time.time())
+        return
+
+    deadline = time.time() + job['timeout'] if job.get('timeout') else None
+    last_check = 0.0
+
+    # Heartbeats come from a thread, as a processing step can run for long
+    # without reporting progress
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(HEARTBEAT_SECONDS):
+            store.update(job_id, expect=(RUNNING,), heartbeat_at=time.time())
+
+    threading.Thread(target=heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def cancel_check() -> Optional[str]:
+        nonlocal last_check
+        if deadline and time.time() > deadline:
+            return f"Job exceeded its time limit of {job['timeout']:g} seconds"
+        now = time.monotonic()
+        if now - last_check < CANCEL_CHECK_SECONDS:
+            return None
+        last_check = now
+        return store.cancel_reason(job_id)
+
+    def progress_callback(current: int, total: int, message: str, details: Optional[Dict[str, Any]] = None):
+        # Updates arrive throttled by the processor's ProgressReporter
+        store.update(job_id, expect=(RUNNING,), heartbeat_at=time.time(),
+                     progress={'current': current, 'total': total, 'message': message, **(details or {})})
+
+    try:
+        JOB_RUNNERS[kind](params, progress_callback, cancel_check)
+        store.update(job_id, expect=(RUNNING,), status=DONE, finished_at=time.time(),
+                     progress={'current': 100, 'total': 100, 'message': 'Complete!'})
+    except ProcessingCancelled as e:
+        print(f"Job {job_id} cancelled: {str(e)}")
+        store.update(job_id, expect=(RUNNING,), status=CANCELLED, error=str(e), finished_at=time.time())
+    except Exception as e:
+        print(f"Job {job_id} failed: {str(e)}")
+        store.update(job_id, expect=(RUNNING,), status=ERROR, error=str(e), finished_at=time.time())
+    finally:
+        stopped.set()
+
+
+class JobManager:
+    """Queues jobs in the shared job store and runs them, in priority order, on bounded process pools."""
+
+    DEFAULT_WORKERS = 2
+    DEFAULT_TIMEOUT = 3600  # Seconds a job may run before it is cancelled
+    RETENTION_SECONDS = 7 * 24 * 3600  # Finished job states are kept for a week
+
+    def __init__(self, jobs_dir: Union[str, Path], max_workers: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """
+        Args:
+            jobs_dir: Directory for job state files
+            max_workers: Jobs run at once across all processes sharing
+                jobs_dir (defaults to the JOB_WORKERS environment variable)
+            timeout: Default per-job run time limit in seconds (defaults to the
+                JOB_TIMEOUT_SECONDS environment variable; 0 for no limit)
+        """
+        self.store = JobStore(jobs_dir)
+        self.max_workers = max_workers or int(os.getenv('JOB_WORKERS', self.DEFAULT_WORKERS))
+        self.timeout = timeout if timeout is not None else float(os.getenv('JOB_TIMEOUT_SECONDS', self.DEFAULT_TIMEOUT))
+
+        self._running = 0  # Jobs this process started that have not finished
+        self._condition = threading.Condition()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._dispatcher_pid: Optional[int] = None
+
+        if self.store.jobs_dir.exists():
+            self.store.prune(self.RETENTION_SECONDS)
+            # Jobs left running by a process that no longer exists
+            with self._dispatch_lock():
+                self._fail_orphans(self.store.active())
+
+    def start(self) -> None:
+        """
+        Start this process's dispatcher, unless it is already running.
+
+        Call it from the process that serves requests (after gunicorn forks
+        its workers and gevent patches them), not at import time.
+        """
+        with self._condition:
+            if self._dispatcher_pid == os.getpid() and self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            if self._dispatcher_pid != os.getpid():
+                # Forked: the parent's pool and counts do not belong to this process
+                self._executor = None
+                self._running = 0
+            self._dispatcher_pid = os.getpid()
+            self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def submit(self, kind: str, params: Dict[str, Any], priority: int = 0, size: int = 0,
+               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Queue a job and return its initial state right away.
+
+        The job is started by whichever process's dispatcher claims it first.
+
+        Args:
+            kind: Job kind (a key of JOB_RUNNERS)
+            params: Keyword arguments for the job runner (must be picklable and JSON-serializable)
+            priority: Lower values start first
+            size: Input size in bytes; smaller inputs start first within a priority
+            timeout: Run time limit in seconds (defaults to the manager's timeout; 0 for no limit)
+        """
+        if kind not in JOB_RUNNERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = uuid.uuid4().hex
+        timeout = self.timeout if timeout is None else timeout
+        job = self.store.create(job_id, kind, params, priority, size, timeout=timeout or None)
+
+        self.start()
+        with self._condition:
+            self._condition.notify_all()
+
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's state (from any process), or None if unknown."""
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str, reason: str = 'Cancelled by request') -> Optional[Dict[str, Any]]:
+        """
+        Ask a job to stop; works from any process.
+
+        A queued job is marked cancelled right away and never starts. A
+        running job stops at its next cancellation point, leaving the
+        session's previous outputs as they were.
+
+        Returns:
+            The job's state, or None if unknown
+        """
+        job = self.store.get(job_id)
+        if job is None or job['status'] in TERMINAL_STATUSES:
+            return job
+
+        self.store.request_cancel(job_id, reason)
+        cancelled = self.store.update(job_id, expect=(QUEUED,), status=CANCELLED, error=reason,
+                                      finished_at=time.time())
+        # Claimed meanwhile: the job sees the marker when it starts
+        return cancelled or self.store.get(job_id)
+
+    def active_jobs(self) -> List[Dict[str, Any]]:
+        """States of all queued and running jobs, across processes."""
+        return self.store.active()
+
+    def _dispatch(self) -> None:
+        """Claim and start queued jobs whenever this process has a free pool slot."""
+        while True:
+            with self._condition:
+                while self._running >= self.max_workers:
+                    self._condition.wait()
+
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"Job dispatcher error: {str(e)}")
+                job = None
+            if job is None:
+                with self._condition:
+                    self._condition.wait(DISPATCH_POLL_SECONDS)
+                continue
+
+            job_id = job['job_id']
+            with self._condition:
+                self._running += 1
+            try:
+                future = self._pool().submit(run_job, str(self.store.jobs_dir), job_id, job['kind'], job['params'])
+            except Exception as e:
+                with self._condition:
+                    self._running -= 1
+                self.store.update(job_id, expect=(RUNNING,), status=ERROR, error=f"Could not start job: {e}",
+                                  finished_at=time.time())
+                continue
+
+            future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the next queued job as running in this process, if fewer than
+        max_workers jobs run across all processes.
+
+        Returns:
+            The claimed job's state, or None
+        """
+        with self._dispatch_lock():
+            active = self._fail_orphans(self.store.active())
+            if sum(job['status'] == RUNNING for job in active) >= self.max_workers:
+                return None
+
+            queued = sorted((job for job in active if job['status'] == QUEUED),
+                            key=lambda job: (job['priority'], job['size'], job['created_at']))
+            for job in queued:
+                now = time.time()
+                claimed = self.store.update(job['job_id'], expect=(QUEUED,), status=RUNNING, started_at=now,
+                                            pid=os.getpid(), host=HOST, heartbeat_at=now)
+                if claimed is not None:
+                    return claimed
+        return None
+
+    def _fail_orphans(self, active: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Mark running jobs whose process is gone as failed; returns the jobs still active."""
+        now = time.time()
+        still_active = []
+        for job in active:
+            if job['status'] == RUNNING and JobStore.is_orphaned(job, now):
+                print(f"Job {job['job_id']} lost its worker process; marking it failed")
+                self.store.update(job['job_id'], expect=(RUNNING,), status=ERROR, finished_at=now,
+                                  error="The job's worker process stopped (e.g. the server restarted); submit it again")
+                continue
+            still_active.append(job)
+        return still_active
+
+    def _dispatch_lock(self):
+        """Lock shared by the dispatchers of all processes using this job store."""
+        self.store.jobs_dir.mkdir(parents=True, exist_ok=True)
+        return file_lock(self.store.jobs_dir / '.dispatch.lock')
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """The process pool, created on first use."""
+        if self._executor is None:
+            # Spawned workers start clean instead of inheriting the web
+            # worker's threads and locks
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _finished(self, job_id: str, future: Future) -> None:
+        """Free the job's slot; record failures the worker could not report itself."""
+        error = future.exception()
+
+        with self._condition:
+            self._running -= 1
+            if isinstance(error, BrokenProcessPool):
+                # A worker died (e.g. out of memory); start a fresh pool for later jobs
+                self._executor = None
+            self._condition.notify_all()
+
+        if error is not None:
+            self.store.update(job_id, expect=(RUNNING,), status=ERROR, error=f"Job worker failed: {error}",
+                              finished_at=time.time())
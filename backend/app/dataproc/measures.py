@@ -0,0 +1,168 @@
+"""
+Measures aggregated per chart node.
+
+A build always sums the value column into each node's value. It can also
+compute extra measures in the same groupby per hierarchy level, so the chart
+can switch metric (spend, impressions, row count, mean CPM, ...) without
+reprocessing the file. A measure is written as "<aggregation>:<column>",
+e.g. "sum:impressions", "mean:cpm" or "distinct:buyer_name", or just "count"
+for the number of rows; that string is also its id in the chart data and in
+/data?measure=.
+"""
+import math
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+
+# Aggregations and the pandas groupby function computing each
+AGGREGATIONS = {
+    'sum': 'sum',
+    'count': 'size',
+    'mean': 'mean',
+    'min': 'min',
+    'max': 'max',
+    'distinct': 'nunique'
+}
+
+# Aggregations over parsed numbers (the others also work on text columns)
+NUMERIC_AGGREGATIONS = ('sum', 'mean', 'min', 'max')
+
+
+def parse_measure(measure: str) -> Dict[str, Optional[str]]:
+    """
+    Parse a measure string.
+
+    Returns:
+        Dictionary with id, agg and column (None for count)
+
+    Raises:
+        ValueError: If the aggregation is unknown or the column is missing
+    """
+    if not isinstance(measure, str):
+        raise ValueError(f"Measures must be strings like 'sum:column', got {measure!r}")
+
+    agg, _, column = measure.strip().partition(':')
+    agg = agg.strip().lower()
+    column = column.strip() or None
+
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{agg}' (expected one of: {', '.join(AGGREGATIONS)})")
+    if agg == 'count':
+        if column:
+            raise ValueError("The count measure takes no column")
+        return {'id': 'count', 'agg': agg, 'column': None}
+    if not column:
+        raise ValueError(f"Measure '{agg}' needs a column, e.g. '{agg}:column'")
+
+    return {'id': f"{agg}:{column}", 'agg': agg, 'column': column}
+
+
+def parse_measures(measures: Optional[List[str]]) -> List[Dict[str, Optional[str]]]:
+    """Parse a list of measure strings, dropping repeats."""
+    if measures is None:
+        return []
+    if not isinstance(measures, list):
+        raise ValueError("measures must be a list, e.g. ['sum:impressions', 'count']")
+
+    parsed = {}
+    for measure in measures:
+        spec = parse_measure(measure)
+        parsed.setdefault(spec['id'], spec)
+    return list(parsed.values())
+
+
+def json_number(value: Any) -> Optional[float]:
+    """A measure value as JSON: a float, or None where it is undefined (e.g. mean of no numbers)."""
+    if value is None or pd.isna(value):
+        return None
+    value = float(value)
+    return None if math.isinf(value) else value
+
+
+def mean_state_columns(measure_id: str) -> List[str]:
+    """Columns holding the sum and the number of values behind a mean measure, so it can be merged."""
+    return [f"{measure_id}|sum", f"{measure_id}|n"]
+
+
+def aggregate_groups(grouped, value_column: str, measures: List[Dict], merge_state: bool = False) -> pd.DataFrame:
+    """
+    Aggregate the value column and every measure in one pass over the groups.
+
+    Args:
+        grouped: DataFrameGroupBy over the hierarchy columns
+        value_column: Column summed into the node value
+        measures: Parsed measures
+        merge_state: Also add the mean_state_columns of each mean measure
+
+    Returns:
+        DataFrame indexed by group, with a 'value' column and one column per
+        measure id (then the merge state columns, if requested)
+    """
+    named = {'value': pd.NamedAgg(column=value_column, aggfunc='sum')}
+    for idx, spec in enumerate(measures):
+        named[f"m{idx}"] = pd.NamedAgg(column=spec['column'] or value_column, aggfunc=AGGREGATIONS[spec['agg']])
+    state = []
+    if merge_state:
+        for idx, spec in enumerate(measures):
+            if spec['agg'] == 'mean':
+                named[f"s{idx}"] = pd.NamedAgg(column=spec['column'], aggfunc='sum')
+                named[f"n{idx}"] = pd.NamedAgg(column=spec['column'], aggfunc='count')
+                state.extend(mean_state_columns(spec['id']))
+
+    result = grouped.agg(**named)
+    result.columns = ['value'] + [spec['id'] for spec in measures] + state
+    return result
+
+
+def aggregate_frame(df: pd.DataFrame, measures: List[Dict]) -> Dict[str, Optional[float]]:
+    """Measures over all rows (the chart root)."""
+    values = {}
+    for spec in measures:
+        if spec['agg'] == 'count':
+            values[spec['id']] = float(len(df))
+        else:
+            values[spec['id']] = json_number(getattr(df[spec['column']], AGGREGATIONS[spec['agg']])())
+    return values
+
+
+def select_measure(chart: Dict[str, Any], measure: str) -> Dict[str, Any]:
+    """
+    Make a measure the value of every node of a chart, in place.
+
+    Siblings are re-sorted by the new value, descending (nodes without a
+    value last), and the chart's 'measure' field names the measure shown.
+
+    Args:
+        chart: Chart metadata as saved by GenericProcessor
+        measure: Measure id, e.g. 'count' or 'mean:cpm'
+
+    Returns:
+        The chart
+
+    Raises:
+        ValueError: If the chart has no such measure
+    """
+    measure_id = parse_measure(measure)['id']
+    available = [spec['id'] for spec in chart.get('measures') or []]
+    if measure_id not in available:
+        raise ValueError(f"Measure '{measure}' was not built for this chart "
+                         f"(available: {', '.join(available) or 'none'})")
+    chart['measure'] = measure_id
+    if measure_id == available[0]:
+        return chart
+
+    def sort_key(node):
+        return -math.inf if node['value'] is None else node['value']
+
+    root = chart['data']
+    root['value'] = root['measures'][measure_id]
+    stack = [root]
+    while stack:
+        children = stack.pop().get('children') or []
+        for child in children:
+            child['value'] = child['measures'][measure_id]
+        children.sort(key=sort_key, reverse=True)
+        stack.extend(children)
+
+    return chart
@@ -0,0 +1,139 @@
+"""
+Running blocking work off the event loop.
+
+Under gevent workers (SERVER_MODE=gevent) a request that parses a file
+holds the worker's event loop, stalling every other connection it serves.
+run_blocking hands such work to gevent's native thread pool, so the loop
+keeps serving progress streams and cheap reads. Without gevent's monkey
+patching (sync workers, the development server, job processes) it simply
+calls the function.
+
+A request body arriving on a gevent socket can only be read from the event
+loop, so run_blocking_stream reads it there and pipes it to the pool thread.
+"""
+import os
+from typing import Any, BinaryIO, Callable, Optional
+
+
+PIPE_CHUNK_SIZE = 1024 * 1024  # Bytes read from a request body per event-loop turn
+
+_pool_thread: Optional[Any] = None
+
+
+def gevent_active() -> bool:
+    """True if gevent has monkey-patched this process."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def _run_in_pool(func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    """Pool-thread wrapper that marks the thread, so nested calls run inline."""
+    _pool_thread.active = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _pool_thread.active = False
+
+
+def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Call func, on gevent's native thread pool if running under gevent.
+
+    The calling greenlet waits cooperatively, and exceptions are re-raised
+    in the caller. func must not touch the request context.
+    """
+    global _pool_thread
+
+    if not gevent_active():
+        return func(*args, **kwargs)
+
+    import gevent
+    from gevent import monkey
+
+    if _pool_thread is None:
+        # A real thread-local: the patched one would be per greenlet
+        _pool_thread = monkey.get_original('threading', 'local')()
+    if getattr(_pool_thread, 'active', False):
+        return func(*args, **kwargs)
+
+    return gevent.get_hub().threadpool.apply(_run_in_pool, (func, args, kwargs))
+
+
+def run_blocking_stream(func: Callable[..., Any], stream: BinaryIO, *args, **kwargs) -> Any:
+    """
+    run_blocking for a func that reads a stream, e.g. a request body: func(stream, *args, **kwargs).
+
+    Under gevent a stream that cannot seek may be a socket, which only its
+    event loop can read. It is read here, cooperatively, and written to a
+    pipe whose other end func reads on the pool thread, so the body is
+    still streamed rather than held in memory. Seekable streams (e.g.
+    spooled form uploads) are passed as they are.
+    """
+    if not gevent_active() or _is_seekable(stream):
+        return run_blocking(func, stream, *args, **kwargs)
+
+    import gevent
+
+    read_fd, write_fd = os.pipe()
+    reader = _PipeReader(read_fd)
+    pump = gevent.spawn(_pump, stream, write_fd, reader)
+    try:
+        return run_blocking(func, reader, *args, **kwargs)
+    finally:
+        # Closing the read end first stops a pump func no longer reads from
+        reader.close()
+        pump.kill()
+
+
+def _pump(stream: BinaryIO, write_fd: int, reader: '_PipeReader') -> None:
+    """Copy a stream into a pipe from the event loop; read errors are passed on to the reader."""
+    from gevent import os as gevent_os
+
+    try:
+        gevent_os.make_nonblocking(write_fd)
+        while True:
+            chunk = stream.read(PIPE_CHUNK_SIZE)
+            if not chunk:
+                break
+            view = memoryview(chunk)
+            while view:
+                view = view[gevent_os.nb_write(write_fd, view):]
+    except BrokenPipeError:
+        pass  # The reader stopped early (e.g. the upload was rejected)
+    except Exception as e:
+        # E.g. the client disconnected; the reader must not take the
+        # truncated body for the whole upload
+        reader.error = e
+    finally:
+        os.close(write_fd)
+
+
+class _PipeReader:
+    """Blocking reader of a pipe fed by _pump; raises the pump's error at end of data."""
+
+    def __init__(self, fd: int):
+        self.file = os.fdopen(fd, 'rb')
+        self.error: Optional[BaseException] = None
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        if not data and self.error is not None:
+            raise self.error
+        return data
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _is_seekable(stream: BinaryIO) -> bool:
+    """Check whether a stream supports random access."""
+    try:
+        return stream.seekable()
+    except AttributeError:
+        return False
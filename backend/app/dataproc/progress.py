@@ -0,0 +1,125 @@
+"""
+Throttled, work-based progress reporting.
+
+Processing runs in stages (reading, validating, building the tree, writing
+table data). Each stage covers a slice of the overall 0-100 progress and
+measures its work in rows or bytes, so progress tracks work done rather than
+categories visited. Updates within a stage are coalesced to at most one per
+interval; stage changes and explicit reports always go out. Each update
+carries the stage's throughput and an ETA estimate for the stage.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+# Minimum seconds between progress updates within a stage
+PROGRESS_INTERVAL_SECONDS = float(os.getenv('PROGRESS_INTERVAL_SECONDS', 0.5))
+
+
+def format_amount(amount: float, unit: str) -> str:
+    """Human-readable amount of work, e.g. '1,200 rows' or '35.2 MB'."""
+    if unit == 'bytes':
+        for size_unit in ('bytes', 'KB', 'MB', 'GB'):
+            if amount < 1024 or size_unit == 'GB':
+                return f"{amount:,.0f} {size_unit}" if size_unit == 'bytes' else f"{amount:,.1f} {size_unit}"
+            amount /= 1024
+    return f"{amount:,.0f} {unit}"
+
+
+def format_duration(seconds: float) -> str:
+    """Short duration, e.g. '45s' or '3m 10s'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+class ProgressReporter:
+    """Reports stage-based progress to a callback, at most once per interval."""
+
+    def __init__(self, callback: Callable[[int, int, str, Optional[Dict[str, Any]]], None],
+                 min_interval: Optional[float] = None):
+        """
+        Args:
+            callback: Called as callback(current, total, message, details); details
+                holds the stage's work counts, rate and ETA, or None for plain reports
+            min_interval: Minimum seconds between updates within a stage
+                (defaults to the PROGRESS_INTERVAL_SECONDS environment variable)
+        """
+        self.callback = callback
+        self.min_interval = PROGRESS_INTERVAL_SECONDS if min_interval is None else min_interval
+
+        self.name = ''
+        self.start = 0
+        self.end = 0
+        self.total: Optional[float] = None
+        self.unit = 'rows'
+        self.done = 0.0
+        self._started_at = 0.0
+        self._last_sent = 0.0
+
+    def report(self, current: int, total: int, message: str) -> None:
+        """Send a plain progress update right away."""
+        self._last_sent = time.monotonic()
+        self.callback(current, total, message, None)
+
+    def stage(self, name: str, start: int, end: int, total: Optional[float] = None, unit: str = 'rows') -> None:
+        """
+        Start a stage covering overall progress start..end.
+
+        Args:
+            name: Stage label, e.g. 'Building tree'
+            start: Overall progress at the start of the stage
+            end: Overall progress when the stage is done
+            total: Amount of work in the stage, if known
+            unit: Unit of work: 'rows', 'bytes', ...
+        """
+        self.name = name
+        self.start = start
+        self.end = end
+        self.total = total
+        self.unit = unit
+        self.done = 0.0
+        self._started_at = time.monotonic()
+        self._send()
+
+    def update(self, done: float, force: bool = False) -> None:
+        """Set the work done in the current stage; sent if the interval has passed."""
+        self.done = done
+        if force or time.monotonic() - self._last_sent >= self.min_interval:
+            self._send()
+
+    def details(self) -> Dict[str, Any]:
+        """Work counts, throughput and ETA of the current stage."""
+        elapsed = time.monotonic() - self._started_at
+        rate = self.done / elapsed if elapsed > 0 and self.done else None
+
+        eta = None
+        if rate and self.total:
+            eta = max(self.total - self.done, 0) / rate
+
+        return {
+            'stage': self.name,
+            'processed': self.done,
+            'stageTotal': self.total,
+            'unit': self.unit,
+            'rate': rate,
+            'etaSeconds': eta
+        }
+
+    def _send(self) -> None:
+        details = self.details()
+
+        fraction = min(self.done / self.total, 1.0) if self.total else 0.0
+        current = self.start + int((self.end - self.start) * fraction)
+
+        message = f"{self.name}..."
+        if self.total and self.done:
+            message = (f"{self.name}: {format_amount(self.done, self.unit)} of "
+                       f"{format_amount(self.total, self.unit)}")
+            if details['etaSeconds'] is not None and self.done < self.total:
+                message += f" (about {format_duration(details['etaSeconds'])} left)"
+
+        self._last_sent = time.monotonic()
+        self.callback(current, 100, message, details)
@@ -0,0 +1,217 @@
+"""
+On-disk cache of processing results.
+
+Rebuilding a chart from the same upload with the same hierarchy, value
+column, measures, header/skip rows and column types gives the same tree and table
+data, typically under a new session id. Finished results are kept under
+UPLOAD_DIR/.result_cache, keyed by the upload's content fingerprint plus the
+normalized processing config. A hit hard-links the cached table data into
+the new session (falling back to a copy across filesystems), along with the
+columnar copy used for re-pivoting and the aggregation cube, and rewrites
+only the chart JSON with the session's chart name and file names.
+
+Session outputs are always replaced atomically (write to a temp file, then
+rename), so a linked file is never modified in place through the session.
+
+Builds hold a lock file per key, so an identical build started meanwhile
+(for another session or in another process) waits and then reuses the result.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from .analysis_cache import AnalysisCache
+from .single_flight import file_lock
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Atomically make dst a hard link to src, or a copy if linking is not possible."""
+    temp_path = dst.with_name(f"{dst.name}.{os.getpid()}.link")
+    temp_path.unlink(missing_ok=True)
+    try:
+        os.link(src, temp_path)
+    except OSError:
+        shutil.copyfile(src, temp_path)
+    os.replace(temp_path, dst)
+
+
+def write_json_atomic(path: Path, value: Any) -> None:
+    """
+    Write JSON to a temp file and rename it over path.
+
+    Written compactly in one json.dumps call, which uses the C encoder;
+    indenting (or json.dump) falls back to the much slower Python encoder,
+    which dominated saving charts with many nodes.
+    """
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(value, ensure_ascii=False))
+    os.replace(temp_path, path)
+
+
+class ResultCache:
+    """Processing results keyed by upload content and processing config, with size-based eviction."""
+
+    CACHE_DIR_NAME = '.result_cache'
+    LOCK_DIR_NAME = '.locks'
+    DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+
+    # Bump when processing output changes, so older entries stop matching
+    FORMAT_VERSION = 7
+
+    RESULT_FILE = 'result.json'
+    DATA_FILE = 'data.csv'
+    METADATA_FILE = 'metadata.csv'
+    FRAME_FILE = 'frame'  # Plus the session frame's suffix (.parquet or .pkl)
+    CUBE_FILE = 'cube.pkl'
+
+    def __init__(self, upload_dir: Union[str, Path], max_bytes: Optional[int] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            upload_dir: Directory holding uploads; the cache lives inside it
+            max_bytes: Maximum total size of cache entries before eviction
+        """
+        self.cache_dir = Path(upload_dir) / self.CACHE_DIR_NAME
+        self.lock_dir = Path(upload_dir) / self.LOCK_DIR_NAME
+        if max_bytes is None:
+            max_bytes = int(os.getenv('RESULT_CACHE_MAX_BYTES', self.DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def config(processor) -> Dict[str, Any]:
+        """
+        The processing config that determines a result.
+
+        Chart name and session id only label the result, so they are left
+        out; column types are limited to the columns the chart uses.
+        """
+        used = set(processor.chart_columns)
+        return {
+            'tree_order': list(processor.tree_order),
+            'value_column': processor.value_column,
+            'measures': sorted(spec['id'] for spec in processor.measures),
+            'cube_dimensions': sorted(processor.cube_dimensions),
+            'header_row': int(processor.header_row or 0),
+            'skip_rows': int(processor.skip_rows or 0),
+            'column_types': {col: col_type for col, col_type in sorted(processor.column_types.items())
+                             if col in used and col_type}
+        }
+
+    def key(self, processor) -> str:
+        """Build the cache key for a processor's input file and config."""
+        raw = json.dumps({
+            'file': AnalysisCache.fingerprint(processor.raw_data_path),
+            'config': self.config(processor),
+            'version': self.FORMAT_VERSION
+        }, sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def lock(self, processor, wait_check: Optional[Callable[[], None]] = None):
+        """Context manager holding the build lock for a processor's cache key."""
+        return file_lock(self.lock_dir / f"result-{self.key(processor)}.lock", wait_check=wait_check)
+
+    def restore(self, processor) -> Optional[Dict[str, Any]]:
+        """
+        Write a cached result as the processor's session outputs.
+
+        Returns:
+            The session's chart metadata, or None on a miss
+        """
+        entry_dir = self.cache_dir / self.key(processor)
+        try:
+            with open(entry_dir / self.RESULT_FILE, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+
+            link_or_copy(entry_dir / self.DATA_FILE, processor.data_csv_path)
+            link_or_copy(entry_dir / self.CUBE_FILE, processor.cube_path)
+            metadata_file = None
+            if (entry_dir / self.METADATA_FILE).exists():
+                link_or_copy(entry_dir / self.METADATA_FILE, processor.metadata_csv_path)
+                metadata_file = processor.metadata_csv_path.name
+            frame_file = None
+            entry_frame = entry_dir / f"{self.FRAME_FILE}{processor.frame_path.suffix}"
+            if entry_frame.exists():
+                link_or_copy(entry_frame, processor.frame_path)
+                frame_file = processor.frame_path.name
+        except (OSError, ValueError):
+            return None
+
+        metadata.update(
+            chart_name=processor.chart_name,
+            source_file=processor.raw_data_path.name,
+            data_file=processor.data_csv_path.name,
+            metadata_file=metadata_file,
+            frame_file=frame_file,
+            cube_file=processor.cube_path.name,
+            column_types=processor.column_types
+        )
+        metadata['data']['name'] = processor.chart_name
+        write_json_atomic(processor.sunburst_data_path, metadata)
+
+        # Touch on hit so eviction drops least recently used entries first
+        try:
+            os.utime(entry_dir / self.RESULT_FILE)
+        except OSError:
+            pass
+
+        return metadata
+
+    def store(self, processor, metadata: Dict[str, Any]) -> None:
+        """Keep a finished result, linking the session's output files into the cache."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_dir = self.cache_dir / self.key(processor)
+        if entry_dir.exists():
+            return
+
+        temp_dir = entry_dir.with_name(f"{entry_dir.name}.{os.getpid()}.tmp")
+        try:
+            temp_dir.mkdir()
+            link_or_copy(processor.data_csv_path, temp_dir / self.DATA_FILE)
+            link_or_copy(processor.cube_path, temp_dir / self.CUBE_FILE)
+            if metadata.get('metadata_file'):
+                link_or_copy(processor.metadata_csv_path, temp_dir / self.METADATA_FILE)
+            if metadata.get('frame_file'):
+                link_or_copy(processor.frame_path, temp_dir / f"{self.FRAME_FILE}{processor.frame_path.suffix}")
+            with open(temp_dir / self.RESULT_FILE, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False)
+            os.rename(temp_dir, entry_dir)
+        except OSError as e:
+            # Another process stored the same result first, or the disk is full
+            print(f"Could not cache processing result: {str(e)}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used entries until the cache fits max_bytes.
+
+        Linked files are counted at full size, although their space is only
+        freed once no session uses them either.
+        """
+        entries = []
+        total = 0
+
+        for entry_dir in self.cache_dir.iterdir():
+            try:
+                used = (entry_dir / self.RESULT_FILE).stat().st_mtime
+                size = sum(path.stat().st_size for path in entry_dir.iterdir())
+            except OSError:
+                continue
+            entries.append((used, size, entry_dir))
+            total += size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, entry_dir in sorted(entries):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            if total <= self.max_bytes:
+                break
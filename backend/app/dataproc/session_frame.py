@@ -0,0 +1,119 @@
+"""
+Columnar copy of a session's source rows, for re-pivoting.
+
+While writing the table data, processing also keeps every source row and
+column (before any filtering) in a columnar file next to the session's
+outputs. Cells are kept as the raw text the table pass read, so any column
+can become a hierarchy level with the labels a fresh build gives it (e.g.
+01006, not 1006); value and measure columns are parsed from the text when
+used, as in a fresh build. Repetitive columns are stored as categoricals,
+others as Arrow strings if pyarrow is installed. A re-pivot to a new
+hierarchy, value column or measures then loads only the columns it needs
+from that file and rebuilds the tree, instead of reading and parsing the
+raw upload again.
+
+The file is Parquet if pyarrow is installed (only the needed columns are
+read) and a pickle otherwise. Uploads above SESSION_FRAME_MAX_BYTES get no
+copy, as it is held in memory while it is built; they are re-processed instead.
+"""
+import importlib.util
+import os
+from pathlib import Path
+from typing import List, Optional, Union
+
+import pandas as pd
+
+
+# Source files larger than this get no columnar copy
+SESSION_FRAME_MAX_BYTES = int(os.getenv('SESSION_FRAME_MAX_BYTES', 512 * 1024 * 1024))
+
+FRAME_SUFFIX = '.parquet' if importlib.util.find_spec('pyarrow') is not None else '.pkl'
+
+# Dtype of text columns with mostly distinct values; categoricals elsewhere
+TEXT_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') is not None else 'category'
+
+
+def frame_path(data_path: Union[str, Path], session_id: str) -> Path:
+    """Columnar copy of a session's rows, in the format available here."""
+    return Path(data_path) / f"{session_id}_frame{FRAME_SUFFIX}"
+
+
+def to_columnar(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store the text columns of a read chunk compactly: as categoricals if
+    values repeat, else as TEXT_DTYPE (e.g. amounts or ids).
+    """
+    for col in chunk.columns:
+        if chunk[col].dtype == object:
+            codes, uniques = pd.factorize(chunk[col])
+            if len(uniques) * 2 <= len(chunk):
+                chunk[col] = pd.Categorical.from_codes(codes, uniques)
+            else:
+                chunk[col] = chunk[col].astype(TEXT_DTYPE)
+    return chunk
+
+
+def concat_frames(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate columnar chunks.
+
+    Categories of a column are merged across chunks. A column stored
+    differently in some chunks (categorical in some, TEXT_DTYPE in others,
+    or numbers in copies made before cells were kept as text) holds text
+    throughout, so every column has a single type.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+
+    df = pd.concat(chunks, ignore_index=True)
+    for col in df.columns:
+        column_chunks = [chunk[col] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in column_chunks):
+            categories = {part.cat.categories.dtype for part in column_chunks}
+            if len(categories) == 1:
+                df[col] = pd.api.types.union_categoricals(column_chunks)
+                continue
+        if df[col].dtype == object or isinstance(df[col].dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            df[col] = df[col].astype(object).where(df[col].isna(), df[col].astype(str)).astype(TEXT_DTYPE)
+    return df
+
+
+def save_frame(df: pd.DataFrame, path: Path) -> None:
+    """Write a frame to a temp file and rename it over path."""
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        if path.suffix == '.parquet':
+            df.to_parquet(temp_path, index=False)
+        else:
+            df.to_pickle(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def load_frame(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a saved frame.
+
+    Args:
+        path: Frame file (.parquet or .pkl)
+        columns: Columns to read, if the frame has them; all by default.
+            Parquet reads only these.
+
+    Raises:
+        FileNotFoundError: If there is no frame
+        ValueError: If the frame's format is not readable here
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Session frame not found: {path.name}")
+    if path.suffix == '.parquet':
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ValueError("Session frame is stored as Parquet, which needs the 'pyarrow' package")
+        if columns is not None:
+            import pyarrow.parquet as pq
+            available = set(pq.read_schema(path).names)
+            columns = [col for col in columns if col in available]
+        return pd.read_parquet(path, columns=columns)
+
+    df = pd.read_pickle(path)
+    return df[[col for col in columns if col in df.columns]] if columns is not None else df
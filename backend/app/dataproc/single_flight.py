@@ -0,0 +1,152 @@
+"""
+Single-flight execution of expensive computations.
+
+When several requests ask for the same expensive result at once (dashboards
+opening the same session, the wizard firing /file-info twice), only one of
+them computes it. Within a process, the other callers wait for that
+computation and share its result or exception. Across processes (gunicorn
+workers, job processes), callers serialize on a lock file per key; the
+computation is expected to check a shared on-disk cache first, so a caller
+that waited finds the result already stored.
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking is then per process only
+    fcntl = None
+
+
+# Seconds between attempts while waiting for a lock
+LOCK_POLL_SECONDS = 0.05
+
+
+@contextmanager
+def file_lock(path: Union[str, Path], wait_check: Optional[Callable[[], None]] = None) -> Iterator[None]:
+    """
+    Hold an exclusive lock on a lock file.
+
+    Waiting polls with sleeps rather than blocking in flock, so under gevent
+    other connections are served meanwhile.
+
+    Args:
+        path: Lock file (created if missing, never deleted while in use)
+        wait_check: Optional function called while waiting; it may raise to
+            stop waiting (e.g. when a job is cancelled)
+    """
+    if fcntl is None:
+        yield
+        return
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as handle:
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if wait_check is not None:
+                    wait_check()
+                time.sleep(LOCK_POLL_SECONDS)
+        # Mark the lock as recently used so pruning leaves it alone
+        os.utime(path)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class _Call:
+    """An in-flight computation that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time and shares its result."""
+
+    LOCK_MAX_AGE = 24 * 3600  # Unused lock files older than a day are removed
+
+    def __init__(self, lock_dir: Union[str, Path], runner: Optional[Callable[..., Any]] = None):
+        """
+        Args:
+            lock_dir: Directory for the per-key lock files
+            runner: Optional function that runs a computation, called as
+                runner(compute); e.g. offload.run_blocking to keep computations
+                off the event loop
+        """
+        self.lock_dir = Path(lock_dir)
+        self.runner = runner
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+        if self.lock_dir.exists():
+            self._prune_locks()
+
+    def lock_path(self, key: str) -> Path:
+        """Lock file for a key."""
+        return self.lock_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.lock"
+
+    def do(self, key: str, compute: Callable[[], Any], cross_process: bool = True) -> Any:
+        """
+        Run compute for key, unless a call for the same key is already running.
+
+        Args:
+            key: Identifies the result
+            compute: Produces the result; with cross_process it should look in
+                the shared cache first, as another process may have just stored it
+            cross_process: Also serialize with other processes through the lock file
+
+        Returns:
+            The result of this call's or the running call's compute
+
+        Raises:
+            Whatever compute raised, for every caller sharing the call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            run = self.runner or (lambda func: func())
+            if cross_process:
+                with file_lock(self.lock_path(key)):
+                    call.result = run(compute)
+            else:
+                call.result = run(compute)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _prune_locks(self) -> None:
+        """Remove lock files not used for LOCK_MAX_AGE seconds."""
+        cutoff = time.time() - self.LOCK_MAX_AGE
+        for path in self.lock_dir.glob('*.lock'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                continue
@@ -0,0 +1,117 @@
+"""
+Raw token grid for fast header-row/skip-row re-parsing.
+
+The first rows of an upload are tokenized once into a grid of raw cells.
+Trying a different header row or skip count re-applies those offsets to the
+grid in memory instead of re-reading the file.
+"""
+import csv
+import io
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+
+from .excel_reader import read_excel_rows, excel_row_count
+from .encoding import file_encoding
+
+
+class TokenGrid:
+    """First rows of a file as raw cells, plus a full-file record count."""
+
+    DEFAULT_MAX_ROWS = 1100  # Room for a 1,000 row sample below a late header
+
+    def __init__(self, rows: List[List[str]], total_records: Optional[int] = None,
+                 total_nonblank: Optional[int] = None, complete: bool = False):
+        """
+        Args:
+            rows: First records of the file, as tokenized cells
+            total_records: Number of records in the whole file, if counted
+            total_nonblank: Number of non-blank records in the whole file, if counted
+            complete: True if rows holds every record of the file
+        """
+        self.rows = rows
+        self.total_records = total_records
+        self.total_nonblank = total_nonblank
+        self.complete = complete
+
+    @classmethod
+    def from_file(cls, file_path: Union[str, Path], max_rows: int = DEFAULT_MAX_ROWS,
+                  count_rows: bool = True) -> 'TokenGrid':
+        """
+        Tokenize the first max_rows records and, optionally, count the rest in
+        the same pass. Callers that get an exact row count elsewhere (such as
+        the column profiler) can skip counting and stop after max_rows.
+        """
+        file_path = Path(file_path)
+
+        if file_path.suffix.lower() in ['.xlsx', '.xls']:
+            return cls._from_excel(file_path, max_rows)
+
+        encoding = file_encoding(file_path)
+
+        rows = []
+        total_records = 0
+        total_nonblank = 0
+
+        with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+            for row in csv.reader(f):
+                if total_records < max_rows:
+                    rows.append(row)
+                elif not count_rows:
+                    return cls(rows)
+                total_records += 1
+                if row:
+                    total_nonblank += 1
+
+        return cls(rows, total_records, total_nonblank, complete=total_records <= max_rows)
+
+    @classmethod
+    def _from_excel(cls, file_path: Path, max_rows: int) -> 'TokenGrid':
+        """Build a grid from the first rows of a workbook."""
+        rows = [['' if cell is None else str(cell) for cell in row]
+                for row in read_excel_rows(file_path, max_rows)]
+        total_records = max(excel_row_count(file_path), len(rows))
+        total_nonblank = sum(1 for row in rows if row) + max(total_records - len(rows), 0)
+        return cls(rows, total_records, total_nonblank, complete=total_records <= len(rows))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for the analysis cache."""
+        return {
+            'rows': self.rows,
+            'total_records': self.total_records,
+            'total_nonblank': self.total_nonblank,
+            'complete': self.complete
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TokenGrid':
+        """Restore a grid serialized with to_dict."""
+        return cls(data['rows'], data['total_records'], data['total_nonblank'], data.get('complete', False))
+
+    def frame(self, header_row: int = 0, skip_rows: int = 0) -> pd.DataFrame:
+        """
+        Parse the grid as a dataframe with the given header row and skip rows.
+
+        The cells are handed to pandas from memory, so dtype inference, blank
+        line handling and column naming match a read of the file itself.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.rows)
+        buffer.seek(0)
+
+        skiprows = list(range(skip_rows)) if skip_rows > 0 else None
+        return pd.read_csv(buffer, header=header_row, skiprows=skiprows)
+
+    def row_count(self, header_row: int = 0, skip_rows: int = 0) -> int:
+        """
+        Number of data rows in the full file for the given offsets.
+
+        Mirrors pandas: skipped records are dropped first, then blank records,
+        and header_row counts only non-blank records.
+        """
+        if self.total_nonblank is None:
+            raise ValueError("Row count was not computed for this grid")
+
+        skipped_nonblank = sum(1 for row in self.rows[:skip_rows] if row)
+        return max(self.total_nonblank - skipped_nonblank - (header_row + 1), 0)
@@ -3,10 +3,13 @@ Type detection and conversion for CSV columns.
 Handles percentages, currency, dates, and formatted numbers.
 """
 import re
+import warnings
+import numpy as np
 import pandas as pd
-from typing import Any, Optional, Dict, List
+from typing import Any, Callable, Optional, Dict, List
 from datetime import datetime
 from dateutil import parser as date_parser
+from pandas.tseries.api import guess_datetime_format
 
 
 class TypeDetector:
@@ -18,10 +21,30 @@ class TypeDetector:
     CURRENCY_SYMBOLS = ['$', '€', '£', '¥', '₹', '₽', '₩', '₪', '₦', '₱', '₡', '₴']
     CURRENCY_PATTERN = re.compile(r'[' + ''.join(re.escape(s) for s in CURRENCY_SYMBOLS) + r']')
     
+    # Letters other than e/E rule out a number
+    LETTERS_PATTERN = re.compile(r'[a-df-zA-DF-Z]')
+    
+    # Loose shape shared by all supported date formats: three digit groups
+    # (2024-01-05, 1/5/24) or a month name next to a day (Jan 5, 5 January)
+    DATE_SHAPE_PATTERN = re.compile(
+        r'\d{1,4}[-/. ]\d{1,2}[-/. ]\d{1,4}|[A-Za-z]{3,9}\.? \d{1,2}\b|\b\d{1,2} [A-Za-z]{3,9}'
+    )
+    
+    # Fallback formats for bulk date parsing, tried after the guessed format
+    DATE_FORMATS = [
+        '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y/%m/%d',
+        '%m/%d/%Y', '%d/%m/%Y', '%m/%d/%y', '%d/%m/%y',
+        '%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S', '%d-%m-%Y', '%d.%m.%Y',
+        '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y', '%b %d %Y', '%B %d %Y'
+    ]
+    
     def detect_column_type(self, values: pd.Series, sample_size: int = 100) -> Dict[str, Any]:
         """
         Analyze column values and detect type.
         
+        Each detector works on the whole sample at once with vectorized
+        string operations, so large samples stay cheap.
+        
         Args:
             values: Pandas Series of column values
             sample_size: Number of values to sample for detection
@@ -48,24 +71,32 @@ class TypeDetector:
         
         sample_list = sample.tolist()
         
+        # Numbers cannot carry %, currency symbols or dates
+        if pd.api.types.is_numeric_dtype(sample):
+            return self._detect_numeric(sample, None, None)
+        
+        # Detectors work on the distinct values; codes map them back to the sample
+        codes, uniques = pd.factorize(sample.astype(str).str.strip())
+        text = pd.Series(uniques, dtype=object)
+        
         # Try each type detector in order of specificity
         # Percentage (most specific)
-        pct_result = self._detect_percentage(sample_list)
+        pct_result = self._detect_percentage(sample_list, text, codes)
         if pct_result['confidence'] > 0.8:
             return pct_result
         
         # Currency
-        curr_result = self._detect_currency(sample_list)
+        curr_result = self._detect_currency(sample_list, text, codes)
         if curr_result['confidence'] > 0.8:
             return curr_result
         
         # Date
-        date_result = self._detect_date(sample_list)
+        date_result = self._detect_date(sample_list, text, codes)
         if date_result['confidence'] > 0.8:
             return date_result
         
         # Numeric (formatted numbers)
-        num_result = self._detect_numeric(sample_list)
+        num_result = self._detect_numeric(sample, text, codes)
         if num_result['confidence'] > 0.8:
             return num_result
         
@@ -78,105 +109,188 @@ class TypeDetector:
             'ambiguous': False
         }
     
-    def _detect_percentage(self, values: List[Any]) -> Dict[str, Any]:
-        """Detect if column contains percentages."""
-        pct_count = 0
-        converted = []
-        
-        for val in values:
-            val_str = str(val).strip()
-            if '%' in val_str:
-                pct_count += 1
-                converted_val = self.convert_percentage(val_str)
-                converted.append(converted_val if converted_val is not None else val)
-            else:
-                converted.append(val)
-        
-        confidence = pct_count / len(values) if values else 0.0
+    def detect_column_types(self, df: pd.DataFrame, sample_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+        """
+        Detect the type of every column of a dataframe in one call.
         
+        Args:
+            df: Dataframe to profile (typically the first rows of a file)
+            sample_size: Number of values to sample per column
+            
+        Returns:
+            Dictionary mapping column name to its detect_column_type result
+        """
+        # Positional access keeps duplicate column names apart
         return {
-            'detected_type': 'percentage',
-            'confidence': confidence,
-            'sample_values': values[:5],
-            'converted_samples': converted[:5],
-            'ambiguous': False
+            col: self.detect_column_type(df.iloc[:, i], sample_size)
+            for i, col in enumerate(df.columns)
         }
     
-    def _detect_currency(self, values: List[Any]) -> Dict[str, Any]:
-        """Detect if column contains currency values."""
-        curr_count = 0
-        converted = []
-        
-        for val in values:
-            val_str = str(val).strip()
-            if self.CURRENCY_PATTERN.search(val_str):
-                curr_count += 1
-                converted_val = self.convert_currency(val_str)
-                converted.append(converted_val if converted_val is not None else val)
-            else:
-                converted.append(val)
+    @staticmethod
+    def _detection_result(detected_type: str, values: List[Any], codes: np.ndarray,
+                          matched: pd.Series, convert: Callable[[], pd.Series], **extra) -> Dict[str, Any]:
+        """
+        Build a detector result from per-distinct-value matches.
+        
+        Conversion is only run once the match rate could make this the
+        detected type. Unmatched or unconvertible samples keep their original
+        value.
+        """
+        matched = matched.to_numpy(dtype=bool)
+        confidence = float(matched[codes].mean()) if len(codes) else 0.0
         
-        confidence = curr_count / len(values) if values else 0.0
+        head = list(values[:5])
+        if confidence > 0.8:
+            converted = convert().tolist()
+            for i, code in enumerate(codes[:5]):
+                if matched[code] and pd.notna(converted[code]):
+                    head[i] = converted[code]
         
         return {
-            'detected_type': 'currency',
+            'detected_type': detected_type,
             'confidence': confidence,
             'sample_values': values[:5],
-            'converted_samples': converted[:5],
-            'ambiguous': False
+            'converted_samples': head,
+            'ambiguous': False,
+            **extra
         }
     
-    def _detect_date(self, values: List[Any]) -> Dict[str, Any]:
+    def _detect_percentage(self, values: List[Any], text: pd.Series, codes: np.ndarray) -> Dict[str, Any]:
+        """Detect if column contains percentages."""
+        matched = text.str.contains('%', regex=False)
+        return self._detection_result('percentage', values, codes, matched,
+                                      lambda: self.parse_percentages(text))
+    
+    def _detect_currency(self, values: List[Any], text: pd.Series, codes: np.ndarray) -> Dict[str, Any]:
+        """Detect if column contains currency values."""
+        matched = text.str.contains(self.CURRENCY_PATTERN)
+        return self._detection_result('currency', values, codes, matched,
+                                      lambda: self.parse_currency(text))
+    
+    def _detect_date(self, values: List[Any], text: pd.Series, codes: np.ndarray) -> Dict[str, Any]:
         """Detect if column contains dates."""
-        date_count = 0
-        converted = []
-        formats_found = set()
-        
-        for val in values:
-            val_str = str(val).strip()
-            converted_val, date_format = self.convert_date(val_str)
-            if converted_val is not None:
-                date_count += 1
-                converted.append(converted_val)
-                if date_format:
-                    formats_found.add(date_format)
-            else:
-                converted.append(val)
+        # Skip the format search for columns that mostly do not look like dates:
+        # no value counts as a date then
+        date_like = text.str.contains(self.DATE_SHAPE_PATTERN)
+        if date_like.to_numpy(dtype=bool)[codes].mean() <= 0.8:
+            no_dates = pd.Series(False, index=text.index)
+            return self._detection_result('date', values, codes, no_dates, lambda: text)
+        
+        parsed = self.parse_dates(text)
+        matched = parsed.notna()
         
-        confidence = date_count / len(values) if values else 0.0
+        formats_found = set(self._date_format_labels(text[matched]).unique())
         ambiguous = len(formats_found) > 1  # Multiple date formats detected
         
-        return {
-            'detected_type': 'date',
-            'confidence': confidence,
-            'sample_values': values[:5],
-            'converted_samples': converted[:5],
-            'ambiguous': ambiguous,
-            'formats_found': list(formats_found) if ambiguous else []
-        }
+        result = self._detection_result('date', values, codes, matched,
+                                        lambda: parsed.dt.strftime('%Y-%m-%d'),
+                                        formats_found=sorted(formats_found) if ambiguous else [])
+        result['ambiguous'] = ambiguous
+        return result
     
-    def _detect_numeric(self, values: List[Any]) -> Dict[str, Any]:
-        """Detect if column contains numeric values (including formatted)."""
-        num_count = 0
-        converted = []
-        
-        for val in values:
-            converted_val = self.convert_number(val)
-            if converted_val is not None:
-                num_count += 1
-                converted.append(converted_val)
-            else:
-                converted.append(val)
+    def _detect_numeric(self, sample: pd.Series, text: Optional[pd.Series],
+                        codes: Optional[np.ndarray]) -> Dict[str, Any]:
+        """
+        Detect if column contains numeric values (including formatted).
         
-        confidence = num_count / len(values) if values else 0.0
+        Numeric dtypes are passed without text or codes and converted directly.
+        """
+        if text is None:
+            converted = self.parse_numbers(sample).reset_index(drop=True)
+            return self._detection_result('numeric', sample.tolist(), np.arange(len(sample)),
+                                          converted.notna(), lambda: converted)
         
-        return {
-            'detected_type': 'numeric',
-            'confidence': confidence,
-            'sample_values': values[:5],
-            'converted_samples': converted[:5],
-            'ambiguous': False
-        }
+        converted = self.parse_numbers(text)
+        return self._detection_result('numeric', sample.tolist(), codes, converted.notna(), lambda: converted)
+    
+    @classmethod
+    def parse_percentages(cls, text: pd.Series) -> pd.Series:
+        """Vectorized convert_percentage: decimal fractions, NaN where unparseable."""
+        cleaned = text.str.replace('%', '', regex=False).str.strip().str.replace(',', '', regex=False)
+        return pd.to_numeric(cleaned, errors='coerce') / 100.0
+    
+    @classmethod
+    def parse_currency(cls, text: pd.Series) -> pd.Series:
+        """Vectorized convert_currency: amounts, NaN where unparseable."""
+        cleaned = text.str.replace(cls.CURRENCY_PATTERN, '', regex=True).str.replace(',', '', regex=False).str.strip()
+        return pd.to_numeric(cleaned, errors='coerce')
+    
+    @classmethod
+    def parse_numbers(cls, values: pd.Series) -> pd.Series:
+        """Vectorized convert_number: floats, NaN where unparseable."""
+        if pd.api.types.is_numeric_dtype(values):
+            return values.astype(float)
+        
+        text = values.astype(str).str.strip()
+        
+        # Skip if it contains letters (except e for scientific notation)
+        has_letters = text.str.contains(cls.LETTERS_PATTERN)
+        parsed = pd.to_numeric(text.str.replace(',', '', regex=False).str.strip(), errors='coerce')
+        return parsed.mask(has_letters).astype(float)
+    
+    @classmethod
+    def parse_dates(cls, text: pd.Series) -> pd.Series:
+        """
+        Parse date strings in bulk.
+        
+        Formats are inferred rather than parsed value by value: the format of
+        the first unparsed value is guessed and applied to every remaining
+        value at once, falling back to DATE_FORMATS in turn, until everything
+        parses or the candidates run out.
+        
+        Returns:
+            datetime64 Series aligned with text, NaT where no format matched
+        """
+        values = text.to_numpy(dtype=object)
+        parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        pending = np.arange(len(values))
+        tried = set()
+        
+        while len(pending) > 0:
+            date_format = cls._guess_date_format(values[pending[0]])
+            if date_format is None or date_format in tried:
+                date_format = next((f for f in cls.DATE_FORMATS if f not in tried), None)
+                if date_format is None:
+                    break
+            tried.add(date_format)
+            
+            # utc=True keeps values with mixed offsets in one datetime column
+            attempt = pd.to_datetime(pd.Series(values[pending]), format=date_format,
+                                     errors='coerce', utc=True).dt.tz_localize(None)
+            ok = attempt.notna().to_numpy()
+            parsed[pending[ok]] = attempt.to_numpy(dtype='datetime64[ns]')[ok]
+            pending = pending[~ok]
+        
+        return pd.Series(parsed, index=text.index)
+    
+    @staticmethod
+    def _guess_date_format(value: Any) -> Optional[str]:
+        """Guess the strftime format of one value; only full dates (day and month) count."""
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')  # dayfirst hints are irrelevant here
+                date_format = guess_datetime_format(str(value))
+        except (TypeError, ValueError):
+            return None
+        if date_format and '%d' in date_format and re.search(r'%[mbB]', date_format):
+            return date_format
+        return None
+    
+    @staticmethod
+    def _date_format_labels(text: pd.Series) -> pd.Series:
+        """Vectorized format labels matching convert_date: US, EU, ISO or TEXT."""
+        parts = text.str.split('/')
+        has_slash = text.str.contains('/', regex=False)
+        three_parts = parts.str.len() == 3
+        first = pd.to_numeric(parts.str[0], errors='coerce')
+        
+        labels = np.select(
+            [has_slash & three_parts & (first > 12), has_slash & three_parts, has_slash,
+             text.str.contains('-', regex=False)],
+            ['EU', 'US', 'ISO', 'ISO'],
+            default='TEXT'
+        )
+        return pd.Series(labels, index=text.index)
     
     @staticmethod
     def convert_percentage(value: Any) -> Optional[float]:
@@ -229,7 +343,7 @@ class TypeDetector:
             val_str = str(value).strip()
             
             # Skip if it contains letters (except e for scientific notation)
-            if re.search(r'[a-df-zA-DF-Z]', val_str):
+            if TypeDetector.LETTERS_PATTERN.search(val_str):
                 return None
             
             # Remove commas
@@ -298,3 +412,58 @@ class TypeDetector:
             return result
         else:  # text
             return str(value) if value is not None else None
+    
+    def convert_series(self, series: pd.Series, target_type: str) -> pd.Series:
+        """
+        Convert a whole column to the target type.
+        
+        Each distinct value is converted once and the results are mapped back
+        through factorized codes, so cost follows the number of distinct
+        values rather than the number of rows.
+        
+        Args:
+            series: Column to convert
+            target_type: One of SUPPORTED_TYPES
+            
+        Returns:
+            Series aligned with the input: floats (NaN on failure) for numeric,
+            currency and percentage, ISO date strings for date, strings for text.
+            Missing values stay missing.
+            
+        Raises:
+            ValueError: If target_type is not supported
+        """
+        if target_type == 'percentage':
+            convert = lambda u: self.parse_percentages(u.astype(str).str.strip())
+        elif target_type == 'currency':
+            convert = lambda u: self.parse_currency(u.astype(str).str.strip())
+        elif target_type == 'numeric':
+            convert = self.parse_numbers
+        elif target_type == 'date':
+            convert = lambda u: self.parse_dates(u.astype(str).str.strip()).dt.strftime('%Y-%m-%d')
+        elif target_type == 'text':
+            convert = lambda u: u.astype(str)
+        else:
+            raise ValueError(f"Unsupported type: {target_type}")
+        
+        return self.map_unique(series, convert)
+    
+    @staticmethod
+    def map_unique(series: pd.Series, convert: Callable[[pd.Series], pd.Series]) -> pd.Series:
+        """
+        Apply a vectorized conversion to the distinct values of a series only.
+        
+        Args:
+            series: Values to convert
+            convert: Function from a Series of distinct values to a Series of
+                converted values of the same length
+            
+        Returns:
+            Converted series with the input's index; missing values stay missing
+        """
+        codes, uniques = pd.factorize(series)
+        converted = convert(pd.Series(uniques)).to_numpy()
+        
+        # Code -1 marks a missing value; take() fills it with the dtype's NA
+        values = pd.api.extensions.take(converted, codes, allow_fill=True)
+        return pd.Series(values, index=series.index, name=series.name)
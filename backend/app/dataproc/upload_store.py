@@ -0,0 +1,306 @@
+"""
+Content-addressed upload storage.
+
+Uploads are streamed to disk in fixed-size chunks and hashed on the fly.
+The stored file name carries the content digest, so a byte-identical upload
+resolves to the file that is already on disk, along with any analysis cached
+for it.
+
+gzip, zip and zstd uploads are decompressed as a stream while they are
+written; the digest is taken over the decompressed bytes so a compressed and
+an uncompressed copy of the same export resolve to the same file. Writing
+stops with an error once the decompressed size passes MAX_DECOMPRESSED_BYTES,
+so a small archive cannot expand to fill the disk. Upload bodies themselves
+are limited to MAX_UPLOAD_BYTES.
+"""
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import uuid
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Tuple, Union
+
+from werkzeug.utils import secure_filename
+
+from .encoding import ensure_utf8
+from .excel_reader import convert_excel_to_csv
+
+
+# Largest upload body accepted (compressed size for compressed uploads)
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 10 * 1024 * 1024 * 1024))
+
+# Largest stored (decompressed) upload
+MAX_DECOMPRESSED_BYTES = int(os.getenv('MAX_DECOMPRESSED_BYTES', 20 * 1024 * 1024 * 1024))
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload is, or decompresses to, more bytes than allowed."""
+
+
+class UploadStore:
+    """Stores uploads under names derived from their SHA-256 digest."""
+
+    CHUNK_SIZE = 1024 * 1024   # 1MB
+    DIGEST_LENGTH = 16         # Hex characters of the digest kept in file names
+    DATA_EXTENSIONS = {'csv', 'xls', 'xlsx'}
+    EXCEL_EXTENSIONS = {'xls', 'xlsx'}
+    COMPRESSED_EXTENSIONS = {'gz', 'zip', 'zst'}
+    DIGEST_PATTERN = re.compile(r'-([0-9a-f]{16})\.csv$')
+
+    def __init__(self, upload_dir: Union[str, Path], max_upload_bytes: Optional[int] = None,
+                 max_decompressed_bytes: Optional[int] = None):
+        """
+        Args:
+            upload_dir: Directory holding the stored uploads
+            max_upload_bytes: Largest upload body accepted (defaults to MAX_UPLOAD_BYTES)
+            max_decompressed_bytes: Largest file ingest writes (defaults to MAX_DECOMPRESSED_BYTES)
+        """
+        self.upload_dir = Path(upload_dir)
+        self.max_upload_bytes = max_upload_bytes or MAX_UPLOAD_BYTES
+        self.max_decompressed_bytes = max_decompressed_bytes or MAX_DECOMPRESSED_BYTES
+
+    def ingest(self, stream: BinaryIO, original_name: str) -> Tuple[str, bool]:
+        """
+        Stream an upload to disk, decompressing and hashing it as it is written.
+
+        Args:
+            stream: Readable binary stream with the upload body
+            original_name: Client-supplied file name (used for the extension and prefix)
+
+        Returns:
+            (stored file name, True if an identical upload already existed)
+
+        Raises:
+            ValueError: If the file type or archive contents are not supported
+            UploadTooLarge: If the upload passes max_upload_bytes or the
+                decompressed file passes max_decompressed_bytes; nothing is kept
+        """
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+
+        base_name, file_ext, compression = self.split_name(secure_filename(original_name))
+
+        incoming_id = uuid.uuid4().hex
+        spool_path = self.upload_dir / f".incoming-{incoming_id}.{compression}"
+        temp_path = None
+        digest = hashlib.sha256()
+
+        try:
+            stream = self._limit_upload(stream)
+            source, file_ext = self._open_source(stream, file_ext, compression, spool_path)
+            if file_ext not in self.DATA_EXTENSIONS:
+                raise ValueError(f"Unsupported file type: {file_ext}")
+
+            temp_path = self.upload_dir / f".incoming-{incoming_id}.{file_ext}"
+            written = 0
+            with source, open(temp_path, 'wb') as f:
+                while True:
+                    chunk = source.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > self.max_decompressed_bytes:
+                        raise UploadTooLarge(f"File is larger than {self.max_decompressed_bytes} bytes "
+                                             f"once decompressed")
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            return self.store(temp_path, base_name, file_ext, digest.hexdigest())
+        finally:
+            for path in (temp_path, spool_path):
+                if path is not None and path.exists():
+                    path.unlink()
+
+    @classmethod
+    def split_name(cls, filename: str) -> Tuple[str, str, Optional[str]]:
+        """
+        Split a file name into (base name, data extension, compression).
+
+        Examples:
+            "report.csv"     -> ("report", "csv", None)
+            "report.csv.gz"  -> ("report", "csv", "gz")
+            "report.zip"     -> ("report", "", "zip")  (extension comes from the member)
+        """
+        base_name, ext = os.path.splitext(filename)
+        ext = ext.lstrip('.').lower()
+        compression = None
+
+        if ext in cls.COMPRESSED_EXTENSIONS:
+            compression = ext
+            base_name, ext = os.path.splitext(base_name)
+            ext = ext.lstrip('.').lower()
+            if not ext and compression != 'zip':
+                ext = 'csv'  # "export.gz" is assumed to be a compressed CSV
+
+        return base_name, ext, compression
+
+    @classmethod
+    def is_allowed(cls, filename: str) -> bool:
+        """Check whether a file name has a supported (optionally compressed) type."""
+        _, ext, compression = cls.split_name(filename)
+        return compression == 'zip' or ext in cls.DATA_EXTENSIONS
+
+    def check_upload_size(self, size: int) -> None:
+        """
+        Raises:
+            UploadTooLarge: If an upload of this many bytes is not accepted
+        """
+        if size > self.max_upload_bytes:
+            raise UploadTooLarge(f"Uploads are limited to {self.max_upload_bytes} bytes")
+
+    def _limit_upload(self, stream: BinaryIO) -> BinaryIO:
+        """Check a seekable upload's size up front; wrap any other stream to stop once it passes the limit."""
+        if not _is_seekable(stream):
+            return _Limited(stream, self.check_upload_size)
+        start = stream.tell()
+        size = stream.seek(0, os.SEEK_END) - start
+        stream.seek(start)
+        self.check_upload_size(size)
+        return stream
+
+    def _open_source(self, stream: BinaryIO, file_ext: str, compression: Optional[str],
+                     spool_path: Path) -> Tuple[BinaryIO, str]:
+        """
+        Wrap the upload stream in a streaming decompressor.
+
+        Returns:
+            (readable binary stream of decompressed bytes, data extension)
+        """
+        if compression is None:
+            return _Unclosed(stream), file_ext
+
+        if compression == 'gz':
+            return gzip.GzipFile(fileobj=stream, mode='rb'), file_ext
+
+        if compression == 'zst':
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd uploads require the 'zstandard' package")
+            return zstandard.ZstdDecompressor().stream_reader(stream), file_ext
+
+        # Zip needs random access to the central directory; spool the
+        # compressed body to disk first when the stream cannot seek.
+        if not _is_seekable(stream):
+            with open(spool_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, self.CHUNK_SIZE)
+            archive = zipfile.ZipFile(spool_path)
+        else:
+            archive = zipfile.ZipFile(stream)
+
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and self.split_name(info.filename)[1] in self.DATA_EXTENSIONS
+        ]
+        if len(members) != 1:
+            archive.close()
+            raise ValueError("Zip uploads must contain exactly one CSV, XLS or XLSX file")
+
+        return _ZipMember(archive, members[0]), self.split_name(members[0].filename)[1]
+
+    def store(self, temp_path: Path, base_name: str, file_ext: str, digest: str) -> Tuple[str, bool]:
+        """
+        Move a fully written temp file into the store under its digest.
+
+        Excel workbooks are converted to CSV and other text is transcoded to
+        UTF-8, so readers never need to detect an encoding again; the digest
+        is always that of the uploaded bytes.
+
+        Returns:
+            (stored file name, True if an identical upload already existed)
+        """
+        existing = self.find(digest)
+        if existing:
+            return existing, True
+
+        filename = f"{base_name}-{digest[:self.DIGEST_LENGTH]}.csv"
+        final_path = self.upload_dir / filename
+
+        if file_ext in self.EXCEL_EXTENSIONS:
+            # Convert into a temp name first so a failed conversion leaves nothing behind
+            converting_path = final_path.with_suffix('.csv.part')
+            try:
+                convert_excel_to_csv(temp_path, converting_path)
+                os.replace(converting_path, final_path)
+            finally:
+                if converting_path.exists():
+                    converting_path.unlink()
+        else:
+            transcoded_from = ensure_utf8(temp_path)
+            if transcoded_from:
+                print(f"Transcoded {base_name}.{file_ext} from {transcoded_from} to UTF-8")
+            os.replace(temp_path, final_path)
+
+        return filename, False
+
+    def find(self, digest: str) -> Optional[str]:
+        """Return the stored file name for a content digest, if any."""
+        for path in self.upload_dir.glob(f"*-{digest[:self.DIGEST_LENGTH]}.csv"):
+            return path.name
+        return None
+
+    @classmethod
+    def digest_from_name(cls, file_path: Union[str, Path]) -> Optional[str]:
+        """Extract the content digest from a stored file name, if it has one."""
+        match = cls.DIGEST_PATTERN.search(Path(file_path).name)
+        return match.group(1) if match else None
+
+
+def _is_seekable(stream: BinaryIO) -> bool:
+    """Check whether a stream supports random access."""
+    try:
+        return stream.seekable()
+    except AttributeError:
+        return False
+
+
+class _Limited:
+    """Readable stream that checks the number of bytes read so far after every read."""
+
+    def __init__(self, stream: BinaryIO, check: Callable[[int], None]):
+        self.stream = stream
+        self.check = check
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        self.check(self.bytes_read)
+        return data
+
+
+class _Unclosed:
+    """Context manager wrapper that leaves the caller's stream open."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _ZipMember:
+    """Readable zip member that closes its archive along with itself."""
+
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo):
+        self.archive = archive
+        self.member = archive.open(info)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.member.read(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.member.close()
+        self.archive.close()
+        return False
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings, loaded automatically when gunicorn starts in this directory.
+
+SERVER_MODE picks the worker type:
+- gevent (default): each worker serves many connections from an event loop,
+  so open /process and /jobs/<id>/events streams cost almost nothing and
+  read endpoints stay responsive. Parsing work in requests runs on gevent's
+  native thread pool; processing jobs run in the job process pool.
+- sync: one request per worker at a time; every open progress stream holds
+  a whole worker until the build finishes.
+"""
+import importlib.util
+import os
+
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 6500)}"
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'gevent').lower()
+if SERVER_MODE not in ('gevent', 'sync'):
+    raise ValueError(f"Unknown SERVER_MODE: {SERVER_MODE} (expected gevent or sync)")
+if SERVER_MODE == 'gevent' and importlib.util.find_spec('gevent') is None:
+    print("SERVER_MODE 'gevent' requested but gevent is not installed; using sync workers")
+    SERVER_MODE = 'sync'
+
+worker_class = SERVER_MODE
+workers = int(os.getenv('WEB_WORKERS', 2))
+
+# Concurrent connections per gevent worker
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))
+
+# A sync worker streaming progress is busy for the whole build, so it gets
+# an hour (the default job time limit) before gunicorn considers it stuck
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30 if SERVER_MODE == 'gevent' else 3600))
+
+# Workers import the app after gevent has patched them, so the job
+# dispatcher's thread and lock, and the threads the job process pool starts,
+# are gevent-aware. Preloading would create them unpatched in the master.
+preload_app = False
@@ -0,0 +1,9 @@
+"""
+Shared test setup: the app's modules are imported as in the server, from backend/app.
+"""
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'app'
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
@@ -0,0 +1,118 @@
+"""
+Appending a file to a session gives the chart, cube and table data of processing all rows as one file.
+"""
+import json
+import math
+
+import pytest
+
+from dataproc.cube import DISTINCT_SKETCH_SIZE, Cube
+from dataproc.generic_processor import GenericProcessor
+
+
+HEADER = 'region,country,city,spend,clicks,buyer'
+OPTIONS = dict(measures=['count', 'sum:clicks', 'min:clicks', 'max:clicks', 'mean:clicks', 'distinct:city'],
+               cube_dimensions=['city'])
+
+
+def rows(start, stop):
+    lines = []
+    for i in range(start, stop):
+        clicks = '' if i % 9 == 0 else str(i % 13)
+        lines.append(f'r{i % 3},c{i % 5},t{i % 11},"${i % 50 + 1}.25",{clicks},b{i}')
+    return lines
+
+
+def write_raw(data_path, name, lines):
+    raw = data_path / 'raw'
+    raw.mkdir(exist_ok=True)
+    (raw / name).write_text('\n'.join([HEADER] + lines) + '\n')
+
+
+def build(data_path, input_file, session_id, **options):
+    return GenericProcessor(input_file, 'Spend', ['region', 'country', 'city'], 'spend', data_path=str(data_path),
+                            session_id=session_id, **options).create_sunburst_data()
+
+
+def append(data_path, previous, input_file, session_id):
+    return GenericProcessor.from_chart(previous, input_file, data_path=str(data_path),
+                                       session_id=session_id).append(previous)
+
+
+def rounded(value):
+    """Sums added in another order may differ in the last bits."""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+def outputs(data_path, session_id):
+    chart = json.loads((data_path / f'{session_id}_sunburst_data.json').read_text())
+    cube = Cube.load(data_path / chart['cube_file'])
+    return chart, cube, (data_path / f'{session_id}_data.csv').read_text()
+
+
+def test_append_matches_full_build(tmp_path):
+    write_raw(tmp_path, 'day1.csv', rows(0, 300))
+    write_raw(tmp_path, 'day2.csv', rows(300, 700))
+    write_raw(tmp_path, 'all.csv', rows(0, 700))
+
+    previous = build(tmp_path, 'day1.csv', 'appended', **OPTIONS)
+    appended = append(tmp_path, previous, 'day2.csv', 'appended')
+    build(tmp_path, 'all.csv', 'full', **OPTIONS)
+
+    chart, appended_cube, appended_table = outputs(tmp_path, 'appended')
+    full_chart, full_cube, full_table = outputs(tmp_path, 'full')
+
+    assert appended['appended_files'] == ['day2.csv']
+    assert rounded(chart['data']) == rounded(full_chart['data'])
+    assert appended_table == full_table
+    for path, by in [([], 'region'), (['r1'], 'country'), (['r1', 'c2'], 'city'), (['r2'], 'city')]:
+        assert rounded(appended_cube.query(path, by)) == rounded(full_cube.query(path, by))
+
+
+def test_append_twice_and_same_file_again(tmp_path):
+    write_raw(tmp_path, 'day1.csv', rows(0, 100))
+    write_raw(tmp_path, 'day2.csv', rows(100, 200))
+    write_raw(tmp_path, 'day3.csv', rows(200, 300))
+    write_raw(tmp_path, 'all.csv', rows(0, 300))
+
+    chart = build(tmp_path, 'day1.csv', 'appended', **OPTIONS)
+    chart = append(tmp_path, chart, 'day2.csv', 'appended')
+    chart = append(tmp_path, chart, 'day3.csv', 'appended')
+    full = build(tmp_path, 'all.csv', 'full', **OPTIONS)
+
+    assert chart['appended_files'] == ['day2.csv', 'day3.csv']
+    assert rounded(chart['data']) == rounded(full['data'])
+    with pytest.raises(ValueError, match='already part of this chart'):
+        append(tmp_path, chart, 'day2.csv', 'appended')
+
+
+def test_distinct_counts_past_the_sketch_size_are_estimated(tmp_path):
+    # Every row has its own buyer, so the root and each region pass the sketch size
+    half = 2 * DISTINCT_SKETCH_SIZE
+    write_raw(tmp_path, 'day1.csv', rows(0, half))
+    write_raw(tmp_path, 'day2.csv', rows(half, 2 * half))
+    options = dict(measures=['distinct:buyer', 'count'])
+
+    previous = build(tmp_path, 'day1.csv', 's', **options)
+    chart = append(tmp_path, previous, 'day2.csv', 's')
+    _, cube, _ = outputs(tmp_path, 's')
+
+    # Sketches keep at most DISTINCT_SKETCH_SIZE hashes per group
+    for measures in cube.merge_state['sketches'].values():
+        sketch = measures['distinct:buyer']
+        keys = list(sketch.columns[:-1])
+        largest = sketch.groupby(keys, observed=True).size().max() if keys else len(sketch)
+        assert largest <= DISTINCT_SKETCH_SIZE
+
+    # Past the sketch size the count is an estimate within a few percent
+    total = 2 * half
+    assert abs(chart['data']['measures']['distinct:buyer'] - total) <= 4 * total / math.sqrt(DISTINCT_SKETCH_SIZE)
+    # Below it, counts stay exact
+    for row in cube.query(['r0', 'c0'], 'city')['rows']:
+        assert row['values']['distinct:buyer'] == row['values']['count']
@@ -0,0 +1,54 @@
+"""
+Chunked uploads are stored like the same file sent to /upload in one piece.
+"""
+import hashlib
+import io
+
+import pytest
+
+from dataproc.chunked_upload import ChunkedUploadManager
+from dataproc.upload_store import UploadStore
+
+
+def upload_in_chunks(manager: ChunkedUploadManager, filename: str, content: bytes, chunk_size: int = 1024):
+    started = manager.start(filename, len(content), chunk_size=chunk_size,
+                            sha256=hashlib.sha256(content).hexdigest())
+    # Out of order, as parallel clients send them
+    for index in reversed(range(started['totalChunks'])):
+        manager.write_chunk(started['uploadId'], index, io.BytesIO(content[index * chunk_size:(index + 1) * chunk_size]))
+    return manager.finish(started['uploadId'])
+
+
+@pytest.fixture
+def stores(tmp_path):
+    store = UploadStore(tmp_path)
+    return store, ChunkedUploadManager(tmp_path, store)
+
+
+def test_chunked_csv_matches_single_upload(stores, tmp_path):
+    store, manager = stores
+    content = b'region,city,spend\n' + b''.join(b'r%d,c%d,%d\n' % (i % 3, i % 7, i) for i in range(500))
+
+    stored_name, duplicate = upload_in_chunks(manager, 'spend.csv', content)
+
+    assert not duplicate
+    assert (tmp_path / stored_name).read_bytes() == content
+    assert store.ingest(io.BytesIO(content), 'spend.csv') == (stored_name, True)
+
+
+def test_chunked_xlsx_is_converted(stores, tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    _, manager = stores
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['region', 'city', 'spend'])
+    sheet.append(['North', 'Oslo', 10])
+    sheet.append(['South', 'Rome', 20])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    stored_name, duplicate = upload_in_chunks(manager, 'spend.xlsx', buffer.getvalue())
+
+    assert not duplicate and stored_name.endswith('.csv')
+    assert (tmp_path / stored_name).read_text().splitlines() == ['region,city,spend', 'North,Oslo,10', 'South,Rome,20']
+    assert not list((tmp_path / ChunkedUploadManager.PARTIAL_DIR_NAME).iterdir())
@@ -0,0 +1,105 @@
+"""
+Rollups answered from a chart's aggregation cube match grouping the rows directly.
+"""
+import json
+
+import pandas as pd
+import pytest
+
+from dataproc.cube import Cube, load_cube
+from dataproc.generic_processor import GenericProcessor
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    lines = ['region,country,city,channel,spend,clicks']
+    for i in range(500):
+        lines.append(f'r{i % 3},c{i % 4},t{i % 6},{"web" if i % 5 else "app"},{i % 40 + 0.5},{i % 9}')
+    (raw / 'spend.csv').write_text('\n'.join(lines) + '\n')
+
+    processor = GenericProcessor('spend.csv', 'Spend', ['region', 'country', 'city'], 'spend',
+                                 data_path=str(tmp_path), session_id='s', measures=['count', 'mean:clicks'],
+                                 cube_dimensions=['channel'])
+    processor.create_sunburst_data()
+    return tmp_path
+
+
+@pytest.fixture
+def cube(data_path):
+    chart = json.loads((data_path / 's_sunburst_data.json').read_text())
+    return Cube.load(data_path / chart['cube_file'])
+
+
+@pytest.fixture
+def rows(data_path):
+    return pd.read_csv(data_path / 'raw' / 'spend.csv', dtype={'region': str, 'country': str, 'city': str})
+
+
+def expected_rows(df, by):
+    grouped = df.groupby(by).agg(spend=('spend', 'sum'), rows=('spend', 'size'), clicks=('clicks', 'mean'))
+    return {name: (row.spend, float(row.rows), row.clicks) for name, row in grouped.iterrows()}
+
+
+def actual_rows(result):
+    return {row['name']: (row['values']['sum:spend'], row['values']['count'], row['values']['mean:clicks'])
+            for row in result['rows']}
+
+
+@pytest.mark.parametrize('path, by', [
+    ([], 'region'),
+    ([], 'channel'),
+    (['r1'], 'country'),
+    (['r1'], 'channel'),
+    (['r2', 'c3'], 'city'),
+    (['r2', 'c3', 't5'], 'channel'),
+])
+def test_query_matches_groupby(cube, rows, path, by):
+    result = cube.query(path, by)
+
+    selected = rows
+    for column, label in zip(['region', 'country', 'city'], path):
+        selected = selected[selected[column] == label]
+    assert actual_rows(result) == pytest.approx(expected_rows(selected, by))
+    assert result['total']['sum:spend'] == pytest.approx(selected['spend'].sum())
+    assert result['total']['count'] == len(selected)
+
+    values = [row['values']['sum:spend'] for row in result['rows']]
+    assert values == sorted(values, reverse=True)
+
+
+def test_query_one_measure_with_limit(cube):
+    result = cube.query(['r0'], 'country', measure='mean:clicks', limit=2)
+
+    assert result['measures'] == ['mean:clicks']
+    assert list(result['total']) == ['mean:clicks']
+    assert len(result['rows']) == 2
+    assert result['rows'][0]['values']['mean:clicks'] >= result['rows'][1]['values']['mean:clicks']
+    full = cube.query(['r0'], 'country', measure='mean:clicks')['rows']
+    assert result['rows'] == full[:2]
+
+
+def test_query_totals_and_breakdowns(cube):
+    result = cube.query(['r0', 'c0'])
+
+    assert result['rows'] == []
+    assert result['breakdowns'] == ['city', 'channel']
+    assert cube.query([], 'region')['breakdowns'] == ['region', 'channel']
+    assert cube.query(['r0', 'c0', 't0'])['breakdowns'] == ['channel']
+
+
+@pytest.mark.parametrize('path, by, measure, error', [
+    (['nowhere'], None, None, KeyError),
+    (['r0'], 'city', None, ValueError),       # Not the next level
+    (['r0'], 'country', 'sum:clicks', ValueError),
+    (['r0', 'c0', 't0', 'x'], None, None, ValueError),
+])
+def test_query_rejects(cube, path, by, measure, error):
+    with pytest.raises(error):
+        cube.query(path, by, measure=measure)
+
+
+def test_load_cube_reuses_the_loaded_copy(data_path):
+    path = data_path / 's_cube.pkl'
+    assert load_cube(path) is load_cube(path)
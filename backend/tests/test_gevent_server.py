@@ -0,0 +1,146 @@
+"""
+Smoke test of the server under gevent workers (SERVER_MODE=gevent).
+
+Starts gunicorn with gunicorn.conf.py on a free local port, with its data
+in a temp directory, then uploads a file (as a raw body and in chunks),
+processes it as a job and reads the chart back. This covers the request
+work offloaded to gevent's thread pool and the job dispatcher and process
+pool running in a monkey-patched worker.
+
+Run from backend: python -m pytest -q tests
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('gevent')
+pytest.importorskip('gunicorn')
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'app'
+START_TIMEOUT = 30
+JOB_TIMEOUT = 120
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def call(base_url: str, method: str, path: str, body=None, headers=None):
+    """Send a request; returns (status, parsed JSON body)."""
+    if isinstance(body, dict):
+        body = json.dumps(body).encode()
+        headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+    request = urllib.request.Request(base_url + path, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=JOB_TIMEOUT) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Base URL of a gevent gunicorn server with its data in tmp_path."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        SERVER_MODE='gevent',
+        HOST='127.0.0.1',
+        FLASK_PORT=str(port),
+        WEB_WORKERS='2',
+        JOB_WORKERS='1',
+        DATA_DIR=str(tmp_path),
+        DATA_PATH=str(tmp_path),
+        UPLOAD_DIR=str(tmp_path / 'raw'),
+    )
+    log_path = tmp_path / 'gunicorn.log'
+    with open(log_path, 'wb') as log:
+        proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'api:create_app()'], cwd=APP_DIR,
+                                env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}/api'
+    try:
+        deadline = time.monotonic() + START_TIMEOUT
+        while True:
+            try:
+                if call(base_url, 'GET', '/health')[0] == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                pytest.fail(f"gunicorn did not start:\n{log_path.read_text()}")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+def make_csv(rows: int) -> bytes:
+    lines = ['region,country,city,spend']
+    lines += [f'r{i % 3},c{i % 7},t{i % 11},{i % 100 + 1}' for i in range(rows)]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def test_upload_and_process_under_gevent(server):
+    content = make_csv(200000)  # A few MB, so the raw body is piped in several pieces
+
+    status, raw = call(server, 'PUT', '/upload?filename=spend.csv', content,
+                       {'Content-Type': 'application/octet-stream'})
+    assert status == 200, raw
+    assert not raw['duplicate']
+
+    status, started = call(server, 'POST', '/upload/start', {'filename': 'again.csv', 'size': len(content),
+                                                               'chunkSize': 1024 * 1024})
+    assert status == 200, started
+    chunk_size = started['chunkSize']
+    for index in range(started['totalChunks']):
+        status, result = call(server, 'PUT', f"/upload/{started['uploadId']}/chunk/{index}",
+                              content[index * chunk_size:(index + 1) * chunk_size])
+        assert status == 200, result
+    status, chunked = call(server, 'POST', f"/upload/{started['uploadId']}/finish")
+    assert status == 200, chunked
+    assert chunked['duplicate'] and chunked['filePath'] == raw['filePath']
+
+    request = urllib.request.Request(server + '/process', method='POST', headers={'Content-Type': 'application/json'},
+                                     data=json.dumps({
+                                         'filePath': raw['filePath'],
+                                         'chartName': 'Spend',
+                                         'treeOrder': ['region', 'country', 'city'],
+                                         'valueColumn': 'spend',
+                                         'sessionId': 'gevent-smoke',
+                                     }).encode())
+    events = []
+    with urllib.request.urlopen(request, timeout=JOB_TIMEOUT) as response:
+        for line in response:
+            if line.startswith(b'data: '):
+                events.append(json.loads(line[len(b'data: '):]))
+                if events[-1].get('done') or events[-1].get('error'):
+                    break
+    assert events and events[-1].get('done'), events[-1:]
+
+    status, chart = call(server, 'GET', '/data?session_id=gevent-smoke')
+    assert status == 200, chart
+    assert chart['data']['value'] == sum(i % 100 + 1 for i in range(200000))
+    assert len(chart['data']['children']) == 3
+
+    status, rollup = call(server, 'GET', '/cube?session_id=gevent-smoke&path=r1&by=country&limit=3')
+    assert status == 200, rollup
+    assert rollup['total']['sum:spend'] == sum(i % 100 + 1 for i in range(200000) if i % 3 == 1)
+    assert len(rollup['rows']) == 3
+    status, missing = call(server, 'GET', '/cube?session_id=gevent-smoke&path=nowhere')
+    assert status == 404, missing
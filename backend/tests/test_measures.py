@@ -0,0 +1,98 @@
+"""
+Extra measures built with a chart match the same aggregations done directly in pandas.
+"""
+import pandas as pd
+import pytest
+
+from dataproc.generic_processor import GenericProcessor
+from dataproc.measures import parse_measure, select_measure
+
+
+MEASURES = ['count', 'sum:clicks', 'mean:clicks', 'min:clicks', 'max:clicks', 'distinct:buyer']
+
+
+@pytest.fixture
+def chart(tmp_path):
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    lines = ['region,country,city,spend,clicks,buyer']
+    for i in range(300):
+        # Blanks and text among the clicks are skipped by mean, min and max
+        clicks = '' if i % 7 == 0 else 'n/a' if i % 11 == 0 else str(i % 17)
+        lines.append(f'r{i % 3},c{i % 4},t{i % 5},"${i % 20 + 1}.50",{clicks},b{i % 23}')
+    (raw / 'spend.csv').write_text('\n'.join(lines) + '\n')
+
+    processor = GenericProcessor('spend.csv', 'Spend', ['region', 'country', 'city'], 'spend',
+                                 data_path=str(tmp_path), session_id='s', measures=MEASURES)
+    return processor.create_sunburst_data()
+
+
+def expected(tmp_path):
+    df = pd.read_csv(tmp_path / 'raw' / 'spend.csv', dtype=str)
+    df['spend'] = df['spend'].str.replace('$', '', regex=False).astype(float)
+    df['clicks'] = pd.to_numeric(df['clicks'], errors='coerce')
+    return df
+
+
+def node_measures(df):
+    return {
+        'count': float(len(df)),
+        'sum:clicks': df['clicks'].sum(),
+        'mean:clicks': df['clicks'].mean(),
+        'min:clicks': df['clicks'].min(),
+        'max:clicks': df['clicks'].max(),
+        'distinct:buyer': float(df['buyer'].nunique()),
+    }
+
+
+def assert_measures(node, df):
+    assert node['value'] == pytest.approx(df['spend'].sum())
+    for measure, value in node_measures(df).items():
+        assert node['measures'][measure] == pytest.approx(value), measure
+
+
+def test_measures_match_pandas(chart, tmp_path):
+    df = expected(tmp_path)
+    assert [spec['id'] for spec in chart['measures']] == ['sum:spend'] + MEASURES
+
+    root = chart['data']
+    assert_measures(root, df)
+    for region in root['children']:
+        rows = df[df['region'] == region['name']]
+        assert_measures(region, rows)
+        for country in region['children']:
+            country_rows = rows[rows['country'] == country['name']]
+            assert_measures(country, country_rows)
+            for city in country['children']:
+                assert_measures(city, country_rows[country_rows['city'] == city['name']])
+
+
+def test_select_measure_resorts_siblings(chart):
+    select_measure(chart, 'distinct:buyer')
+
+    assert chart['measure'] == 'distinct:buyer'
+    stack = [chart['data']]
+    while stack:
+        node = stack.pop()
+        assert node['value'] == node['measures']['distinct:buyer']
+        values = [child['value'] for child in node['children']]
+        assert values == sorted(values, reverse=True)
+        stack.extend(node['children'])
+
+    with pytest.raises(ValueError, match='was not built'):
+        select_measure(chart, 'sum:spend_eur')
+
+
+@pytest.mark.parametrize('measure, message', [
+    ('median:clicks', 'Unknown aggregation'),
+    ('count:clicks', 'takes no column'),
+    ('sum', 'needs a column'),
+])
+def test_parse_measure_rejects(measure, message):
+    with pytest.raises(ValueError, match=message):
+        parse_measure(measure)
+
+
+def test_parse_measure_normalizes():
+    assert parse_measure(' MEAN : cpm ') == {'id': 'mean:cpm', 'agg': 'mean', 'column': 'cpm'}
+    assert parse_measure('count') == {'id': 'count', 'agg': 'count', 'column': None}
@@ -0,0 +1,86 @@
+"""
+A re-pivot gives the same chart, cube and table data as building the new selection from the upload.
+"""
+import json
+import shutil
+
+import pytest
+
+from dataproc.cube import Cube
+from dataproc.generic_processor import GenericProcessor
+
+
+def write_upload(data_path):
+    raw = data_path / 'raw'
+    raw.mkdir(parents=True)
+    lines = ['region,country,city,zip,spend,clicks,note']
+    for i in range(400):
+        # ZIP codes with leading zeros, a number-like column with blanks and mixed formatting
+        clicks = '' if i % 9 == 0 else str(i % 13)
+        lines.append(f'r{i % 3},c{i % 5},t{i % 11},0{1000 + i % 7},"${i % 50 + 1}.50",{clicks},n{i}')
+    (raw / 'spend.csv').write_text('\n'.join(lines) + '\n')
+    return 'spend.csv'
+
+
+def build(data_path, session_id, tree_order, **kwargs):
+    processor = GenericProcessor('spend.csv', 'Spend', tree_order, 'spend', data_path=str(data_path),
+                                 session_id=session_id, **kwargs)
+    return processor.create_sunburst_data()
+
+
+def outputs(data_path, session_id):
+    chart = json.loads((data_path / f'{session_id}_sunburst_data.json').read_text())
+    cube = Cube.load(data_path / chart['cube_file'])
+    return chart['data'], cube, (data_path / f'{session_id}_data.csv').read_text()
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    write_upload(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize('new_order', [
+    ['region', 'country', 'zip'],     # A number-like column becomes a level
+    ['country', 'region', 'city'],    # Same columns, new order: table data is kept
+    ['city', 'zip', 'region'],
+])
+def test_repivot_matches_fresh_build(data_path, new_order):
+    options = dict(measures=['count', 'mean:clicks', 'distinct:city'], cube_dimensions=['zip'])
+    previous = build(data_path, 'pivoted', ['region', 'country', 'city'], **options)
+    GenericProcessor('spend.csv', 'Spend', new_order, 'spend', data_path=str(data_path),
+                     session_id='pivoted', **options).repivot(previous)
+    build(data_path, 'fresh', new_order, **options)
+
+    pivoted_tree, pivoted_cube, pivoted_table = outputs(data_path, 'pivoted')
+    fresh_tree, fresh_cube, fresh_table = outputs(data_path, 'fresh')
+
+    assert pivoted_tree == fresh_tree
+    assert pivoted_table == fresh_table
+    assert pivoted_cube.query([], 'zip') == fresh_cube.query([], 'zip')
+
+
+def test_number_like_labels_keep_their_text(data_path):
+    build(data_path, 's', ['region', 'country', 'city'])
+    previous = json.loads((data_path / 's_sunburst_data.json').read_text())
+    GenericProcessor('spend.csv', 'Spend', ['zip', 'region', 'city'], 'spend', data_path=str(data_path),
+                     session_id='s').repivot(previous)
+
+    tree, _, _ = outputs(data_path, 's')
+    assert sorted(node['name'] for node in tree['children']) == [f'0{1000 + i}' for i in range(7)]
+
+
+def test_failed_repivot_keeps_previous_outputs(data_path, monkeypatch):
+    previous = build(data_path, 's', ['region', 'country', 'city'])
+    before = {path.name: path.read_bytes() for path in data_path.iterdir() if path.is_file()}
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr('dataproc.generic_processor.write_json_atomic', fail)
+
+    with pytest.raises(OSError):
+        GenericProcessor('spend.csv', 'Spend', ['zip', 'region', 'city'], 'spend', data_path=str(data_path),
+                         session_id='s').repivot(previous)
+
+    after = {path.name: path.read_bytes() for path in data_path.iterdir() if path.is_file()}
+    assert after == before
@@ -0,0 +1,94 @@
+"""
+A cached processing result gives a new session the same outputs as building it, and only for the same file and config.
+"""
+import json
+
+import pytest
+
+from dataproc.cube import Cube
+from dataproc.generic_processor import GenericProcessor
+from dataproc.result_cache import ResultCache
+
+
+TREE_ORDER = ['region', 'country', 'city']
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    lines = ['region,country,city,spend,clicks']
+    for i in range(300):
+        lines.append(f'r{i % 3},c{i % 4},t{i % 6},{i % 40 + 0.5},{i % 9}')
+    (raw / 'spend.csv').write_text('\n'.join(lines) + '\n')
+    return tmp_path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / 'uploads')
+
+
+def process(data_path, cache, session_id, chart_name='Spend', **options):
+    processor = GenericProcessor('spend.csv', chart_name, TREE_ORDER, 'spend', data_path=str(data_path),
+                                 session_id=session_id, result_cache=cache, **options)
+    processor.process_all()
+    return processor
+
+
+def outputs(data_path, session_id):
+    chart = json.loads((data_path / f'{session_id}_sunburst_data.json').read_text())
+    cube = Cube.load(data_path / chart['cube_file'])
+    return chart, cube, (data_path / f'{session_id}_data.csv').read_text()
+
+
+def fail_build(monkeypatch):
+    def build(self):
+        raise AssertionError('expected a cached result')
+    monkeypatch.setattr(GenericProcessor, 'create_sunburst_data', build)
+
+
+def test_hit_gives_the_built_outputs(data_path, cache, monkeypatch):
+    process(data_path, cache, 'built', measures=['count', 'mean:clicks'])
+    fail_build(monkeypatch)
+    process(data_path, cache, 'cached', chart_name='Spend again', measures=['mean:clicks', 'count'])
+
+    built_chart, built_cube, built_table = outputs(data_path, 'built')
+    cached_chart, cached_cube, cached_table = outputs(data_path, 'cached')
+
+    assert cached_table == built_table
+    assert cached_cube.query(['r1'], 'country') == built_cube.query(['r1'], 'country')
+    assert cached_chart['chart_name'] == cached_chart['data']['name'] == 'Spend again'
+    assert cached_chart['data']['children'] == built_chart['data']['children']
+    assert (cached_chart['data_file'], cached_chart['cube_file']) == ('cached_data.csv', 'cached_cube.pkl')
+
+
+@pytest.mark.parametrize('options', [
+    dict(measures=['count', 'sum:clicks']),
+    dict(measures=['count'], cube_dimensions=['city']),
+    dict(measures=['count'], column_types={'city': 'text'}),
+])
+def test_config_change_misses(data_path, cache, options):
+    first = process(data_path, cache, 'first', measures=['count'])
+    second = GenericProcessor('spend.csv', 'Spend', TREE_ORDER, 'spend', data_path=str(data_path),
+                              session_id='second', result_cache=cache, **options)
+
+    assert cache.key(second) != cache.key(first)
+    assert cache.restore(second) is None
+
+
+def test_changed_file_misses(data_path, cache):
+    first = process(data_path, cache, 'first')
+    with open(data_path / 'raw' / 'spend.csv', 'a') as f:
+        f.write('r9,c9,t9,1.5,1\n')
+
+    assert cache.restore(first) is None
+
+
+def test_eviction_keeps_the_cache_under_its_size(data_path, tmp_path):
+    cache = ResultCache(tmp_path / 'uploads', max_bytes=1)
+    process(data_path, cache, 'first')
+
+    assert list(cache.cache_dir.iterdir()) == []
+    # The session's own outputs are not affected
+    assert outputs(data_path, 'first')[0]['data']['children']
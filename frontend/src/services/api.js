@@ -21,6 +21,7 @@ export const API_ENDPOINTS = {
     FILE_INFO: 'file-info',
     VALIDATE_COLUMNS: 'validate-columns',
     ANALYZE: 'analyze',
+    UPLOAD_START: 'upload/start',
 };
 
 export const fetchApi = async (endpoint, options = {}) => {
@@ -83,3 +84,82 @@ export const fetchApi = async (endpoint, options = {}) => {
         throw new Error(errorMessage);
     }
 };
+
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const CHUNK_CONCURRENCY = 3;
+const CHUNK_TIMEOUT = 120000;
+const CHUNK_RETRIES = 3;
+
+const sha256Hex = async (buffer) => {
+    if (!window.crypto?.subtle) return null;  // Only available in secure contexts
+    const hash = await window.crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(hash)).map(b => b.toString(16).padStart(2, '0')).join('');
+};
+
+/**
+ * Upload a file as resumable chunks (see /upload/start in the backend).
+ * An interrupted upload of the same file resumes from the chunks the server already has.
+ * Returns the same payload as a regular upload: { filePath, duplicate, message }.
+ */
+export const uploadFileChunked = async (file, { onProgress } = {}) => {
+    const resumeKey = `chunked-upload:${file.name}:${file.size}:${file.lastModified}`;
+    let status = null;
+
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        try {
+            status = (await apiClient.get(`upload/${savedId}`)).data;
+        } catch (error) {
+            localStorage.removeItem(resumeKey);
+        }
+    }
+
+    if (!status) {
+        status = (await apiClient.post(API_ENDPOINTS.UPLOAD_START, {
+            filename: file.name,
+            size: file.size,
+            chunkSize: CHUNK_SIZE
+        })).data;
+        localStorage.setItem(resumeKey, status.uploadId);
+    }
+
+    const { uploadId, chunkSize, totalChunks } = status;
+    const pending = [...status.missing];
+    let done = totalChunks - pending.length;
+    onProgress?.(done, totalChunks);
+
+    const sendChunk = async (index) => {
+        const blob = file.slice(index * chunkSize, (index + 1) * chunkSize);
+        const buffer = await blob.arrayBuffer();
+        const checksum = await sha256Hex(buffer);
+        const headers = { 'Content-Type': 'application/octet-stream' };
+        if (checksum) headers['X-Chunk-SHA256'] = checksum;
+
+        for (let attempt = 1; ; attempt++) {
+            try {
+                await apiClient.put(`upload/${uploadId}/chunk/${index}`, buffer, { headers, timeout: CHUNK_TIMEOUT });
+                return;
+            } catch (error) {
+                if (attempt >= CHUNK_RETRIES) throw error;
+            }
+        }
+    };
+
+    const worker = async () => {
+        while (pending.length > 0) {
+            await sendChunk(pending.shift());
+            done++;
+            onProgress?.(done, totalChunks);
+        }
+    };
+
+    try {
+        await Promise.all(Array.from({ length: CHUNK_CONCURRENCY }, worker));
+        const result = (await apiClient.post(`upload/${uploadId}/finish`, null, { timeout: 0 })).data;
+        localStorage.removeItem(resumeKey);
+        return result;
+    } catch (error) {
+        const errorMessage = error.response?.data?.error || error.message || 'Upload failed';
+        throw new Error(errorMessage);
+    }
+};